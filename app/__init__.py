@@ -1,8 +1,11 @@
 from flask import Flask
 from flask_cors import CORS
 from flask_swagger_ui import get_swaggerui_blueprint
-from config import DevelopmentConfig, ProductionConfig, TestingConfig
+from config import (
+    DevelopmentConfig, ProductionConfig, TestingConfig, BenchmarkConfig
+)
 from app.extention import db, ma, migrate, limiter, cache
+from app.compression import init_compression
 
 
 def create_app(config_name="development"):
@@ -17,6 +20,7 @@ def create_app(config_name="development"):
         "development": DevelopmentConfig,
         "production": ProductionConfig,
         "testing": TestingConfig,
+        "benchmark": BenchmarkConfig,
     }
 
     app.config.from_object(config_classes.get(config_name, DevelopmentConfig))
@@ -33,6 +37,9 @@ def create_app(config_name="development"):
     # Add Swagger documentation
     register_swagger(app)
 
+    # Compress responses; precompress static files (swagger.yaml)
+    init_compression(app)
+
     return app
 
 
@@ -49,6 +56,12 @@ def initialize_extensions(app):
 
     # Import models to ensure they're registered with SQLAlchemy
     import app.models  # noqa: F401
+    # Full-text index DDL hooks on the service_tickets table
+    import app.fulltext  # noqa: F401
+    # Change log hook for GET /changes
+    import app.changes  # noqa: F401
+    # Dashboard counter triggers, created with the tables
+    import app.stats  # noqa: F401
 
 
 def register_blueprints(app):
@@ -58,12 +71,24 @@ def register_blueprints(app):
     from app.blueprints.mechanic import mechanic_bp
     from app.blueprints.service_ticket import service_ticket_bp
     from app.blueprints.inventory import inventory_bp
+    from app.blueprints.search import search_bp
+    from app.blueprints.vehicle import vehicle_bp
+    from app.blueprints.changes import changes_bp
+    from app.blueprints.reports import reports_bp
+    from app.blueprints.exports import exports_bp
+    from app.blueprints.batch import batch_bp
 
     # Register blueprints with URL prefixes
     app.register_blueprint(customer_bp, url_prefix="/customers")
     app.register_blueprint(mechanic_bp, url_prefix="/mechanics")
     app.register_blueprint(service_ticket_bp, url_prefix="/service-tickets")
     app.register_blueprint(inventory_bp, url_prefix="/inventory")
+    app.register_blueprint(search_bp, url_prefix="/search")
+    app.register_blueprint(vehicle_bp, url_prefix="/vehicles")
+    app.register_blueprint(changes_bp, url_prefix="/changes")
+    app.register_blueprint(reports_bp, url_prefix="/reports")
+    app.register_blueprint(exports_bp, url_prefix="/exports")
+    app.register_blueprint(batch_bp, url_prefix="/batch")
 
 
 def register_error_handlers(app):
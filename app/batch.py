@@ -0,0 +1,246 @@
+"""
+Batch requests - several API calls in one round trip (POST /batch)
+
+Each sub-request is dispatched in-process through the normal routing,
+auth and after_request hooks, as if it had come over HTTP, in order.
+Later sub-requests can use what earlier ones returned: "{ticket.id}" in a
+path or body is replaced with the "id" field of the response body of the
+sub-request named "ticket" (a string that is only a reference keeps the
+value's JSON type).
+
+In atomic mode every route's commit is only a flush, and the batch
+commits once at the end. Any failure - a 4xx/5xx, or a route rolling
+back, which would throw away the earlier sub-requests' work - rolls the
+whole batch back. Savepoints would be the textbook tool, but they don't
+nest reliably on pysqlite. What routes do once they've committed (the
+typeahead index, the dispatch board, ticket events) goes through
+after_commit(), which holds it until the batch really commits and drops it
+if the batch rolls back.
+"""
+import re
+from contextlib import nullcontext
+from flask import current_app, g, request
+from sqlalchemy.exc import SQLAlchemyError
+from werkzeug.test import EnvironBuilder
+from app.extention import db
+
+METHODS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE')
+REFERENCE = re.compile(r'\{(\w+)((?:\.\w+)+)\}')
+
+
+class UnresolvedReference(Exception):
+    """A reference to a sub-request that failed or has no such field"""
+
+
+def _lookup(match, results):
+    name, fields = match.group(1), match.group(2).split('.')[1:]
+    result = results[name]
+    if result['status'] >= 400:
+        raise UnresolvedReference(f'{match.group(0)}: {name} failed')
+    value = result['body']
+    for field in fields:
+        try:
+            value = value[int(field) if isinstance(value, list) else field]
+        except (KeyError, IndexError, TypeError, ValueError):
+            raise UnresolvedReference(f'{match.group(0)}: no such field')
+    return value
+
+
+def resolve(value, results):
+    """
+    Replace references to earlier sub-requests in a path or body
+
+    Braces naming something that isn't an earlier sub-request are left
+    as they are, so free text can still contain them.
+
+    Raises:
+        UnresolvedReference: the sub-request failed or lacks the field
+    """
+    if isinstance(value, dict):
+        return {key: resolve(item, results) for key, item in value.items()}
+    if isinstance(value, list):
+        return [resolve(item, results) for item in value]
+    if not isinstance(value, str):
+        return value
+
+    def known(match):
+        return match.group(1) in results
+
+    whole = REFERENCE.fullmatch(value)
+    if whole and known(whole):
+        return _lookup(whole, results)
+    return REFERENCE.sub(
+        lambda m: str(_lookup(m, results)) if known(m) else m.group(0),
+        value
+    )
+
+
+class deferred_commits:
+    """
+    Make session.commit() a flush until exit, and note any rollback
+
+    Used as a context manager around an atomic batch; the caller commits
+    or rolls back the real transaction afterwards and then calls
+    finish() with which it was.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self.rolled_back = False
+        self.on_commit = []
+        self.on_rollback = []
+
+    def __enter__(self):
+        # Whatever was there before - the class's methods, or an outer
+        # guard's - goes back on exit
+        self.saved = {name: vars(self.session).get(name)
+                      for name in ('commit', 'rollback')}
+        self.outer = g.get('deferred_commits')
+        rollback = self.session.rollback
+
+        def noted_rollback():
+            self.rolled_back = True
+            rollback()
+
+        self.session.commit = self.session.flush
+        self.session.rollback = noted_rollback
+        g.deferred_commits = self
+        return self
+
+    def __exit__(self, *exc):
+        for name, method in self.saved.items():
+            if method is None:
+                vars(self.session).pop(name, None)  # the class's method
+            else:
+                setattr(self.session, name, method)
+        if self.outer is None:
+            g.pop('deferred_commits', None)
+        else:
+            g.deferred_commits = self.outer
+
+    def finish(self, committed):
+        """Run the hooks for how the real transaction ended"""
+        for fn, args in self.on_commit if committed else self.on_rollback:
+            try:
+                fn(*args)
+            except Exception:
+                # The transaction is over either way - don't fail the batch
+                current_app.logger.exception('Batch %s hook %s failed',
+                                             'commit' if committed
+                                             else 'rollback', fn.__name__)
+
+
+def after_commit(fn, *args):
+    """
+    Call fn(*args) once the request's writes are committed
+
+    Routes commit before they update worker memory, so outside a batch
+    that's now. In an atomic batch their commit is only a flush: the call
+    waits for the batch's own commit and is dropped if it rolls back.
+    """
+    guard = g.get('deferred_commits')
+    if guard is None:
+        fn(*args)
+    else:
+        guard.on_commit.append((fn, args))
+
+
+def on_rollback(fn, *args):
+    """
+    Call fn(*args) if the atomic batch this runs in rolls back
+
+    For worker memory that has to change before the commit (a mechanic
+    taken off the dispatch board). Outside a batch the route undoes its
+    own work, so this does nothing.
+    """
+    guard = g.get('deferred_commits')
+    if guard is not None:
+        guard.on_rollback.append((fn, args))
+
+
+def dispatch(method, path, body=None, headers=None):
+    """
+    Run one request through the app without HTTP
+
+    Returns:
+        tuple: (status code, JSON body, or text if it isn't JSON)
+    """
+    builder = EnvironBuilder(path=path, method=method, json=body,
+                             headers=headers)
+    saved = dict(vars(g))  # sub-requests share the batch's app context
+    try:
+        with current_app.request_context(builder.get_environ()):
+            # By the route it resolves to - the path check in the schema
+            # can't see through percent-encoding
+            if request.endpoint == 'batch.batch':
+                return 400, {'error': "Batches can't be nested"}
+            response = current_app.full_dispatch_request()
+            if response.is_streamed:
+                response.close()
+                return 400, {'error': "Streaming responses can't be "
+                                      "batched"}
+            content = response.get_json(silent=True) \
+                if response.is_json else response.get_data(as_text=True)
+            return response.status_code, content
+    except Exception as e:
+        current_app.logger.exception('Batch sub-request %s %s failed',
+                                     method, path)
+        return 500, {'error': str(e)}
+    finally:
+        vars(g).clear()
+        vars(g).update(saved)
+
+
+def run_batch(requests, atomic=False, headers=None):
+    """
+    Run sub-requests in order
+
+    Args:
+        requests (list): dicts with method, path and optionally id, body
+            and headers
+        atomic (bool): all or nothing, in one transaction
+        headers (dict): sent with every sub-request (e.g. Authorization);
+            a sub-request's own headers win
+
+    Returns:
+        tuple: (results, committed) - one {'id', 'status', 'body'} per
+        sub-request run; an atomic batch stops at the first failure and
+        committed is False
+    """
+    results, named = [], {}
+    session = db.session()
+    failed = False
+    with deferred_commits(session) if atomic else nullcontext() as guard:
+        for spec in requests:
+            try:
+                path = resolve(spec['path'], named)
+                body = resolve(spec.get('body'), named)
+            except UnresolvedReference as e:
+                status, content = 424, {'error': str(e)}
+            else:
+                status, content = dispatch(
+                    spec['method'], path, body,
+                    {**(headers or {}), **spec.get('headers', {})}
+                )
+            result = {'id': spec.get('id'), 'status': status,
+                      'body': content}
+            results.append(result)
+            if spec.get('id'):
+                named[spec['id']] = result
+            if atomic and (status >= 400 or guard.rolled_back):
+                failed = True
+                break
+
+    if not atomic:
+        return results, True
+    if not failed:
+        try:
+            session.commit()
+        except SQLAlchemyError as e:
+            results.append({'id': None, 'status': 500,
+                            'body': {'error': str(e)}})
+            failed = True
+    if failed:
+        session.rollback()
+    guard.finish(committed=not failed)
+    return results, not failed
@@ -7,6 +7,11 @@ Available blueprints:
 - mechanic: Mechanic management endpoints
 - service_ticket: Service ticket management endpoints
 - inventory: Inventory management endpoints
+- search: Typeahead across customers, mechanics and parts
+- changes: Change feed for incremental client sync
+- reports: Revenue, parts spend and ticket cost from daily rollups
+- exports: Streaming CSV / NDJSON dumps of tickets, customers, inventory
+- batch: Several API calls in one request
 """
 
 # Import all blueprints for easy access
@@ -14,11 +19,21 @@ from app.blueprints.customer import customer_bp
 from app.blueprints.mechanic import mechanic_bp
 from app.blueprints.service_ticket import service_ticket_bp
 from app.blueprints.inventory import inventory_bp
+from app.blueprints.search import search_bp
+from app.blueprints.changes import changes_bp
+from app.blueprints.reports import reports_bp
+from app.blueprints.exports import exports_bp
+from app.blueprints.batch import batch_bp
 
 # Export all blueprints for external import
 __all__ = [
     'customer_bp',
     'mechanic_bp',
     'service_ticket_bp',
-    'inventory_bp'
+    'inventory_bp',
+    'search_bp',
+    'changes_bp',
+    'reports_bp',
+    'exports_bp',
+    'batch_bp'
 ]
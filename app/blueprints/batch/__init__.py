@@ -0,0 +1,7 @@
+from flask import Blueprint
+
+# Create batch blueprint
+batch_bp = Blueprint('batch', __name__)
+
+# Import routes to register them with the blueprint
+from app.blueprints.batch import routes
@@ -0,0 +1,39 @@
+"""
+Batch route - a client workflow (create a ticket, assign mechanics, add
+parts) in one round trip instead of one per step (see app/batch.py)
+"""
+from flask import current_app, request, jsonify
+from marshmallow import ValidationError
+from app.batch import run_batch
+from app.blueprints.batch import batch_bp
+from app.blueprints.batch.schema import batch_schema
+
+
+@batch_bp.route('/', methods=['POST'], strict_slashes=False)
+def batch():
+    """
+    POST '/': Run several API calls in order, in one request
+    Body: {"atomic": true, "requests": [{"id": "ticket", "method": "POST",
+    "path": "/service-tickets/", "body": {...}}, {"method": "PUT", "path":
+    "/service-tickets/{ticket.id}/assign-mechanic/3"}, ...]}
+    The Authorization header is passed on to every call. Returns each
+    call's status and body; a failed atomic batch is a 400 with nothing
+    saved.
+    """
+    try:
+        data = batch_schema.load(request.get_json(silent=True) or {})
+    except ValidationError as e:
+        return jsonify({'error': e.messages}), 400
+    limit = current_app.config.get('BATCH_MAX_REQUESTS', 20)
+    if len(data['requests']) > limit:
+        return jsonify({
+            'error': f'At most {limit} requests per batch'
+        }), 400
+
+    headers = {'Authorization': request.headers['Authorization']} \
+        if 'Authorization' in request.headers else {}
+    results, committed = run_batch(data['requests'], data['atomic'],
+                                   headers)
+    body = {'atomic': data['atomic'], 'committed': committed,
+            'results': results}
+    return jsonify(body), 200 if committed else 400
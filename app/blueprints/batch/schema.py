@@ -0,0 +1,24 @@
+from app.extention import ma
+from app.batch import METHODS
+from marshmallow import fields, validate
+
+
+class SubRequestSchema(ma.Schema):
+    """One call inside a batch"""
+    id = fields.Str(validate=validate.Regexp(r'^\w+$'))
+    method = fields.Str(required=True, validate=validate.OneOf(METHODS))
+    path = fields.Str(required=True, validate=validate.Regexp(
+        r'^/(?!batch\b)', error='path must start with / and not be /batch'
+    ))
+    body = fields.Raw(allow_none=True)
+    headers = fields.Dict(keys=fields.Str(), values=fields.Str())
+
+
+class BatchSchema(ma.Schema):
+    """Body of POST /batch"""
+    requests = fields.List(fields.Nested(SubRequestSchema), required=True,
+                           validate=validate.Length(min=1))
+    atomic = fields.Bool(load_default=False)
+
+
+batch_schema = BatchSchema()
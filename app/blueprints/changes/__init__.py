@@ -0,0 +1,7 @@
+from flask import Blueprint
+
+# Create change feed blueprint
+changes_bp = Blueprint('changes', __name__)
+
+# Import routes to register them with the blueprint
+from app.blueprints.changes import routes
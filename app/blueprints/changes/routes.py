@@ -0,0 +1,77 @@
+"""
+Change feed routes - incremental sync for mobile and back-office clients
+Instead of re-listing customers, inventory and tickets, a client keeps the
+cursor from its last sync and asks what changed since (see app/changes.py)
+"""
+from flask import request, jsonify
+from sqlalchemy.orm import selectinload
+from app.blueprints.changes import changes_bp
+from app.blueprints.changes.schema import change_schemas
+from app.changes import DELETE, MODELS, horizon, read_changes
+from app.models import ServiceTicket
+
+
+def _current_rows(entity, ids):
+    """
+    id -> compact dump of the rows that still exist
+    The change schemas leave out the lazy collections, so only a ticket's
+    mechanic and part ids need loading
+    """
+    model = MODELS[entity]
+    options = [selectinload(ServiceTicket.mechanics),
+               selectinload(ServiceTicket.parts)] \
+        if model is ServiceTicket else []
+    rows = model.query.options(*options) \
+        .filter(model.id.in_(ids)).all()
+    return {row['id']: row for row in change_schemas[entity].dump(rows)}
+
+
+@changes_bp.route('/', methods=['GET'], strict_slashes=False)
+def get_changes():
+    """
+    GET '/?since=<cursor>&types=': Upserts and deletes after a cursor
+    Start with since=0 (everything still in the log), then pass back the
+    cursor of each response. One entry per changed row, oldest first; an
+    upsert carries the row as it is now. A 410 means the cursor is older
+    than the retention window - sync again from 0.
+    """
+    since = request.args.get('since', 0, type=int)
+    limit = min(max(request.args.get('limit', 500, type=int), 1), 1000)
+    types = request.args.get('types')
+    types = set(types.split(',')) if types else None
+
+    if types and not types <= set(MODELS):
+        return jsonify({
+            'error': f'types must be from {sorted(MODELS)}'
+        }), 400
+    if since and since < horizon():
+        return jsonify({
+            'error': 'Cursor is older than the change log - sync from 0',
+            'since': since
+        }), 410
+
+    changes, cursor, has_more = read_changes(since, types=types, limit=limit)
+
+    upserted = {}
+    for entity in MODELS:
+        ids = [row_id for _, kind, row_id, op in changes
+               if kind == entity and op != DELETE]
+        if ids:
+            upserted[entity] = _current_rows(entity, ids)
+
+    result = []
+    for seq, entity, row_id, op in changes:
+        data = upserted.get(entity, {}).get(row_id)
+        if data is None:
+            # Deleted since - a later page has its tombstone too
+            result.append({'seq': seq, 'type': entity, 'id': row_id,
+                           'op': 'delete'})
+        else:
+            result.append({'seq': seq, 'type': entity, 'id': row_id,
+                           'op': 'upsert', 'data': data})
+
+    return jsonify({
+        'changes': result,
+        'cursor': cursor,
+        'has_more': has_more
+    }), 200
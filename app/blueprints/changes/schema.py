@@ -0,0 +1,16 @@
+from app.blueprints.customer.schema import CustomerSchema
+from app.blueprints.mechanic.schema import MechanicSchema
+from app.blueprints.inventory.schema import InventorySchema
+from app.blueprints.service_ticket.schema import ServiceTicketSchema
+
+# Compact dumps for GET /changes - each blueprint's own schema without the
+# nested collections, so an upsert is one flat object. Tickets keep their
+# mechanic ids and parts, which assignments and add-part log as changes.
+change_schemas = {
+    'customers': CustomerSchema(many=True, exclude=('service_tickets',)),
+    'mechanics': MechanicSchema(many=True, exclude=('service_tickets',)),
+    'inventory': InventorySchema(many=True, exclude=('service_tickets',)),
+    'service_tickets': ServiceTicketSchema(
+        many=True, exclude=('customer', 'inventory_items')
+    ),
+}
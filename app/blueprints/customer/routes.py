@@ -10,11 +10,21 @@ from app.blueprints.customer.schema import (
 )
 from app.blueprints.service_ticket.schema import service_tickets_schema
 from app.extention import db, limiter, cache
+from app.caching import cached
 from app.auth import encode_token, token_required
+from app.suggest import index_customer, unindex
+from app.loaders import (
+    strict_loading, customer_options, service_ticket_options
+)
+from app.conditional import (
+    conditional, row_validator, table_validator, cache_key
+)
+from app.idempotency import idempotent
 
 
 @customer_bp.route('/', methods=['GET'])
-@cache.cached(timeout=300)  # Cache for 5 minutes - assignment requirement
+@conditional(table_validator(Customer))
+@cached(timeout=300, key_prefix=cache_key)  # Cache for 5 minutes
 def get_customers():
     """Get all customers with pagination (assignment requirement)"""
     # Get page parameters from request
@@ -22,7 +32,9 @@ def get_customers():
     per_page = request.args.get('per_page', 2, type=int)
 
     # Paginate the query
-    customers = Customer.query.paginate(
+    customers = Customer.query.options(
+        *strict_loading()
+    ).order_by(Customer.id).paginate(
         page=page, per_page=per_page, error_out=False
     )
 
@@ -42,6 +54,7 @@ def get_customers():
 
 
 @customer_bp.route('/', methods=['POST'])
+@idempotent
 def create_customer():
     """Create a new customer"""
     try:
@@ -51,6 +64,7 @@ def create_customer():
         db.session.commit()
         # Clear cache after creating new customer
         cache.delete_memoized(get_customers)
+        index_customer(customer_data)
         return customer_schema.jsonify(customer_data), 201
     except Exception as e:
         db.session.rollback()
@@ -83,7 +97,9 @@ def login():
 def get_my_tickets(current_customer_id):
     """GET '/my-tickets': Get service tickets for authenticated customer"""
     try:
-        tickets = ServiceTicket.query.filter_by(
+        tickets = ServiceTicket.query.options(
+            *service_ticket_options()
+        ).filter_by(
             customer_id=current_customer_id
         ).all()
         return service_tickets_schema.jsonify(tickets), 200
@@ -92,9 +108,12 @@ def get_my_tickets(current_customer_id):
 
 
 @customer_bp.route('/<int:id>', methods=['GET'])
+@conditional(row_validator(Customer, children=ServiceTicket.customer_id))
 def get_customer(id):
     """Get a specific customer"""
-    customer = Customer.query.get_or_404(id)
+    customer = Customer.query.options(
+        *customer_options()
+    ).filter_by(id=id).first_or_404()
     return customer_schema.jsonify(customer), 200
 
 
@@ -117,6 +136,7 @@ def update_current_customer(current_customer_id):
         db.session.commit()
         # Clear cache after update
         cache.delete_memoized(get_customers)
+        index_customer(updated_customer)
         return customer_schema.jsonify(updated_customer), 200
     except Exception as e:
         db.session.rollback()
@@ -144,6 +164,7 @@ def update_customer(current_customer_id, id):
         db.session.commit()
         # Clear cache after update
         cache.delete_memoized(get_customers)
+        index_customer(updated_customer)
         return customer_schema.jsonify(updated_customer), 200
     except Exception as e:
         db.session.rollback()
@@ -162,6 +183,7 @@ def delete_current_customer(current_customer_id):
         db.session.commit()
         # Clear cache after deletion
         cache.delete_memoized(get_customers)
+        unindex('customer', current_customer_id)
         return jsonify({
             'message': 'Customer account deleted successfully'
         }), 200
@@ -184,6 +206,7 @@ def delete_customer(current_customer_id, id):
         db.session.commit()
         # Clear cache after deletion
         cache.delete_memoized(get_customers)
+        unindex('customer', id)
         return jsonify({'message': 'Customer deleted successfully'}), 200
     except Exception as e:
         db.session.rollback()
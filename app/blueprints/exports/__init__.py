@@ -0,0 +1,7 @@
+from flask import Blueprint
+
+# Create exports blueprint
+exports_bp = Blueprint('exports', __name__)
+
+# Import routes to register them with the blueprint
+from app.blueprints.exports import routes
@@ -0,0 +1,66 @@
+"""
+Export routes - full table dumps for accountants and analysts
+Each route streams one SELECT as CSV or NDJSON (app/exports.py), gzipped
+on the fly when the client accepts it (app/compression.py). Nothing is
+paginated: memory stays the same for ten rows or ten million.
+"""
+from datetime import datetime
+from flask import Response, request, jsonify, stream_with_context
+from app.auth import mechanic_token_required
+from app.blueprints.exports import exports_bp
+from app.exports import EXPORTS, FORMATS, export_rows
+
+# Query parameters that aren't column filters
+OPTIONS = ('format', 'columns', 'updated_since')
+
+
+def _export(name):
+    """Parse ?format=&columns=&updated_since=&<filter>= and stream"""
+    format = request.args.get('format', 'csv')
+    if format not in FORMATS:
+        return jsonify({'error': f'format must be one of {list(FORMATS)}'}), \
+            400
+    columns = request.args.get('columns')
+    columns = [name.strip() for name in columns.split(',')] \
+        if columns else None
+    filters = {key: value for key, value in request.args.items()
+               if key not in OPTIONS}
+    try:
+        since = request.args.get('updated_since')
+        since = datetime.fromisoformat(since) if since else None
+        chunks = export_rows(name, format, columns, since, **filters)
+    except ValueError as e:
+        return jsonify({'error': str(e),
+                        'columns': EXPORTS[name].columns,
+                        'filters': EXPORTS[name].filters}), 400
+
+    return Response(stream_with_context(chunks), mimetype=FORMATS[format],
+                    headers={'Content-Disposition':
+                             f'attachment; filename={name}.{format}'})
+
+
+@exports_bp.route('/service-tickets', methods=['GET'])
+@mechanic_token_required
+def export_service_tickets(current_mechanic_id):
+    """
+    GET '/service-tickets': Every ticket, streamed
+    Filters: status, priority, customer_id, vehicle_id, specialty
+    """
+    return _export('service-tickets')
+
+
+@exports_bp.route('/customers', methods=['GET'])
+@mechanic_token_required
+def export_customers(current_mechanic_id):
+    """GET '/customers': Every customer (no password hashes), streamed"""
+    return _export('customers')
+
+
+@exports_bp.route('/inventory', methods=['GET'])
+@mechanic_token_required
+def export_inventory(current_mechanic_id):
+    """
+    GET '/inventory': Every inventory item, streamed
+    Filters: category, supplier
+    """
+    return _export('inventory')
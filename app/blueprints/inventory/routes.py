@@ -2,12 +2,23 @@
 Inventory management routes
 This was the new requirement - adding parts/inventory tracking
 """
+from itertools import groupby
 from flask import request, jsonify
 from app.blueprints.inventory import inventory_bp
 from app.models import Inventory
-from app.blueprints.inventory.schema import inventory_schema, inventories_schema
-from app.extention import db, limiter, cache
+from app.blueprints.inventory.schema import (
+    inventory_schema, inventories_schema, low_stock_schema
+)
+from app.extention import db, limiter
+from app.caching import cached
 from app.auth import mechanic_token_required
+from app.loaders import inventory_options
+from app.suggest import index_part, unindex
+from sqlalchemy.orm.exc import StaleDataError
+from app.conditional import (
+    conditional, row_validator, table_validator, cache_key,
+    version_matches, precondition_failed
+)
 
 
 @inventory_bp.route('/', methods=['POST'])
@@ -19,6 +30,7 @@ def create_inventory(current_mechanic_id):
         inventory_data = inventory_schema.load(request.json)
         db.session.add(inventory_data)
         db.session.commit()
+        index_part(inventory_data)
         # Cache will expire automatically after 5 minutes
         return inventory_schema.jsonify(inventory_data), 201
     except Exception as e:
@@ -27,19 +39,52 @@ def create_inventory(current_mechanic_id):
 
 
 @inventory_bp.route('/', methods=['GET'])
-@cache.cached(timeout=300)  # Cache for 5 minutes - assignment requirement
+@conditional(table_validator(Inventory))
+@cached(timeout=300, key_prefix=cache_key)  # Cache for 5 minutes
 def get_inventories():
     """GET '/': Retrieves all Inventory items"""
     # Anyone can view inventory - no auth needed
-    inventories = Inventory.query.all()
+    inventories = Inventory.query.options(*inventory_options()).all()
     return inventories_schema.jsonify(inventories), 200
 
 
+@inventory_bp.route('/low-stock', methods=['GET'])
+def get_low_stock():
+    """
+    GET '/low-stock': Items at or below their reorder threshold by supplier
+    Not cached - the parts manager needs the live numbers
+    """
+    query = Inventory.query.filter(Inventory.low_stock_filter())
+    supplier = request.args.get('supplier')
+    if supplier:
+        query = query.filter(Inventory.supplier == supplier)
+
+    # Same order as ix_inventory_low_stock so it's an index scan, no sort
+    items = query.order_by(Inventory.supplier, Inventory.name).all()
+
+    suppliers = []
+    for name, group in groupby(items, key=lambda item: item.supplier):
+        group = list(group)
+        rows = low_stock_schema.dump(group)
+        for row, item in zip(rows, group):
+            row['shortfall'] = item.reorder_threshold - item.quantity
+        suppliers.append({
+            'supplier': name,
+            'items': rows,
+            'total_items': len(rows)
+        })
+
+    return jsonify({'suppliers': suppliers, 'total': len(items)}), 200
+
+
 @inventory_bp.route('/<int:id>', methods=['GET'])
-@cache.cached(timeout=300)  # Cache individual items too
+@conditional(row_validator(Inventory))
+@cached(timeout=300, key_prefix=cache_key)  # Cache items too
 def get_inventory(id):
     """GET '/<int:id>': Retrieves a specific Inventory item"""
-    inventory = Inventory.query.get_or_404(id)
+    inventory = Inventory.query.options(
+        *inventory_options()
+    ).filter_by(id=id).first_or_404()
     return inventory_schema.jsonify(inventory), 200
 
 
@@ -49,11 +94,18 @@ def update_inventory(current_mechanic_id, id):
     """PUT '/<int:id>': Updates a specific Inventory item (mechanic only)"""
     # Mechanics need to update stock levels and prices
     inventory = Inventory.query.get_or_404(id)
+    # Two tablets editing the same part - the second one must re-read
+    if not version_matches(inventory):
+        return precondition_failed(inventory)
     try:
         updated_inventory = inventory_schema.load(request.json, instance=inventory, partial=True)
         db.session.commit()
+        index_part(updated_inventory)
         # Cache will expire automatically after 5 minutes
         return inventory_schema.jsonify(updated_inventory), 200
+    except StaleDataError:
+        db.session.rollback()
+        return precondition_failed(db.session.get(Inventory, id))
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 400
@@ -69,6 +121,7 @@ def delete_inventory(current_mechanic_id, id):
     try:
         db.session.delete(inventory)
         db.session.commit()
+        unindex('part', id)
         # Cache will expire automatically after 5 minutes
         return jsonify({'message': 'Inventory item deleted successfully'}), 200
     except Exception as e:
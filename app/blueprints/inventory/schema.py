@@ -10,6 +10,7 @@ class InventorySchema(ma.SQLAlchemyAutoSchema):
         model = Inventory
         load_instance = True
         include_relationships = True
+        exclude = ('ticket_parts',)  # service_tickets already lists them
 
     # Explicitly define fields to match the model
     id = fields.Int(dump_only=True)
@@ -19,9 +20,14 @@ class InventorySchema(ma.SQLAlchemyAutoSchema):
     quantity = fields.Int(validate=validate.Range(min=0))
     category = fields.Str(validate=validate.Length(max=100))
     supplier = fields.Str(validate=validate.Length(max=100))
+    reorder_threshold = fields.Int(validate=validate.Range(min=0))
     created_at = fields.DateTime(dump_only=True)
     updated_at = fields.DateTime(dump_only=True)
+    version = fields.Int(dump_only=True)  # send back in If-Match on PUT
 
 
 inventory_schema = InventorySchema()
 inventories_schema = InventorySchema(many=True)
+low_stock_schema = InventorySchema(many=True, only=(
+    'id', 'name', 'category', 'price', 'quantity', 'reorder_threshold'
+))
@@ -3,18 +3,29 @@ Mechanic routes for the API
 This handles all mechanic-related endpoints
 """
 
+from datetime import date
 from flask import request, jsonify
-from sqlalchemy import func
+from marshmallow import ValidationError
+from sqlalchemy import func, select
 from app.blueprints.mechanic import mechanic_bp
-from app.models import Mechanic, ServiceTicket
+from app.models import (
+    Mechanic, ServiceTicket, TimeEntry, mechanic_service_ticket
+)
 from app.blueprints.mechanic.schema import (
     mechanic_schema,
     mechanics_schema,
     mechanic_login_schema,
+    time_entries_schema,
+    clock_schema,
     MechanicSchema,
 )
+from app.blueprints.service_ticket.schema import service_ticket_schema
 from app.extention import db, limiter
+from app.loaders import mechanic_options, service_ticket_options
+from app.suggest import index_mechanic, unindex
 from app.auth import encode_mechanic_token, mechanic_token_required
+from app.conditional import conditional, row_validator, table_validator
+from app import dispatch, events, workflow
 
 
 @mechanic_bp.route("/", methods=["POST"])
@@ -25,6 +36,8 @@ def create_mechanic():
         mechanic_data = mechanic_schema.load(request.json)
         db.session.add(mechanic_data)
         db.session.commit()
+        index_mechanic(mechanic_data)
+        dispatch.mechanic_changed(mechanic_data)
         return mechanic_schema.jsonify(mechanic_data), 201
     except Exception as e:
         db.session.rollback()
@@ -60,12 +73,15 @@ def mechanic_login():
 
 
 @mechanic_bp.route("/", methods=["GET"])
+@conditional(table_validator(Mechanic))
 def get_mechanics():
     """GET '/': Retrieves all Mechanics with pagination"""
     page = request.args.get("page", 1, type=int)
     per_page = request.args.get("per_page", 10, type=int)
 
-    mechanics = Mechanic.query.paginate(
+    mechanics = Mechanic.query.options(
+        *mechanic_options()
+    ).order_by(Mechanic.id).paginate(
         page=page, per_page=per_page, error_out=False
     )
 
@@ -90,28 +106,171 @@ def get_mechanics_by_tickets():
     GET '/by-tickets': Get mechanics ordered by most tickets worked on
     This is the advanced query requirement from the assignment
     """
-    mechanics = (
-        db.session.query(Mechanic)
-        .join(Mechanic.service_tickets)
+    # Count in the same query instead of len(mechanic.service_tickets)
+    ticket_count = func.count(
+        mechanic_service_ticket.c.service_ticket_id
+    ).label("ticket_count")
+    rows = (
+        db.session.query(Mechanic, ticket_count)
+        .join(
+            mechanic_service_ticket,
+            mechanic_service_ticket.c.mechanic_id == Mechanic.id,
+        )
         .group_by(Mechanic.id)
-        .order_by(func.count(ServiceTicket.id).desc())
+        .order_by(ticket_count.desc())
+        .options(*mechanic_options())
         .all()
     )
 
     # Add ticket count to each mechanic's data
     result = []
-    for mechanic in mechanics:
+    for mechanic, count in rows:
         mechanic_data = mechanic_schema.dump(mechanic)
-        mechanic_data["ticket_count"] = len(mechanic.service_tickets)
+        mechanic_data["ticket_count"] = count
         result.append(mechanic_data)
 
     return jsonify(result), 200
 
 
+@mechanic_bp.route("/me/claim-next", methods=["POST"])
+@mechanic_token_required
+def claim_next_ticket(current_mechanic_id):
+    """
+    POST '/me/claim-next': Take the next open ticket for my specialty
+    Most urgent first, then oldest. Safe for many mechanics at once - each
+    gets a different ticket without retrying (see workflow.claim_next).
+    Returns 204 when there's nothing to claim.
+    """
+    specialty = db.session.execute(
+        select(Mechanic.specialty).where(Mechanic.id == current_mechanic_id)
+    ).first()
+    if specialty is None:
+        return jsonify({"error": "Mechanic not found"}), 404
+
+    try:
+        ticket_id = workflow.claim_next(current_mechanic_id, specialty[0])
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+
+    if ticket_id is None:
+        return "", 204
+    dispatch.assigned(current_mechanic_id)
+    ticket = ServiceTicket.query.options(
+        *service_ticket_options()
+    ).filter_by(id=ticket_id).one()
+    response = service_ticket_schema.jsonify(ticket)
+    events.publish(events.MECHANIC_ASSIGNED, ticket_id,
+                   mechanic_id=current_mechanic_id)
+    return response, 200
+
+
+@mechanic_bp.route("/me/time-entries", methods=["POST"])
+@mechanic_token_required
+def clock_time(current_mechanic_id):
+    """
+    POST '/me/time-entries': Log hours against my tickets
+    Body: {"entries": [{"ticket_id": 1, "hours": 1.5, "work_date":
+    "2026-10-19", "note": "..."}, ...]} - a whole day (or week) at once.
+    Every ticket must be assigned to me and no day may go over 24 hours;
+    otherwise nothing is saved. Each entry keeps my current hourly_rate.
+    """
+    try:
+        entries = clock_schema.load(
+            request.get_json(silent=True) or {}
+        )["entries"]
+    except ValidationError as e:
+        return jsonify({"error": e.messages}), 400
+
+    today = date.today()
+    for entry in entries:
+        entry["work_date"] = entry["work_date"] or today
+    if any(entry["work_date"] > today for entry in entries):
+        return jsonify({"error": "Can't log time for a future day"}), 400
+
+    ticket_ids = {entry["service_ticket_id"] for entry in entries}
+    assigned = set(db.session.execute(
+        select(mechanic_service_ticket.c.service_ticket_id).where(
+            mechanic_service_ticket.c.mechanic_id == current_mechanic_id,
+            mechanic_service_ticket.c.service_ticket_id.in_(ticket_ids),
+        )
+    ).scalars())
+    if ticket_ids - assigned:
+        return jsonify({
+            "error": "Not assigned to these tickets",
+            "ticket_ids": sorted(ticket_ids - assigned),
+        }), 400
+
+    # Lock my row until commit: two batches at once would each pass the
+    # 24 hour check below against what was logged before either of them
+    # (Postgres; SQLite has one writer anyway)
+    rate = db.session.execute(
+        select(Mechanic.hourly_rate).where(Mechanic.id == current_mechanic_id)
+        .with_for_update()
+    ).scalar()
+
+    # One query for what's already logged on the days in this batch
+    days = {}
+    for entry in entries:
+        days[entry["work_date"]] = days.get(entry["work_date"], 0) \
+            + entry["hours"]
+    logged = db.session.execute(
+        select(TimeEntry.work_date, func.sum(TimeEntry.hours))
+        .where(TimeEntry.mechanic_id == current_mechanic_id,
+               TimeEntry.work_date.in_(days))
+        .group_by(TimeEntry.work_date)
+    ).all()
+    for day, hours in logged:
+        days[day] += float(hours)
+    over = sorted(day.isoformat() for day, hours in days.items()
+                  if hours > 24)
+    if over:
+        return jsonify({"error": "More than 24 hours in a day",
+                        "days": over}), 400
+
+    rows = [TimeEntry(mechanic_id=current_mechanic_id, rate=rate, **entry)
+            for entry in entries]
+    try:
+        db.session.add_all(rows)
+        db.session.flush()
+        # Dump before commit expires the rows - no reload per entry
+        result = time_entries_schema.dump(rows)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    return jsonify(result), 201
+
+
+@mechanic_bp.route("/me/time-entries", methods=["GET"])
+@mechanic_token_required
+def get_time_entries(current_mechanic_id):
+    """
+    GET '/me/time-entries': My logged time, oldest day first
+    ?start=&end= (YYYY-MM-DD, inclusive) limit it to a range of days.
+    """
+    query = TimeEntry.query.filter_by(mechanic_id=current_mechanic_id)
+    try:
+        if request.args.get("start"):
+            query = query.filter(TimeEntry.work_date >= date.fromisoformat(
+                request.args["start"]))
+        if request.args.get("end"):
+            query = query.filter(TimeEntry.work_date <= date.fromisoformat(
+                request.args["end"]))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid date: {e}"}), 400
+    entries = query.order_by(TimeEntry.work_date, TimeEntry.id).all()
+    return jsonify(time_entries_schema.dump(entries)), 200
+
+
 @mechanic_bp.route("/<int:id>", methods=["GET"])
+@conditional(row_validator(Mechanic))
 def get_mechanic(id):
     """GET '/<int:id>': Retrieve a specific mechanic by ID"""
-    mechanic = Mechanic.query.get_or_404(id)
+    mechanic = Mechanic.query.options(
+        *mechanic_options()
+    ).filter_by(id=id).first_or_404()
     return mechanic_schema.jsonify(mechanic), 200
 
 
@@ -135,6 +294,8 @@ def update_mechanic(current_mechanic_id, id):
         updated_mechanic = update_schema.load(request.json, partial=True)
 
         db.session.commit()
+        index_mechanic(updated_mechanic)
+        dispatch.mechanic_changed(updated_mechanic)
         return mechanic_schema.jsonify(updated_mechanic), 200
     except Exception as e:
         db.session.rollback()
@@ -155,6 +316,8 @@ def delete_mechanic(current_mechanic_id, id):
     try:
         db.session.delete(mechanic)
         db.session.commit()
+        unindex("mechanic", id)
+        dispatch.mechanic_removed(id)
         return (
             jsonify({"message": "Mechanic account deleted successfully"}),
             200,
@@ -67,6 +67,28 @@ class MechanicLoginSchema(ma.Schema):
     password = fields.Str(required=True)
 
 
+class TimeEntrySchema(ma.Schema):
+    """One block of hours on a ticket - loaded from clock requests"""
+    id = fields.Int(dump_only=True)
+    ticket_id = fields.Int(required=True, attribute='service_ticket_id')
+    mechanic_id = fields.Int(dump_only=True)
+    work_date = fields.Date(load_default=None)  # None: today
+    hours = fields.Float(required=True,
+                         validate=validate.Range(min=0, max=24,
+                                                 min_inclusive=False))
+    rate = fields.Float(dump_only=True)
+    note = fields.Str(validate=validate.Length(max=200))
+    created_at = fields.DateTime(dump_only=True)
+
+
+class ClockSchema(ma.Schema):
+    """Body of POST /mechanics/me/time-entries - a day's entries at once"""
+    entries = fields.List(fields.Nested(TimeEntrySchema), required=True,
+                          validate=validate.Length(min=1, max=100))
+
+
 mechanic_schema = MechanicSchema()
 mechanics_schema = MechanicSchema(many=True)
 mechanic_login_schema = MechanicLoginSchema()
+time_entries_schema = TimeEntrySchema(many=True)
+clock_schema = ClockSchema()
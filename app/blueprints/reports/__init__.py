@@ -0,0 +1,7 @@
+from flask import Blueprint
+
+# Create reports blueprint
+reports_bp = Blueprint('reports', __name__)
+
+# Import routes to register them with the blueprint
+from app.blueprints.reports import routes
@@ -0,0 +1,148 @@
+"""
+Report routes - revenue, parts spend and ticket cost for management
+Every report sums the daily rollups in app/reports.py for the requested
+range; none of them touch the ticket table. Numbers are as of the last
+`flask refresh-reports`, returned as refreshed_through. The invoice run
+is the exception: it costs the tickets themselves (app/costing.py).
+"""
+from datetime import date
+from flask import Response, request, jsonify, stream_with_context
+from sqlalchemy import func, select
+from app.auth import mechanic_token_required
+from app.blueprints.reports import reports_bp
+from app.costing import COLUMNS, ENGINES, batch_costs
+from app.extention import db
+from app.exports import csv_chunks
+from app.reports import (
+    mechanic_rollups, month, part_rollups, priority_rollups,
+    refreshed_through
+)
+
+
+def _date_range():
+    """
+    (start, end) from ?start=&end= (YYYY-MM-DD, both inclusive)
+    Defaults to the twelve calendar months up to today.
+
+    Raises:
+        ValueError: a date doesn't parse or start is after end
+    """
+    today = date.today()
+    end = date.fromisoformat(request.args.get('end', today.isoformat()))
+    first = date(end.year, 1, 1) if end.month == 12 else \
+        date(end.year - 1, end.month + 1, 1)
+    start = date.fromisoformat(request.args.get('start',
+                                                first.isoformat()))
+    if start > end:
+        raise ValueError('start is after end')
+    return start, end
+
+
+def _money(value):
+    return round(float(value or 0), 2)
+
+
+def _report(build):
+    """Parse the range, run build(start, end) and wrap its rows"""
+    try:
+        start, end = _date_range()
+    except ValueError as e:
+        return jsonify({'error': f'Invalid date range: {e}'}), 400
+    through = refreshed_through()
+    return jsonify({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'refreshed_through': through.isoformat() if through else None,
+        'rows': build(start, end)
+    }), 200
+
+
+@reports_bp.route('/mechanic-revenue', methods=['GET'])
+@mechanic_token_required
+def mechanic_revenue(current_mechanic_id):
+    """GET '/mechanic-revenue': Labor and revenue per mechanic per month"""
+    def build(start, end):
+        r = mechanic_rollups
+        by_month = month(r.c.day)
+        rows = db.session.execute(
+            select(by_month, r.c.mechanic_id, func.sum(r.c.tickets),
+                   func.sum(r.c.labor), func.sum(r.c.revenue))
+            .where(r.c.day.between(start, end))
+            .group_by(by_month, r.c.mechanic_id)
+            .order_by(by_month, r.c.mechanic_id)
+        ).all()
+        return [{'month': row[0], 'mechanic_id': row[1], 'tickets': row[2],
+                 'labor': _money(row[3]), 'revenue': _money(row[4])}
+                for row in rows]
+    return _report(build)
+
+
+@reports_bp.route('/parts-spend', methods=['GET'])
+@mechanic_token_required
+def parts_spend(current_mechanic_id):
+    """GET '/parts-spend': Parts used per inventory category per month"""
+    def build(start, end):
+        r = part_rollups
+        by_month = month(r.c.day)
+        rows = db.session.execute(
+            select(by_month, r.c.category, func.sum(r.c.quantity),
+                   func.sum(r.c.spend))
+            .where(r.c.day.between(start, end))
+            .group_by(by_month, r.c.category)
+            .order_by(by_month, r.c.category)
+        ).all()
+        return [{'month': row[0], 'category': row[1], 'quantity': row[2],
+                 'spend': _money(row[3])}
+                for row in rows]
+    return _report(build)
+
+
+@reports_bp.route('/ticket-cost', methods=['GET'])
+@mechanic_token_required
+def ticket_cost(current_mechanic_id):
+    """GET '/ticket-cost': Average completed-ticket cost per priority"""
+    def build(start, end):
+        r = priority_rollups
+        rows = db.session.execute(
+            select(r.c.priority, func.sum(r.c.tickets), func.sum(r.c.labor),
+                   func.sum(r.c.parts), func.sum(r.c.total))
+            .where(r.c.day.between(start, end))
+            .group_by(r.c.priority)
+            .order_by(r.c.priority)
+        ).all()
+        return [{'priority': row[0], 'tickets': row[1],
+                 'average_cost': _money(row[4] / row[1]),
+                 'labor': _money(row[2]), 'parts': _money(row[3]),
+                 'total': _money(row[4])}
+                for row in rows]
+    return _report(build)
+
+
+@reports_bp.route('/invoices', methods=['GET'])
+@mechanic_token_required
+def invoices(current_mechanic_id):
+    """
+    GET '/invoices': CSV of every ticket completed in the range with its
+    labor, parts and total, streamed as it's written
+    ?engine=numpy|sql picks the costing engine (default: numpy if
+    installed).
+    """
+    engine = request.args.get('engine')
+    if engine is not None and engine not in ENGINES:
+        return jsonify({
+            'error': f'engine must be one of {list(ENGINES)}'
+        }), 400
+    try:
+        start, end = _date_range()
+        rows = batch_costs(start, end, engine=engine)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid date range: {e}'}), 400
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 400
+
+    filename = f'invoices-{start.isoformat()}-{end.isoformat()}.csv'
+    return Response(
+        stream_with_context(csv_chunks(COLUMNS, rows)),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
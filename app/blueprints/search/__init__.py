@@ -0,0 +1,7 @@
+from flask import Blueprint
+
+# Create search blueprint
+search_bp = Blueprint('search', __name__)
+
+# Import routes to register them with the blueprint
+from app.blueprints.search import routes
@@ -0,0 +1,29 @@
+"""
+Search routes - typeahead for the front desk
+Answers from the in-process prefix index in app/suggest.py, so typing a
+name doesn't cost a database query per keystroke
+"""
+from flask import request, jsonify
+from app.blueprints.search import search_bp
+from app.suggest import get_index
+
+SUGGEST_TYPES = {'customer', 'mechanic', 'part'}
+
+
+@search_bp.route('/suggest', methods=['GET'])
+def suggest():
+    """GET '/suggest?q=': Customers, mechanics and parts matching q"""
+    q = request.args.get('q', '').strip()
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+    types = request.args.get('types')
+    types = set(types.split(',')) if types else None
+
+    if types and not types <= SUGGEST_TYPES:
+        return jsonify({
+            'error': f'types must be from {sorted(SUGGEST_TYPES)}'
+        }), 400
+    if not q:
+        return jsonify({'query': q, 'suggestions': []}), 200
+
+    suggestions = get_index().search(q, limit=limit, types=types)
+    return jsonify({'query': q, 'suggestions': suggestions}), 200
@@ -5,26 +5,77 @@ This handles creating tickets, assigning mechanics, and adding parts
 The many-to-many relationships were confusing but I think I got them working
 The assignment wanted an edit route that can add/remove multiple mechanics
 """
-from flask import request, jsonify
+from datetime import date
+from flask import (
+    Response, abort, request, jsonify, stream_with_context
+)
+from marshmallow import ValidationError
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
 from app.blueprints.service_ticket import service_ticket_bp
-from app.models import ServiceTicket, Mechanic, Inventory
+from app.models import ServiceTicket, Mechanic, Inventory, ServiceTicketPart
 from app.blueprints.service_ticket.schema import (
-    service_ticket_schema, service_tickets_schema
+    service_ticket_schema, service_tickets_schema, service_ticket_part_schema,
+    ticket_transition_schema
 )
 from app.extention import db
+from app.loaders import service_ticket_options
+from app.fulltext import search_ticket_ids, search_terms
+from app.vehicles import vehicle_for_ticket
+from app import dispatch, events, stats, workflow
+from app.conditional import (
+    conditional, row_validator, table_validator, version_matches,
+    precondition_failed
+)
+from app.idempotency import idempotent
 
 
 @service_ticket_bp.route('/', methods=['POST'])
+@idempotent
 def create_service_ticket():
-    """POST '/': Pass in all required information to create service_ticket"""
+    """
+    POST '/': Pass in all required information to create service_ticket
+    ?dispatch=least-loaded assigns the mechanic with the ticket's specialty
+    and the fewest open tickets; least-cost weights that by hourly_rate
+    (see app/dispatch.py). Nobody with the specialty leaves it Open.
+    """
     # Anyone can create a service ticket for now
+    mode = request.args.get('dispatch')
+    if mode is not None and mode not in dispatch.MODES:
+        return jsonify({
+            'error': f'dispatch must be one of {sorted(dispatch.MODES)}'
+        }), 400
+
+    mechanic_id = None
     try:
         ticket_data = service_ticket_schema.load(request.json)
+        if ticket_data.vehicle_id is None:
+            # Link the vehicle described in vehicle_info, adding it if new
+            ticket_data.vehicle = vehicle_for_ticket(
+                ticket_data.customer_id, ticket_data.vehicle_info
+            )
         db.session.add(ticket_data)
+        if mode is not None and \
+                (ticket_data.status or workflow.OPEN) == workflow.OPEN:
+            db.session.flush()
+            mechanic_id = dispatch.auto_assign(
+                ticket_data.id, ticket_data.specialty,
+                weighted=dispatch.MODES[mode]
+            )
         db.session.commit()
-        return service_ticket_schema.jsonify(ticket_data), 201
+        response = service_ticket_schema.jsonify(ticket_data)
+        ticket_id = ticket_data.id  # publish() commits, expiring it
+        events.publish(events.CREATED, ticket_id,
+                       priority=ticket_data.priority,
+                       specialty=ticket_data.specialty)
+        if mechanic_id is not None:
+            events.publish(events.MECHANIC_ASSIGNED, ticket_id,
+                           mechanic_id=mechanic_id)
+        return response, 201
     except Exception as e:
         db.session.rollback()
+        dispatch.release(mechanic_id)
         return jsonify({'error': str(e)}), 400
 
 
@@ -33,29 +84,30 @@ def create_service_ticket():
     methods=['PUT']
 )
 def assign_mechanic(ticket_id, mechanic_id):
-    """PUT '/<ticket_id>/assign-mechanic/<mechanic_id>': Adds relationship"""
-    # This was easier than the bulk edit route below
-    ticket = ServiceTicket.query.get_or_404(ticket_id)
-    mechanic = Mechanic.query.get_or_404(mechanic_id)
-
+    """
+    PUT '/<ticket_id>/assign-mechanic/<mechanic_id>': Adds relationship
+    An Open ticket moves to In Progress in the same transaction - see
+    app/workflow.py, nothing is loaded first
+    """
     try:
-        # Check if mechanic is already assigned (avoid duplicates)
-        if mechanic not in ticket.mechanics:
-            # Use relationship attributes to treat the relationship like a list
-            ticket.mechanics.append(mechanic)
-            ticket.status = 'In Progress'  # Update status
-            db.session.commit()
-            return jsonify({
-                'message': f'Mechanic {mechanic_id} assigned to {ticket_id}'
-            }), 200
-        else:
-            return jsonify({
-                'message': 'Mechanic already assigned to this ticket'
-            }), 400
-
-    except Exception as e:
+        missing = workflow.assign(ticket_id, mechanic_id)
+        if missing:
+            db.session.rollback()
+            abort(404)
+        db.session.commit()
+        dispatch.recount([mechanic_id])
+        events.publish(events.MECHANIC_ASSIGNED, ticket_id,
+                       mechanic_id=mechanic_id)
+        return jsonify({
+            'message': f'Mechanic {mechanic_id} assigned to {ticket_id}'
+        }), 200
+
+    except IntegrityError:
+        # Link row already there
         db.session.rollback()
-        return jsonify({'error': str(e)}), 400
+        return jsonify({
+            'message': 'Mechanic already assigned to this ticket'
+        }), 400
 
 
 @service_ticket_bp.route(
@@ -63,110 +115,174 @@ def assign_mechanic(ticket_id, mechanic_id):
     methods=['PUT']
 )
 def remove_mechanic(ticket_id, mechanic_id):
-    """PUT '/<ticket_id>/remove-mechanic/<mechanic_id>': Remove mechanic"""
-    ticket = ServiceTicket.query.get_or_404(ticket_id)
-    mechanic = Mechanic.query.get_or_404(mechanic_id)
-
+    """
+    PUT '/<ticket_id>/remove-mechanic/<mechanic_id>': Remove mechanic
+    The ticket goes back to Open when its last mechanic is removed
+    """
     try:
-        # Check if mechanic is assigned to this ticket
-        if mechanic in ticket.mechanics:
-            # Use relationship attributes to treat the relationship like a list
-            ticket.mechanics.remove(mechanic)
-            # Reset status if no mechanics are assigned
-            if not ticket.mechanics:
-                ticket.status = 'Open'
+        removed = workflow.unassign(ticket_id, mechanic_id)
+        if removed:
             db.session.commit()
+            dispatch.recount([mechanic_id])
+            events.publish(events.MECHANIC_REMOVED, ticket_id,
+                           mechanic_id=mechanic_id)
             return jsonify({
                 'message': f'Mechanic {mechanic_id} removed from {ticket_id}'
             }), 200
-        else:
-            return jsonify({
-                'error': 'Mechanic not assigned to this ticket'
-            }), 400
-
+        db.session.rollback()
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 400
 
+    # Nothing deleted - work out why for the response
+    ServiceTicket.query.get_or_404(ticket_id)
+    Mechanic.query.get_or_404(mechanic_id)
+    return jsonify({
+        'error': 'Mechanic not assigned to this ticket'
+    }), 400
+
 
 @service_ticket_bp.route('/<int:ticket_id>/edit', methods=['PUT'])
 def edit_ticket_mechanics(ticket_id):
     """
     PUT '/<int:ticket_id>/edit': Add and remove mechanics from a ticket
     This is the advanced query requirement - bulk operations
+
+    Body: {"add_ids": [...], "remove_ids": [...]}. Unknown ids are ignored.
     """
-    ticket = ServiceTicket.query.get_or_404(ticket_id)
+    ServiceTicket.query.get_or_404(ticket_id)
 
     try:
         data = request.get_json()
-
-        # Remove mechanics first
+        add_ids = data.get('add_ids', [])
         remove_ids = data.get('remove_ids', [])
-        for mechanic_id in remove_ids:
-            mechanic = Mechanic.query.get(mechanic_id)
-            if mechanic and mechanic in ticket.mechanics:
-                ticket.mechanics.remove(mechanic)
+        workflow.edit_mechanics(ticket_id, add_ids=add_ids,
+                                remove_ids=remove_ids)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    dispatch.recount(set(add_ids) | set(remove_ids))
 
-        # Then add new mechanics
-        add_ids = data.get('add_ids', [])
-        for mechanic_id in add_ids:
-            mechanic = Mechanic.query.get(mechanic_id)
-            if mechanic and mechanic not in ticket.mechanics:
-                ticket.mechanics.append(mechanic)
+    ticket = ServiceTicket.query.options(
+        *service_ticket_options()
+    ).filter_by(id=ticket_id).one()
+    response = service_ticket_schema.jsonify(ticket)
+    events.publish(events.MECHANICS_CHANGED, ticket_id,
+                   mechanic_ids=[mechanic.id for mechanic in ticket.mechanics])
+    return response, 200
 
-        # Update status based on whether we have mechanics assigned
-        if ticket.mechanics:
-            ticket.status = 'In Progress'
-        else:
-            ticket.status = 'Open'
 
+@service_ticket_bp.route('/<int:ticket_id>/transition', methods=['POST'])
+def transition_ticket(ticket_id):
+    """
+    POST '/<int:ticket_id>/transition': Move a ticket to another status
+    Body: {"status": "Completed"}. Open -> In Progress -> Completed or
+    Cancelled; the check and the write are one UPDATE, so of two racing
+    requests only the first can win.
+    """
+    try:
+        status = ticket_transition_schema.load(
+            request.get_json(silent=True) or {}
+        )['status']
+    except ValidationError as e:
+        return jsonify({'error': e.messages}), 400
+
+    if workflow.transition(ticket_id, status):
         db.session.commit()
-        return service_ticket_schema.jsonify(ticket), 200
+        if status in workflow.FINAL:
+            dispatch.recount_ticket(ticket_id)
+        events.publish(events.STATUS_CHANGED, ticket_id)
+        return jsonify({'id': ticket_id, 'status': status}), 200
+    db.session.rollback()
 
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': str(e)}), 400
+    # Nothing updated - the ticket is missing or in the wrong state
+    ticket = ServiceTicket.query.get_or_404(ticket_id)
+    return _illegal_transition(ticket.status, status)
+
+
+def _illegal_transition(current, status):
+    current = current or workflow.OPEN
+    return jsonify({
+        'error': f"Can't move a ticket from {current} to {status}",
+        'status': current,
+        'allowed': sorted(workflow.TRANSITIONS.get(current, ()))
+    }), 409
 
 
 @service_ticket_bp.route(
     '/<int:ticket_id>/add-part/<int:inventory_id>',
     methods=['PUT']
 )
+@idempotent
 def add_part_to_ticket(ticket_id, inventory_id):
     """
     PUT '/<int:ticket_id>/add-part/<int:inventory_id>': Add part to ticket
     This connects inventory to service tickets - assignment requirement
+
+    Optional body: {"quantity": 4} (defaults to 1). Stock is taken with one
+    conditional UPDATE so two mechanics can't both grab the last part.
     """
-    ticket = ServiceTicket.query.get_or_404(ticket_id)
-    inventory_item = Inventory.query.get_or_404(inventory_id)
+    ServiceTicket.query.get_or_404(ticket_id)
+
+    try:
+        quantity = service_ticket_part_schema.load(
+            request.get_json(silent=True) or {}
+        )['quantity']
+    except ValidationError as e:
+        return jsonify({'error': e.messages}), 400
 
     try:
-        # Check if part is already added to this ticket (avoid duplicates)
-        if inventory_item not in ticket.inventory_items:
-            ticket.inventory_items.append(inventory_item)
-            # Recalculate total cost when parts are added
-            ticket.calculate_total_cost()  # method defined in the model
+        # Decrement only if there's enough stock - no read-modify-write
+        taken = db.session.execute(
+            update(Inventory)
+            .where(Inventory.id == inventory_id,
+                   Inventory.quantity >= quantity)
+            .values(quantity=Inventory.quantity - quantity,
+                    version=Inventory.version + 1)
+        ).rowcount
+        if taken:
+            db.session.add(ServiceTicketPart(service_ticket_id=ticket_id,
+                                             inventory_id=inventory_id,
+                                             quantity=quantity))
             db.session.commit()
+            events.publish(events.PART_ADDED, ticket_id,
+                           inventory_id=inventory_id, quantity=quantity)
             return jsonify({
-                'message': f'Part {inventory_id} added to {ticket_id}'
+                'message': f'Part {inventory_id} added to {ticket_id}',
+                'quantity': quantity
             }), 200
-        else:
-            return jsonify({
-                'message': 'Part already added to this ticket'
-            }), 400
+        db.session.rollback()
 
+    except IntegrityError:
+        # Primary key clash - the part is already on this ticket
+        db.session.rollback()
+        return jsonify({
+            'message': 'Part already added to this ticket'
+        }), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 400
 
+    # Nothing was taken - either the part doesn't exist or stock is short
+    inventory_item = Inventory.query.get_or_404(inventory_id)
+    return jsonify({
+        'error': 'Not enough stock',
+        'requested': quantity,
+        'available': inventory_item.quantity or 0
+    }), 409
+
 
 @service_ticket_bp.route('/', methods=['GET'])
+@conditional(table_validator(ServiceTicket))
 def get_service_tickets():
     """GET '/': Retrieves all service tickets with pagination"""
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
 
-    tickets = ServiceTicket.query.paginate(
+    tickets = ServiceTicket.query.options(
+        *service_ticket_options()
+    ).order_by(ServiceTicket.id).paginate(
         page=page, per_page=per_page, error_out=False
     )
 
@@ -180,24 +296,119 @@ def get_service_tickets():
     }), 200
 
 
+@service_ticket_bp.route('/search', methods=['GET'])
+def search_service_tickets():
+    """
+    GET '/search?q=': Full-text search over title, description, vehicle
+    Results are ranked best match first and paginated like GET '/'
+    """
+    q = request.args.get('q', '')
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 10, type=int), 1), 100)
+
+    if not search_terms(q):
+        return jsonify({'error': 'Query parameter q is required'}), 400
+
+    ids, total = search_ticket_ids(q, page=page, per_page=per_page)
+    tickets = ServiceTicket.query.options(
+        *service_ticket_options()
+    ).filter(ServiceTicket.id.in_(ids)).all() if ids else []
+    # Put the page back in rank order
+    tickets.sort(key=lambda ticket: ids.index(ticket.id))
+
+    pages = -(-total // per_page)
+    return jsonify({
+        'query': q,
+        'service_tickets': service_tickets_schema.dump(tickets),
+        'total': total,
+        'pages': pages,
+        'current_page': page,
+        'has_next': page < pages,
+        'has_prev': page > 1
+    }), 200
+
+
+@service_ticket_bp.route('/stats', methods=['GET'])
+def service_ticket_stats():
+    """
+    GET '/stats': Ticket counts by status and priority, and open tickets
+    per mechanic, for the management dashboard
+    Read from counters the ticket writes keep current (see app/stats.py)
+    instead of grouping the whole ticket table on every refresh.
+    """
+    return jsonify(stats.ticket_stats()), 200
+
+
+@service_ticket_bp.route('/events', methods=['GET'])
+def ticket_events():
+    """
+    GET '/events': Server-Sent Events stream for shop-floor displays
+    Sends created, status-changed, mechanic-assigned/-removed/-changed,
+    part-added and deleted events as they happen, each with the ticket's
+    current status. Reconnect with Last-Event-ID (or ?last_event_id=) to
+    get everything missed; without it the stream starts from now.
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or \
+        request.args.get('last_event_id')
+    if last_event_id is None:
+        after_id = events.latest_id()
+    else:
+        try:
+            after_id = int(last_event_id)
+        except ValueError:
+            return jsonify({'error': 'Last-Event-ID must be an integer'}), 400
+
+    return Response(
+        stream_with_context(events.stream(after_id)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
 @service_ticket_bp.route('/<int:ticket_id>', methods=['GET'])
+@conditional(row_validator(ServiceTicket))
 def get_service_ticket(ticket_id):
     """GET '/<int:ticket_id>': Retrieve a specific service ticket"""
-    ticket = ServiceTicket.query.get_or_404(ticket_id)
+    ticket = ServiceTicket.query.options(
+        *service_ticket_options()
+    ).filter_by(id=ticket_id).first_or_404()
     return service_ticket_schema.jsonify(ticket), 200
 
 
 @service_ticket_bp.route('/<int:ticket_id>', methods=['PUT'])
 def update_service_ticket(ticket_id):
-    """PUT '/<int:ticket_id>': Updates a specific service ticket"""
+    """
+    PUT '/<int:ticket_id>': Updates a specific service ticket
+    Send the ETag you read in If-Match to only update that version
+    """
     ticket = ServiceTicket.query.get_or_404(ticket_id)
+    if not version_matches(ticket):
+        return precondition_failed(ticket)
+    status = (request.get_json(silent=True) or {}).get('status')
+    if status in workflow.STATUSES and \
+            not workflow.can_transition(ticket.status, status):
+        return _illegal_transition(ticket.status, status)
 
     try:
+        moved = status in workflow.STATUSES and ticket.status != status
         updated_ticket = service_ticket_schema.load(
             request.json, instance=ticket, partial=True
         )
+        if moved and status == workflow.COMPLETED and \
+                updated_ticket.completion_date is None:
+            # As workflow.transition() does - reports key on this day
+            updated_ticket.completion_date = date.today()
         db.session.commit()
-        return service_ticket_schema.jsonify(updated_ticket), 200
+        response = service_ticket_schema.jsonify(updated_ticket)
+        if moved:
+            if status in workflow.FINAL:
+                dispatch.recount_ticket(ticket_id)
+            events.publish(events.STATUS_CHANGED, ticket_id)
+        return response, 200
+    except StaleDataError:
+        # Someone else committed between our read and our UPDATE
+        db.session.rollback()
+        return precondition_failed(db.session.get(ServiceTicket, ticket_id))
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 400
@@ -209,8 +420,12 @@ def delete_service_ticket(ticket_id):
     ticket = ServiceTicket.query.get_or_404(ticket_id)
 
     try:
+        # Loaded anyway to delete the link rows
+        mechanic_ids = [mechanic.id for mechanic in ticket.mechanics]
         db.session.delete(ticket)
         db.session.commit()
+        dispatch.recount(mechanic_ids)
+        events.publish(events.DELETED, ticket_id)
         return jsonify({'message': 'Service ticket deleted successfully'}), 200
     except Exception as e:
         db.session.rollback()
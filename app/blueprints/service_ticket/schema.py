@@ -1,8 +1,20 @@
 from app.extention import ma
 from app.models import ServiceTicket
+from app.workflow import STATUSES
 from marshmallow import fields, validate
 
 
+class ServiceTicketPartSchema(ma.Schema):
+    """Schema for a part on a ticket - also validates add-part requests"""
+    inventory_id = fields.Int(dump_only=True)
+    quantity = fields.Int(load_default=1, validate=validate.Range(min=1))
+
+
+class TicketTransitionSchema(ma.Schema):
+    """Body of POST /service-tickets/<id>/transition"""
+    status = fields.Str(required=True, validate=validate.OneOf(STATUSES))
+
+
 class ServiceTicketSchema(ma.SQLAlchemyAutoSchema):
     """Schema for Service Ticket model serialization and validation"""
 
@@ -11,6 +23,9 @@ class ServiceTicketSchema(ma.SQLAlchemyAutoSchema):
         load_instance = True
         include_relationships = True
         include_fk = True  # Include foreign keys like customer_id
+        # vehicle_id already identifies the vehicle; time entries are
+        # listed under /mechanics/me/time-entries
+        exclude = ('vehicle', 'time_entries')
 
     # Fields to match the actual model
     id = fields.Int(dump_only=True)
@@ -18,21 +33,29 @@ class ServiceTicketSchema(ma.SQLAlchemyAutoSchema):
     description = fields.Str(required=True, validate=validate.Length(min=1))
     customer_id = fields.Int(required=True)
     vehicle_info = fields.Str(validate=validate.Length(max=200))
+    vehicle_id = fields.Int(allow_none=True)
     estimated_cost = fields.Float(validate=validate.Range(min=0))
-    status = fields.Str(
-        validate=validate.OneOf([
-            'Open', 'In Progress', 'Completed', 'Cancelled'
-        ])
-    )
+    status = fields.Str(validate=validate.OneOf(STATUSES))
     priority = fields.Str(
         validate=validate.OneOf([
             'Low', 'Medium', 'High', 'Urgent'
         ])
     )
     completion_date = fields.Date(allow_none=True)
+    specialty = fields.Str(allow_none=True,
+                           validate=validate.Length(max=100))
+    parts = fields.Nested(ServiceTicketPartSchema, many=True, dump_only=True)
+    # Same ids as before, read off parts so it doesn't cost another query
+    inventory_items = fields.Method('get_inventory_item_ids', dump_only=True)
     created_at = fields.DateTime(dump_only=True)
     updated_at = fields.DateTime(dump_only=True)
+    version = fields.Int(dump_only=True)  # send back in If-Match on PUT
+
+    def get_inventory_item_ids(self, ticket):
+        return [part.inventory_id for part in ticket.parts]
 
 
+service_ticket_part_schema = ServiceTicketPartSchema()
+ticket_transition_schema = TicketTransitionSchema()
 service_ticket_schema = ServiceTicketSchema()
 service_tickets_schema = ServiceTicketSchema(many=True)
@@ -0,0 +1,7 @@
+from flask import Blueprint
+
+# Create vehicle blueprint
+vehicle_bp = Blueprint('vehicle', __name__)
+
+# Import routes to register them with the blueprint
+from app.blueprints.vehicle import routes
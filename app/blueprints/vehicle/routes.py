@@ -0,0 +1,97 @@
+"""
+Vehicle routes - one row per car, so service history is an indexed lookup
+Tickets reference a vehicle by vehicle_id; older tickets are linked from
+their vehicle_info text by `flask backfill-vehicles` (app/vehicles.py)
+"""
+from flask import request, jsonify
+from sqlalchemy.orm import selectinload
+from sqlalchemy.exc import IntegrityError
+from app.blueprints.vehicle import vehicle_bp
+from app.blueprints.vehicle.schema import (
+    vehicle_schema, vehicles_schema, history_tickets_schema
+)
+from app.models import Vehicle, ServiceTicket, ServiceTicketPart
+from app.extention import db
+from app.loaders import strict_loading
+from app.conditional import conditional, table_validator
+
+
+@vehicle_bp.route('/', methods=['POST'])
+def create_vehicle():
+    """POST '/': Register a vehicle by VIN"""
+    try:
+        vehicle = vehicle_schema.load(request.json)
+        db.session.add(vehicle)
+        db.session.commit()
+        return vehicle_schema.jsonify(vehicle), 201
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({
+            'error': 'A vehicle with this VIN already exists'
+        }), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+
+
+@vehicle_bp.route('/', methods=['GET'])
+@conditional(table_validator(Vehicle))
+def get_vehicles():
+    """GET '/': Vehicles with pagination, optionally by plate or customer"""
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 10, type=int)
+
+    query = Vehicle.query.options(*strict_loading())
+    plate = request.args.get('plate')
+    if plate:
+        query = query.filter(Vehicle.plate == plate.strip().upper())
+    customer_id = request.args.get('customer_id', type=int)
+    if customer_id is not None:
+        query = query.filter(Vehicle.customer_id == customer_id)
+
+    vehicles = query.order_by(Vehicle.id).paginate(
+        page=page, per_page=per_page, error_out=False
+    )
+    return jsonify({
+        'vehicles': vehicles_schema.dump(vehicles.items),
+        'total': vehicles.total,
+        'pages': vehicles.pages,
+        'current_page': vehicles.page,
+        'has_next': vehicles.has_next,
+        'has_prev': vehicles.has_prev
+    }), 200
+
+
+@vehicle_bp.route('/<vin>', methods=['GET'])
+def get_vehicle(vin):
+    """GET '/<vin>': Retrieve a vehicle by VIN"""
+    vehicle = Vehicle.query.options(
+        *strict_loading()
+    ).filter_by(vin=vin.upper()).first_or_404()
+    return vehicle_schema.jsonify(vehicle), 200
+
+
+@vehicle_bp.route('/<vin>/history', methods=['GET'])
+def get_vehicle_history(vin):
+    """
+    GET '/<vin>/history': Every ticket for a vehicle, newest first
+    Always four queries however long the history is - the vehicle, its
+    tickets, then their mechanics and parts (with part details) in bulk
+    """
+    vehicle = Vehicle.query.options(
+        *strict_loading()
+    ).filter_by(vin=vin.upper()).first_or_404()
+
+    parts = selectinload(ServiceTicket.parts)
+    tickets = ServiceTicket.query.options(*strict_loading(
+        selectinload(ServiceTicket.mechanics),
+        parts.joinedload(ServiceTicketPart.inventory),
+    )).filter_by(vehicle_id=vehicle.id).order_by(
+        ServiceTicket.created_at.desc(), ServiceTicket.id.desc()
+    ).all()
+
+    return jsonify({
+        'vehicle': vehicle_schema.dump(vehicle),
+        'service_tickets': history_tickets_schema.dump(tickets),
+        'total': len(tickets)
+    }), 200
@@ -0,0 +1,66 @@
+from app.extention import ma
+from app.models import Vehicle
+from marshmallow import fields, validate, pre_load
+
+
+class VehicleSchema(ma.SQLAlchemyAutoSchema):
+    """Schema for Vehicle model serialization and validation"""
+
+    class Meta:
+        model = Vehicle
+        load_instance = True
+        include_fk = True  # customer_id
+        exclude = ('service_tickets',)
+
+    id = fields.Int(dump_only=True)
+    vin = fields.Str(required=True, validate=validate.Regexp(
+        r'^[A-HJ-NPR-Z0-9]{17}$',
+        error='VIN must be 17 characters (no I, O or Q)'
+    ))
+    plate = fields.Str(allow_none=True, validate=validate.Length(max=20))
+    make = fields.Str(validate=validate.Length(max=50))
+    model = fields.Str(validate=validate.Length(max=100))
+    year = fields.Int(validate=validate.Range(min=1900, max=2100))
+    customer_id = fields.Int(allow_none=True)
+    created_at = fields.DateTime(dump_only=True)
+    updated_at = fields.DateTime(dump_only=True)
+
+    @pre_load
+    def normalize(self, data, **kwargs):
+        """VINs and plates are stored upper case so lookups are exact"""
+        for key in ('vin', 'plate'):
+            if isinstance(data.get(key), str):
+                data[key] = data[key].strip().upper()
+        return data
+
+
+class HistoryMechanicSchema(ma.Schema):
+    id = fields.Int()
+    name = fields.Str()
+    specialty = fields.Str()
+
+
+class HistoryPartSchema(ma.Schema):
+    inventory_id = fields.Int()
+    name = fields.Str(attribute='inventory.name')
+    price = fields.Float(attribute='inventory.price')
+    quantity = fields.Int()
+
+
+class HistoryTicketSchema(ma.Schema):
+    """One visit in a vehicle's service history"""
+    id = fields.Int()
+    title = fields.Str()
+    description = fields.Str()
+    status = fields.Str()
+    priority = fields.Str()
+    estimated_cost = fields.Float()
+    completion_date = fields.Date()
+    created_at = fields.DateTime()
+    mechanics = fields.Nested(HistoryMechanicSchema, many=True)
+    parts = fields.Nested(HistoryPartSchema, many=True)
+
+
+vehicle_schema = VehicleSchema()
+vehicles_schema = VehicleSchema(many=True)
+history_tickets_schema = HistoryTicketSchema(many=True)
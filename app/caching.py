@@ -0,0 +1,133 @@
+"""
+Cached read routes without stampedes
+
+@cache.cached lets every request that misses at the same moment run the
+query and dump - when a popular entry expires at peak, or a write moves
+the ETag in cache_key() to a new key, that's every concurrent request.
+cached() here is a drop-in for it that adds:
+
+- single flight: one request per key runs the view. Others in the same
+  worker wait on it; other workers see a lock entry in the cache
+  (cache.add, so only one gets it) and poll for the result. A waiter
+  gives up after CACHE_WAIT_SECONDS and runs the view itself, and the
+  lock expires after CACHE_LOCK_SECONDS if its worker dies. Only a shared
+  cache makes this hold across workers: config.py picks RedisCache when
+  REDIS_URL is set. With the SimpleCache fallback every worker has its own
+  entries and locks, so a key is computed once per worker.
+- stale-while-revalidate: an entry is kept CACHE_STALE_SECONDS past its
+  timeout. In that window the request that takes the lock refreshes it
+  and everyone else gets the old body straight away. Keys carry the
+  ETag, so the old body is still the current data - only its age shows.
+
+Only 200s are cached.
+"""
+import threading
+import time
+from functools import wraps
+from flask import current_app, make_response
+from app.conditional import cache_key
+from app.extention import cache
+
+LOCK_PREFIX = 'lock/'
+
+# Keys this worker is computing now, so its waiters needn't poll
+_running = {}
+_running_lock = threading.Lock()
+
+
+def _acquire(key):
+    """The Event to set when done if we get to compute key, else None"""
+    with _running_lock:
+        if key in _running:
+            return None
+        running = _running[key] = threading.Event()
+    timeout = current_app.config.get('CACHE_LOCK_SECONDS', 30)
+    if cache.add(LOCK_PREFIX + key, True, timeout=timeout):
+        return running
+    # Another worker has it
+    _finish(key, running)
+    return None
+
+
+def _finish(key, running):
+    with _running_lock:
+        _running.pop(key, None)
+    running.set()
+
+
+def _compute(key, running, timeout, stale, view, args, kwargs):
+    try:
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200 and not response.is_streamed:
+            cache.set(key, {
+                'body': response.get_data(),
+                'mimetype': response.mimetype,
+                'fresh_until': time.time() + timeout,
+            }, timeout=timeout + stale)
+        return response
+    finally:
+        cache.delete(LOCK_PREFIX + key)
+        _finish(key, running)
+
+
+def _replay(entry):
+    return current_app.response_class(entry['body'],
+                                      mimetype=entry['mimetype'])
+
+
+def _wait(key):
+    """The entry once whoever is computing it is done, or None"""
+    config = current_app.config
+    poll = config.get('CACHE_POLL_INTERVAL', 0.05)
+    deadline = time.monotonic() + config.get('CACHE_WAIT_SECONDS', 5)
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        with _running_lock:
+            running = _running.get(key)
+        if running is not None:
+            running.wait(min(poll, remaining))
+        else:
+            time.sleep(min(poll, remaining))
+        entry = cache.get(key)
+        if entry is not None or cache.get(LOCK_PREFIX + key) is None:
+            return entry
+
+
+def cached(timeout=None, key_prefix=cache_key, stale=None):
+    """
+    Cache a view's 200 response, one refresh at a time
+
+    Args:
+        timeout (int): seconds an entry is fresh (CACHE_DEFAULT_TIMEOUT)
+        key_prefix: cache key, or a callable returning one
+        stale (int): seconds an expired entry is still served while it's
+            refreshed (CACHE_STALE_SECONDS; 0 turns it off)
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            config = current_app.config
+            fresh_for = config.get('CACHE_DEFAULT_TIMEOUT', 300) \
+                if timeout is None else timeout
+            stale_for = config.get('CACHE_STALE_SECONDS', 0) \
+                if stale is None else stale
+            key = key_prefix() if callable(key_prefix) else key_prefix
+
+            while True:
+                entry = cache.get(key)
+                if entry is not None and time.time() < entry['fresh_until']:
+                    return _replay(entry)
+                running = _acquire(key)
+                if running is not None:
+                    return _compute(key, running, fresh_for, stale_for,
+                                    view, args, kwargs)
+                if entry is not None:
+                    return _replay(entry)  # stale, being refreshed
+                if _wait(key) is None and \
+                        cache.get(LOCK_PREFIX + key) is not None:
+                    # Whoever has the lock is too slow - don't pile up
+                    return view(*args, **kwargs)
+        return wrapper
+    return decorator
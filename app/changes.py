@@ -0,0 +1,274 @@
+"""
+Change log behind GET /changes - incremental sync for mobile and
+back-office clients
+
+Every create, update and delete of a customer, mechanic, inventory item or
+service ticket adds a change_log row in the same transaction: ORM writes
+through the after_flush hook below, the Core UPDATEs in app/workflow.py by
+calling record() themselves. The rows are collected on the session and
+inserted as the last thing before COMMIT, so seq is handed out at commit
+time (see read_changes). Clients keep the last `seq` they saw and ask for
+what changed after it, so a sync costs one row per change instead of
+re-listing every collection.
+
+`flask compact-changes` is the retention policy: it deletes every row that
+a newer row for the same entity supersedes, and tombstones older than
+--tombstone-days. What's left is the newest row per live entity, so
+since=0 pages through a full snapshot; a cursor older than the deleted
+tombstones gets a 410 and has to start over from 0.
+`flask backfill-changes` adds rows for data written before the log existed.
+"""
+import time
+from datetime import datetime, timedelta
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import delete, event, exists, func, insert, literal, select
+from sqlalchemy.orm import Session
+from app.extention import db
+from app.models import (
+    ChangeLog, Customer, Mechanic, Inventory, ServiceTicket,
+    ServiceTicketPart
+)
+
+UPSERT = 'U'
+DELETE = 'D'
+PRUNED = 'P'  # bookkeeping row: entity_id is the newest pruned tombstone
+HORIZON = 'change_log'
+
+MODELS = {model.__tablename__: model
+          for model in (Customer, Mechanic, Inventory, ServiceTicket)}
+TRACKED = tuple(MODELS.values())
+SETTLE = timedelta(seconds=2)  # see read_changes
+
+change_log = ChangeLog.__table__
+
+
+def _now(dialect):
+    """
+    The database's clock, in UTC like the rest of the table - the hosts
+    writing rows and the one reading them can't be trusted to agree
+    """
+    if dialect.name == 'postgresql':
+        # Wall clock at this statement; now() is when the transaction began
+        return func.timezone('UTC', func.clock_timestamp())
+    return func.current_timestamp()
+
+
+def _holds_back(dialect):
+    """Does read_changes wait SETTLE? SQLite commits in seq order anyway"""
+    return dialect.name != 'sqlite'
+
+
+def _pending(session):
+    """(entity, id) -> op this session's transaction logs when it commits"""
+    return session.info.setdefault('change_log', {})
+
+
+def _queue(session, changes):
+    pending = _pending(session)
+    for key, op in changes:
+        if key[1] is not None:
+            # Newest op per row, in the order of that op
+            pending.pop(key, None)
+            pending[key] = op
+
+
+def record(entity, ids, op=UPSERT, connection=None):
+    """
+    Log a write done with a Core statement (ORM writes log themselves)
+
+    Args:
+        entity (str): table name, a key of MODELS
+        ids: ids of the rows written
+        op (str): UPSERT or DELETE
+        connection: write now on this connection instead of at the
+            session's commit
+    """
+    if connection is None:
+        _queue(db.session(), [((entity, row_id), op) for row_id in ids])
+        return
+    rows = [{'entity': entity, 'entity_id': row_id, 'op': op}
+            for row_id in set(ids) if row_id is not None]
+    if rows:
+        connection.execute(insert(change_log).values(
+            changed_at=_now(connection.dialect)), rows)
+
+
+@event.listens_for(Session, 'after_flush')
+def _log_flush(session, flush_context):
+    """Queue the tracked rows this flush inserted, updated or deleted"""
+    changes = {}
+    for obj in session.new:
+        if isinstance(obj, TRACKED):
+            changes[(obj.__tablename__, obj.id)] = UPSERT
+    for obj in session.dirty:
+        if isinstance(obj, TRACKED) and session.is_modified(obj):
+            changes[(obj.__tablename__, obj.id)] = UPSERT
+    for obj in list(session.new) + list(session.deleted):
+        # Tickets list their parts; the stock UPDATE goes with the part
+        if isinstance(obj, ServiceTicketPart):
+            changes.setdefault(('service_tickets', obj.service_ticket_id),
+                               UPSERT)
+            changes.setdefault(('inventory', obj.inventory_id), UPSERT)
+    for obj in session.deleted:
+        if isinstance(obj, TRACKED):
+            changes[(obj.__tablename__, obj.id)] = DELETE
+    _queue(session, changes.items())
+
+
+@event.listens_for(Session, 'before_commit')
+def _write_log(session):
+    """Insert the queued rows last thing before COMMIT"""
+    session.flush()  # commit's own flush runs after this hook
+    pending = session.info.pop('change_log', None)
+    if pending:
+        connection = session.connection()
+        connection.execute(
+            insert(change_log).values(changed_at=_now(connection.dialect)),
+            [{'entity': entity, 'entity_id': row_id, 'op': op}
+             for (entity, row_id), op in pending.items()]
+        )
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _drop_log(session, transaction):
+    """A rolled back (or closed) transaction logs nothing"""
+    if transaction.parent is None:
+        session.info.pop('change_log', None)
+
+
+def horizon():
+    """Cursors below this missed tombstones compaction has deleted"""
+    return db.session.execute(
+        select(func.coalesce(func.max(change_log.c.entity_id), 0))
+        .where(change_log.c.entity == HORIZON)
+    ).scalar()
+
+
+def read_changes(since, types=None, limit=500):
+    """
+    The newest change per entity among the `limit` rows after `since`
+
+    On Postgres seq is handed out before commit, so a row can become
+    visible after a higher one, and a client whose cursor already moved
+    past it would never see it. The rows are inserted just before COMMIT
+    (_write_log), however long the transaction ran, and stamped with the
+    database's clock, so that window is the commit itself. The page ends
+    at the first row younger than SETTLE: a lower seq may still be
+    committing, and the cursor mustn't pass it. SQLite commits one writer
+    at a time in seq order.
+
+    Returns:
+        tuple: ([(seq, entity, id, op)] oldest first, cursor, has_more)
+    """
+    dialect = db.engine.dialect
+    settled = literal(True)
+    if _holds_back(dialect):
+        cutoff = db.session.execute(select(_now(dialect))).scalar() - SETTLE
+        settled = change_log.c.changed_at < cutoff
+    query = select(change_log.c.seq, change_log.c.entity,
+                   change_log.c.entity_id, change_log.c.op,
+                   settled.label('settled')) \
+        .where(change_log.c.seq > since, change_log.c.entity != HORIZON) \
+        .order_by(change_log.c.seq).limit(limit)
+    if types:
+        query = query.where(change_log.c.entity.in_(types))
+    rows = db.session.execute(query).all()
+
+    cursor, latest, read = since, {}, 0
+    for row in rows:
+        if not row.settled:
+            break
+        read += 1
+        cursor = row.seq
+        # Keep only the newest change per entity, in the order of that one
+        latest.pop((row.entity, row.entity_id), None)
+        latest[(row.entity, row.entity_id)] = (row.seq, row.op)
+
+    changes = [(seq, entity, row_id, op)
+               for (entity, row_id), (seq, op) in latest.items()]
+    return changes, cursor, read == limit
+
+
+def compact(tombstone_days=30):
+    """
+    Delete superseded rows and old tombstones
+
+    Returns:
+        dict: rows removed as 'superseded' and 'tombstones'
+    """
+    newer = change_log.alias('newer')
+    superseded = db.session.execute(
+        delete(change_log)
+        .where(change_log.c.entity != HORIZON,
+               exists().where(newer.c.entity == change_log.c.entity,
+                              newer.c.entity_id == change_log.c.entity_id,
+                              newer.c.seq > change_log.c.seq))
+    ).rowcount
+
+    cutoff = datetime.utcnow() - timedelta(days=tombstone_days)
+    expired = (change_log.c.op == DELETE) & (change_log.c.changed_at < cutoff)
+    pruned_through = db.session.execute(
+        select(func.max(change_log.c.seq)).where(expired)
+    ).scalar()
+    tombstones = 0
+    if pruned_through is not None:
+        new_horizon = max(pruned_through, horizon())
+        tombstones = db.session.execute(
+            delete(change_log).where(expired)
+        ).rowcount
+        db.session.execute(
+            delete(change_log).where(change_log.c.entity == HORIZON)
+        )
+        record(HORIZON, [new_horizon], op=PRUNED)
+    db.session.commit()
+    return {'superseded': superseded, 'tombstones': tombstones}
+
+
+def backfill():
+    """
+    Log an upsert for every row that has no change_log entry yet, so
+    since=0 covers data written before the log existed
+
+    Returns:
+        int: rows logged
+    """
+    logged = 0
+    now = _now(db.engine.dialect)
+    for entity, model in MODELS.items():
+        table = model.__table__
+        missing = ~exists().where(change_log.c.entity == entity,
+                                  change_log.c.entity_id == table.c.id)
+        logged += db.session.execute(
+            insert(change_log).from_select(
+                ['entity', 'entity_id', 'op', 'changed_at'],
+                select(literal(entity), table.c.id, literal(UPSERT),
+                       now).where(missing).order_by(table.c.id)
+            )
+        ).rowcount
+    db.session.commit()
+    return logged
+
+
+@click.command('compact-changes')
+@click.option('--tombstone-days', default=30, show_default=True,
+              help='Keep delete markers this long; older sync cursors '
+                   'have to start over.')
+@with_appcontext
+def compact_changes_command(tombstone_days):
+    """Remove superseded change log rows and expired tombstones."""
+    start = time.perf_counter()
+    counts = compact(tombstone_days=tombstone_days)
+    click.echo(f"Removed {counts['superseded']} superseded changes and "
+               f"{counts['tombstones']} tombstones in "
+               f"{time.perf_counter() - start:.1f}s")
+
+
+@click.command('backfill-changes')
+@with_appcontext
+def backfill_changes_command():
+    """Log existing rows so a sync from 0 returns everything."""
+    start = time.perf_counter()
+    logged = backfill()
+    click.echo(f'Logged {logged} existing rows in '
+               f'{time.perf_counter() - start:.1f}s')
@@ -0,0 +1,196 @@
+"""
+Response compression - gzip, or brotli when the package is installed
+
+Every text response (JSON pages, CSV, the Swagger YAML) is compressed
+for clients that send Accept-Encoding, in an after_request hook:
+
+- bodies under COMPRESS_MIN_SIZE go out as they are - the headers would
+  cost more than the bytes saved
+- streamed responses (exports, invoice runs) are compressed chunk by
+  chunk with a sync flush after each, so they keep streaming
+- responses that already have a Content-Encoding, server-sent events and
+  anything marked Cache-Control: no-transform are left alone
+
+Static files are compressed once, at startup, and served from memory by
+a wrapper around the static view (recompressed if the file changes).
+"""
+import hashlib
+import mimetypes
+import os
+import zlib
+from datetime import datetime, timezone
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # optional - gzip covers every client
+    brotli = None
+
+# Not in every mimetypes database; without it swagger.yaml is served as
+# application/octet-stream and never compressed
+mimetypes.add_type('application/yaml', '.yaml')
+mimetypes.add_type('application/yaml', '.yml')
+
+
+def available():
+    """Encodings this process can produce, preferred first"""
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+class _Gzip:
+    def __init__(self, level):
+        self._z = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def chunk(self, data):
+        return self._z.compress(data) + self._z.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._z.flush()
+
+
+class _Brotli:
+    def __init__(self, quality):
+        self._b = brotli.Compressor(quality=quality)
+
+    def chunk(self, data):
+        return self._b.process(data) + self._b.flush()
+
+    def finish(self):
+        return self._b.finish()
+
+
+def _compressor(encoding, config):
+    if encoding == 'br':
+        return _Brotli(config['COMPRESS_BROTLI_QUALITY'])
+    return _Gzip(config['COMPRESS_LEVEL'])
+
+
+def compress(data, encoding, config):
+    """Compress a whole body in one go"""
+    if encoding == 'br':
+        return brotli.compress(data,
+                               quality=config['COMPRESS_BROTLI_QUALITY'])
+    return zlib.compress(data, config['COMPRESS_LEVEL'],
+                         16 + zlib.MAX_WBITS)
+
+
+def _stream(chunks, compressor):
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            data = compressor.chunk(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+    finally:
+        # Let stream_with_context and friends clean up now, not at GC
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def _compress_response(response):
+    """after_request hook"""
+    config = current_app.config
+    if response.mimetype not in config['COMPRESS_MIMETYPES'] or \
+            response.status_code < 200 or response.status_code in (204, 304)\
+            or request.method == 'HEAD':
+        return response
+    response.vary.add('Accept-Encoding')
+    if 'Content-Encoding' in response.headers or \
+            response.direct_passthrough or \
+            response.cache_control.no_transform:
+        return response
+    encoding = request.accept_encodings.best_match(available())
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = _stream(response.response,
+                                    _compressor(encoding, config))
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < config['COMPRESS_MIN_SIZE']:
+            return response
+        response.set_data(compress(data, encoding, config))
+    response.headers['Content-Encoding'] = encoding
+    # The compressed bytes are a different representation: a strong tag
+    # gets the encoding appended (app/conditional.py still matches it)
+    tag, weak = response.get_etag()
+    if tag and not weak:
+        response.set_etag(f'{tag}-{encoding}')
+    return response
+
+
+def _precompress(app, path):
+    """Compressed copies of one static file, or None if not worth it"""
+    mimetype = mimetypes.guess_type(path)[0]
+    stat = os.stat(path)
+    if mimetype not in app.config['COMPRESS_MIMETYPES'] or \
+            stat.st_size < app.config['COMPRESS_MIN_SIZE']:
+        return None
+    with open(path, 'rb') as f:
+        data = f.read()
+    return {
+        'mtime': stat.st_mtime,
+        'mimetype': mimetype,
+        'etag': hashlib.sha1(data).hexdigest()[:20],
+        'bodies': {encoding: compress(data, encoding, app.config)
+                   for encoding in available()},
+    }
+
+
+def _static_cache(app):
+    """Precompress every static file, keyed by its path under /static"""
+    cache = {}
+    folder = app.static_folder
+    for root, _, files in os.walk(folder):
+        for name in files:
+            path = os.path.join(root, name)
+            entry = _precompress(app, path)
+            if entry is not None:
+                filename = os.path.relpath(path, folder).replace(os.sep, '/')
+                cache[filename] = entry
+    return cache
+
+
+def _serve_precompressed(app, static_view):
+    cache = app.extensions['compression'] = _static_cache(app)
+
+    def static(filename):
+        entry = cache.get(filename)
+        if entry is not None:
+            path = os.path.join(app.static_folder, filename)
+            if os.stat(path).st_mtime != entry['mtime']:
+                entry = cache[filename] = _precompress(app, path)
+        encoding = entry and \
+            request.accept_encodings.best_match(list(entry['bodies']))
+        if not encoding:
+            return static_view(filename=filename)
+
+        response = app.response_class(entry['bodies'][encoding],
+                                      mimetype=entry['mimetype'])
+        response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.set_etag(f"{entry['etag']}-{encoding}")
+        response.last_modified = datetime.fromtimestamp(entry['mtime'],
+                                                        timezone.utc)
+        max_age = app.get_send_file_max_age(filename)
+        if max_age is None:
+            response.cache_control.no_cache = True
+        else:
+            response.cache_control.public = True
+            response.cache_control.max_age = max_age
+        return response.make_conditional(request)
+
+    return static
+
+
+def init_compression(app):
+    """Compress responses and serve precompressed static files"""
+    app.after_request(_compress_response)
+    if app.has_static_folder and 'static' in app.view_functions:
+        app.view_functions['static'] = _serve_precompressed(
+            app, app.view_functions['static']
+        )
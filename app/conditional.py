@@ -0,0 +1,210 @@
+"""
+Conditional GET (ETag / Last-Modified) for the read routes
+Polling clients send back the validators they were given; if nothing
+changed they get an empty 304 after one small query on id/updated_at,
+without loading relationships or running the schema dump.
+
+    @service_ticket_bp.route('/<int:ticket_id>', methods=['GET'])
+    @conditional(row_validator(ServiceTicket))
+    def get_service_ticket(ticket_id):
+        ...
+
+Relationship changes (a mechanic assigned, a part added) bump updated_at on
+the rows that dump them - see _touch_related in app/models.py - so the tags
+change with everything a route returns.
+
+Rows with a `version` (see version_id_col on ServiceTicket and Inventory)
+get a strong ETag starting with it, and writes go the other way: PUT takes
+that ETag back in If-Match and a stale one gets a 412. Compressed bodies
+carry the tag with the encoding appended (see app/compression.py), which
+still matches.
+"""
+import hashlib
+from datetime import timezone
+from functools import wraps
+from flask import abort, current_app, g, jsonify, make_response, request
+from sqlalchemy import func, select
+from app.extention import db
+
+
+# Suffixes app/compression.py adds to a strong ETag
+ENCODINGS = ('gzip', 'br')
+
+
+def _tag(*parts):
+    """Short opaque hash of whatever identifies this version"""
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:20]
+
+
+def _row_tag(model, row_id, updated_at, version=None):
+    tag = _tag(model.__tablename__, row_id, updated_at)
+    return tag if version is None else f'{version}-{tag}'
+
+
+def row_etag(row):
+    """The ETag a single-row GET sends for this loaded row"""
+    return _row_tag(type(row), row.id, row.updated_at,
+                    getattr(row, 'version', None))
+
+
+def row_validator(model, children=None):
+    """
+    Validator for one row, by the single id in the URL
+
+    Args:
+        model: model class with id and updated_at columns
+        children: optional foreign key column of nested rows the route also
+            dumps (e.g. ServiceTicket.customer_id); their count and latest
+            updated_at go into the tag
+
+    Returns:
+        callable: view kwargs -> (etag, last_modified) or None if no row
+    """
+    versioned = hasattr(model, 'version')
+
+    def validate(**kwargs):
+        row_id = next(iter(kwargs.values()))
+        columns = [model.updated_at]
+        if versioned:
+            columns.append(model.version)
+        if children is not None:
+            child = children.class_
+            nested = select(func.count(), func.max(child.updated_at)) \
+                .where(children == row_id)
+            columns += [
+                nested.with_only_columns(func.count()).scalar_subquery(),
+                nested.with_only_columns(func.max(child.updated_at))
+                .scalar_subquery(),
+            ]
+        row = db.session.execute(
+            select(*columns).where(model.id == row_id)
+        ).first()
+        if row is None:
+            return None
+        # Nested rows can be deleted without touching the parent, so only
+        # a plain row can promise nothing changed since its updated_at
+        last_modified = row[0] if children is None else None
+        if versioned and children is None:
+            return _row_tag(model, row_id, row[0], row[1]), last_modified
+        return _tag(model.__tablename__, row_id, *row), last_modified
+
+    # Versioned rows get a strong tag, for If-Match on PUT
+    validate.strong = versioned and children is None
+    return validate
+
+
+def table_validator(model):
+    """
+    Validator for a list route: row count plus the latest updated_at
+
+    Any insert or update moves max(updated_at) and any delete changes the
+    count. Deletes don't move the timestamp, so lists get no Last-Modified.
+    """
+    def validate(**kwargs):
+        count, latest = db.session.execute(
+            select(func.count(model.id), func.max(model.updated_at))
+        ).one()
+        return _tag(model.__tablename__, count, latest), None
+    return validate
+
+
+def _variants(etag):
+    return [etag] + [f'{etag}-{encoding}' for encoding in ENCODINGS]
+
+
+def _is_current(etag, last_modified):
+    """
+    The tag to send with a 304 if the client's copy matches, else None
+    (If-None-Match wins over If-Modified-Since)
+    """
+    if request.if_none_match:
+        return next((tag for tag in _variants(etag)
+                     if request.if_none_match.contains_weak(tag)), None)
+    if request.if_modified_since and last_modified:
+        # HTTP dates have whole seconds; updated_at is naive UTC
+        modified = last_modified.replace(microsecond=0, tzinfo=timezone.utc)
+        if modified <= request.if_modified_since:
+            return etag
+    return None
+
+
+def _set_validators(response, etag, last_modified, strong=False):
+    response.set_etag(etag, weak=not strong)
+    if last_modified:
+        response.last_modified = last_modified.replace(tzinfo=timezone.utc)
+    # Let clients keep the body but check back before reusing it
+    response.cache_control.no_cache = True
+    return response
+
+
+def conditional(validator):
+    """
+    Answer If-None-Match / If-Modified-Since with 304 before the view runs
+
+    The view's own 200 response gets an ETag - strong for versioned rows,
+    weak otherwise - and Last-Modified for single rows. A missing row is a
+    404, as first_or_404 would give.
+    """
+    strong = getattr(validator, 'strong', False)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            validators = validator(**kwargs)
+            if validators is None:
+                abort(404)
+            etag, last_modified = validators
+            current = _is_current(etag, last_modified)
+            if current:
+                return _set_validators(
+                    current_app.response_class(status=304), current,
+                    last_modified, strong
+                )
+            g.etag = etag
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                _set_validators(response, etag, last_modified, strong)
+            return response
+        return wrapper
+    return decorator
+
+
+def cache_key():
+    """
+    Flask-Caching key for a view under @conditional
+
+    Keyed on the current ETag, so a cached body is never served under a
+    newer tag - an update moves to a new key instead of waiting for the
+    timeout. The query string is part of the key too (page, per_page).
+    """
+    return f'view/{request.full_path}/{g.get("etag", "")}'
+
+
+def version_matches(row):
+    """
+    False when If-Match names a different version than the row has
+
+    Clients send back the strong ETag of their GET (a compressed one
+    too), or just the `version` they read, e.g. If-Match: "3". Without
+    If-Match the write is unconditional, but version_id_col still refuses
+    to overwrite a change committed after this request read the row.
+    """
+    if not request.if_match or request.if_match.star_tag:
+        return True
+    return any(request.if_match.contains(tag)
+               for tag in _variants(row_etag(row)) + [str(row.version)])
+
+
+def precondition_failed(row):
+    """
+    412 for a write based on a stale read - re-read and try again
+    The current ETag comes back too; a row deleted meanwhile is a 404.
+    """
+    if row is None:
+        abort(404)
+    response = jsonify({
+        'error': 'Precondition failed - changed since you read it',
+        'current_version': row.version
+    })
+    response.set_etag(row_etag(row))
+    return response, 412
@@ -0,0 +1,257 @@
+"""
+Batch ticket costing for invoice runs and the reporting rollups
+
+ServiceTicket.calculate_total_cost() is fine for one ticket, but a month
+end of it loads each ticket's mechanics and parts one relationship at a
+time. batch_costs() prices every ticket completed in a date range at once,
+the same way: estimated_cost, plus labor, plus price x quantity for each
+part. Labor is SUM(hours x rate) over the ticket's time entries; a ticket
+without any is charged the DEFAULT_LABOR_HOURS setting at the crew's
+average hourly_rate (mechanics without a rate are left out of the
+average).
+
+- numpy: four set-based queries (tickets, crew rates, time entries, part
+  lines), then the sums are bincounts over the ticket positions.
+- sql: one query that aggregates in the database (ticket_costs()), for
+  installs without NumPy. app/reports.py builds its rollups on it too.
+
+Totals are rounded to the cent with Python's round(), like the model.
+`flask cost-tickets` writes the result as CSV; GET /reports/invoices
+streams it.
+"""
+import time
+from datetime import date
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func, select
+from app.extention import db
+from app.exports import BATCH, csv_chunks
+from app.models import (
+    Inventory, Mechanic, TimeEntry, default_labor_hours,
+    inventory_service_ticket
+)
+from app.workflow import COMPLETED, links, tickets
+
+try:
+    import numpy as np
+except ImportError:  # optional - the sql engine needs nothing extra
+    np = None
+
+ENGINES = ('numpy', 'sql')
+COLUMNS = ['ticket_id', 'completion_date', 'customer_id', 'priority',
+           'estimated_cost', 'labor', 'parts', 'total']
+
+mechanics = Mechanic.__table__
+inventory = Inventory.__table__
+parts = inventory_service_ticket
+time_entries = TimeEntry.__table__
+
+
+def completed_tickets(days=None, start=None, end=None):
+    """
+    Completed tickets with a completion day, as a subquery
+
+    Args:
+        days: only these completion days
+        start, end (date): only completion days in this range (inclusive)
+    """
+    query = select(
+        tickets.c.id, tickets.c.completion_date.label('day'),
+        tickets.c.customer_id,
+        func.coalesce(tickets.c.priority, 'Medium').label('priority'),
+        func.coalesce(tickets.c.estimated_cost, 0).label('estimate'),
+    ).where(tickets.c.status == COMPLETED,
+            tickets.c.completion_date.isnot(None))
+    if days is not None:
+        query = query.where(tickets.c.completion_date.in_(days))
+    if start is not None:
+        query = query.where(tickets.c.completion_date >= start)
+    if end is not None:
+        query = query.where(tickets.c.completion_date <= end)
+    return query.subquery('done')
+
+
+def ticket_costs(done):
+    """
+    Per ticket in `done`: crew size, logged hours (NULL if none), labor,
+    parts and total - in SQL
+    """
+    crew = (
+        select(links.c.service_ticket_id.label('ticket_id'),
+               func.count().label('size'),
+               func.avg(mechanics.c.hourly_rate).label('rate'))
+        .join(mechanics, mechanics.c.id == links.c.mechanic_id)
+        .join(done, done.c.id == links.c.service_ticket_id)
+        .group_by(links.c.service_ticket_id)
+        .subquery('crew')
+    )
+    logged = (
+        select(time_entries.c.service_ticket_id.label('ticket_id'),
+               func.sum(time_entries.c.hours).label('hours'),
+               func.sum(time_entries.c.hours
+                        * func.coalesce(time_entries.c.rate, 0))
+               .label('amount'))
+        .join(done, done.c.id == time_entries.c.service_ticket_id)
+        .group_by(time_entries.c.service_ticket_id)
+        .subquery('logged')
+    )
+    used = (
+        select(parts.c.service_ticket_id.label('ticket_id'),
+               func.sum(func.coalesce(inventory.c.price, 0)
+                        * parts.c.quantity).label('amount'))
+        .join(inventory, inventory.c.id == parts.c.inventory_id)
+        .join(done, done.c.id == parts.c.service_ticket_id)
+        .group_by(parts.c.service_ticket_id)
+        .subquery('used')
+    )
+    labor = func.coalesce(
+        logged.c.amount,
+        func.coalesce(crew.c.rate, 0) * default_labor_hours()
+    )
+    amount = func.coalesce(used.c.amount, 0)
+    return (
+        select(done.c.id, done.c.day, done.c.customer_id, done.c.priority,
+               done.c.estimate,
+               func.coalesce(crew.c.size, 0).label('crew'),
+               logged.c.hours, labor.label('labor'), amount.label('parts'),
+               (done.c.estimate + labor + amount).label('total'))
+        .select_from(done.outerjoin(crew, crew.c.ticket_id == done.c.id)
+                     .outerjoin(logged, logged.c.ticket_id == done.c.id)
+                     .outerjoin(used, used.c.ticket_id == done.c.id))
+        .subquery('costs')
+    )
+
+
+def _row(ticket_id, day, customer_id, priority, estimate, labor, amount,
+         total):
+    return (ticket_id, day, customer_id, priority, round(float(estimate), 2),
+            round(float(labor), 2), round(float(amount), 2),
+            round(float(total), 2))
+
+
+def _sql_costs(start, end):
+    costs = ticket_costs(completed_tickets(start=start, end=end))
+    result = db.session.execute(
+        select(costs.c.id, costs.c.day, costs.c.customer_id,
+               costs.c.priority, costs.c.estimate, costs.c.labor,
+               costs.c.parts, costs.c.total)
+        .order_by(costs.c.id)
+        .execution_options(yield_per=BATCH)
+    )
+    for row in result:
+        yield _row(*row)
+
+
+def _numpy_costs(start, end):
+    done = completed_tickets(start=start, end=end)
+    rows = db.session.execute(
+        select(done.c.id, done.c.day, done.c.customer_id, done.c.priority,
+               done.c.estimate).order_by(done.c.id)
+    ).all()
+    if not rows:
+        return
+    crew = db.session.execute(
+        select(links.c.service_ticket_id, mechanics.c.hourly_rate)
+        .join(mechanics, mechanics.c.id == links.c.mechanic_id)
+        .join(done, done.c.id == links.c.service_ticket_id)
+    ).all()
+    entries = db.session.execute(
+        select(time_entries.c.service_ticket_id, time_entries.c.hours,
+               time_entries.c.rate)
+        .join(done, done.c.id == time_entries.c.service_ticket_id)
+    ).all()
+    lines = db.session.execute(
+        select(parts.c.service_ticket_id, inventory.c.price,
+               parts.c.quantity)
+        .join(inventory, inventory.c.id == parts.c.inventory_id)
+        .join(done, done.c.id == parts.c.service_ticket_id)
+        .order_by(parts.c.service_ticket_id, parts.c.inventory_id)
+    ).all()
+
+    count = len(rows)
+    ids = np.fromiter((row.id for row in rows), dtype=np.int64, count=count)
+    estimate = np.array([row.estimate for row in rows], dtype=float)
+
+    labor = np.zeros(count)
+    if crew:
+        ticket_ids, rates = zip(*crew)
+        rates = np.array(rates, dtype=float)  # NULL -> nan
+        known = ~np.isnan(rates)
+        at = np.searchsorted(ids, np.array(ticket_ids))[known]
+        rate_sum = np.bincount(at, weights=rates[known], minlength=count)
+        crew_size = np.bincount(at, minlength=count)
+        np.divide(rate_sum, crew_size, out=labor, where=crew_size > 0)
+        labor *= default_labor_hours()
+
+    if entries:
+        ticket_ids, hours, rates = zip(*entries)
+        worked = np.array(hours, dtype=float) \
+            * np.nan_to_num(np.array(rates, dtype=float))
+        at = np.searchsorted(ids, np.array(ticket_ids))
+        logged = np.bincount(at, minlength=count) > 0
+        labor = np.where(logged, np.bincount(at, weights=worked,
+                                             minlength=count), labor)
+
+    amount = np.zeros(count)
+    if lines:
+        ticket_ids, prices, quantities = zip(*lines)
+        line_cost = np.nan_to_num(np.array(prices, dtype=float)) \
+            * np.array(quantities, dtype=float)
+        amount = np.bincount(np.searchsorted(ids, np.array(ticket_ids)),
+                             weights=line_cost, minlength=count)
+
+    total = estimate + labor + amount
+    for i, row in enumerate(rows):
+        yield _row(row.id, row.day, row.customer_id, row.priority,
+                   estimate[i], labor[i], amount[i], total[i])
+
+
+def batch_costs(start, end, engine=None):
+    """
+    Cost every ticket completed between start and end (inclusive)
+
+    Args:
+        start, end (date): completion day range
+        engine (str): 'numpy' or 'sql'; defaults to numpy when installed
+
+    Returns:
+        iterator: one tuple per ticket in COLUMNS order, by ticket id
+
+    Raises:
+        RuntimeError: numpy asked for but not installed
+    """
+    engine = engine or ('numpy' if np is not None else 'sql')
+    if engine == 'numpy' and np is None:
+        raise RuntimeError('The numpy engine needs NumPy installed')
+    if engine == 'numpy':
+        return _numpy_costs(start, end)
+    return _sql_costs(start, end)
+
+
+@click.command('cost-tickets')
+@click.option('--start', type=click.DateTime(['%Y-%m-%d']), required=True,
+              help='First completion day.')
+@click.option('--end', type=click.DateTime(['%Y-%m-%d']), default=None,
+              help='Last completion day (default: today).')
+@click.option('--engine', type=click.Choice(ENGINES), default=None,
+              help='Default: numpy when installed, else sql.')
+@click.option('--output', type=click.File('w'), default='-',
+              show_default=True, help='CSV file to write.')
+@with_appcontext
+def cost_tickets_command(start, end, engine, output):
+    """Write the cost of every ticket completed in a range as CSV."""
+    began = time.perf_counter()
+    end = end.date() if end else date.today()
+    count = 0
+    rows = batch_costs(start.date(), end, engine=engine)
+
+    def counted():
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield row
+
+    for chunk in csv_chunks(COLUMNS, counted()):
+        output.write(chunk)
+    click.echo(f'Costed {count} tickets in '
+               f'{time.perf_counter() - began:.1f}s', err=True)
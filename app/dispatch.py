@@ -0,0 +1,331 @@
+"""
+Least-loaded auto-dispatch for new tickets
+POST /service-tickets/?dispatch=least-loaded puts the new ticket on the
+mechanic with its specialty (anyone, for a ticket without one) who has the
+fewest open tickets; ?dispatch=least-cost weights that by hourly_rate.
+
+Each worker keeps every mechanic's open-ticket count in memory, in a heap
+per specialty, so picking one is a heap peek rather than a grouped count
+over mechanic_service_ticket on every new ticket. The counts are loaded
+with one query when the worker starts (see gunicorn.conf.py) and the
+assign/remove/edit/claim/transition routes keep them current after they
+commit (in an atomic batch, after the batch commits - see
+batch.after_commit). Assignments made by other workers show up when the
+board is reloaded after DISPATCH_LOAD_TTL seconds.
+"""
+import heapq
+import itertools
+import threading
+import time
+from flask import current_app
+from sqlalchemy import and_, func, select
+from sqlalchemy.exc import SQLAlchemyError
+from app.batch import after_commit, on_rollback
+from app.extention import db
+from app.models import Mechanic
+from app import workflow
+
+MODES = {'least-loaded': False, 'least-cost': True}  # weighted by rate?
+ANY = None  # heap of every mechanic, for tickets without a specialty
+ASSIGN_ATTEMPTS = 3  # mechanics deleted by another worker are skipped
+
+_first_load = threading.Lock()
+
+
+class LoadBoard:
+    """
+    Open-ticket count per mechanic with a min-heap per (specialty, mode)
+
+    Heaps are never searched or re-sorted: a changed mechanic is pushed
+    again with a new stamp and outdated entries are dropped when they reach
+    the top. A heap is rebuilt once it's mostly outdated entries.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._mechanics = {}  # id -> [specialty, rate, load, stamp]
+        self._heaps = {}  # (specialty, weighted) -> [(score, id, stamp)]
+        self._stamps = itertools.count(1)
+        self._loading = False
+        self._journal = None  # changes made during a load
+        self.built_at = None
+
+    def __len__(self):
+        return len(self._mechanics)
+
+    @staticmethod
+    def _score(mechanic_id, state, weighted):
+        _, rate, load, _ = state
+        if not weighted:
+            return (load, mechanic_id)
+        # Cost of one more ticket; mechanics without a rate go last
+        cost = (load + 1) * rate if rate is not None else float('inf')
+        return (cost, load, mechanic_id)
+
+    def _push(self, mechanic_id, mechanics=None, heaps=None):
+        """Push a mechanic's current score (onto the live board by default)"""
+        mechanics = self._mechanics if mechanics is None else mechanics
+        heaps = self._heaps if heaps is None else heaps
+        state = mechanics[mechanic_id]
+        state[3] = next(self._stamps)
+        for specialty in {ANY, state[0]}:
+            for weighted in (False, True):
+                heap = heaps.setdefault((specialty, weighted), [])
+                heapq.heappush(heap, (self._score(mechanic_id, state,
+                                                  weighted),
+                                      mechanic_id, state[3]))
+                if len(heap) > 2 * len(mechanics) + 64:
+                    heap[:] = [entry for entry in heap
+                               if self._current(entry, mechanics)]
+                    heapq.heapify(heap)
+
+    def _current(self, entry, mechanics=None):
+        state = (self._mechanics if mechanics is None else mechanics) \
+            .get(entry[1])
+        return state is not None and state[3] == entry[2]
+
+    @staticmethod
+    def _state(specialty, rate, load):
+        return [specialty, float(rate) if rate is not None else None,
+                load, 0]
+
+    def claim_load(self):
+        """True for the one caller that should reload, False if one is"""
+        with self._lock:
+            if self._loading:
+                return False
+            self._loading, self._journal = True, []
+            return True
+
+    def abandon_load(self):
+        """A claimed reload failed - let the next caller try"""
+        with self._lock:
+            self._loading, self._journal = False, None
+
+    def load(self, rows):
+        """
+        Replace the board with (id, specialty, hourly_rate, open) rows
+
+        The new board is built without the lock and swapped in whole, so
+        take() keeps using the old one meanwhile and never sees it empty.
+        Changes made during the build (update, remove, adjust and take's
+        +1) are replayed on it. A take whose assignment committed before
+        the rows were read is counted twice until the next reload - better
+        than the spreading being lost.
+        """
+        mechanics, heaps = {}, {}
+        for mechanic_id, specialty, rate, load in rows:
+            mechanics[mechanic_id] = self._state(specialty, rate, load)
+            self._push(mechanic_id, mechanics, heaps)
+        with self._lock:
+            journal = self._journal or []
+            self._mechanics, self._heaps = mechanics, heaps
+            self._loading, self._journal = False, None
+            for method, args in journal:
+                method(self, *args)
+            self.built_at = time.monotonic()
+
+    def update(self, rows):
+        """Add or replace some mechanics, same rows as load()"""
+        with self._lock:
+            self._update(rows)
+
+    def _update(self, rows):
+        if self._journal is not None:
+            self._journal.append((LoadBoard._update, (rows,)))
+        for mechanic_id, specialty, rate, load in rows:
+            self._mechanics[mechanic_id] = self._state(specialty, rate, load)
+            self._push(mechanic_id)
+
+    def remove(self, mechanic_id):
+        """Drop a mechanic; their heap entries go stale"""
+        with self._lock:
+            self._remove(mechanic_id)
+
+    def _remove(self, mechanic_id):
+        if self._journal is not None:
+            self._journal.append((LoadBoard._remove, (mechanic_id,)))
+        self._mechanics.pop(mechanic_id, None)
+
+    def adjust(self, mechanic_id, delta):
+        """Change a mechanic's open-ticket count by delta"""
+        with self._lock:
+            self._adjust(mechanic_id, delta)
+
+    def _adjust(self, mechanic_id, delta):
+        if self._journal is not None:
+            self._journal.append((LoadBoard._adjust, (mechanic_id, delta)))
+        state = self._mechanics.get(mechanic_id)
+        if state is not None:
+            state[2] = max(state[2] + delta, 0)
+            self._push(mechanic_id)
+
+    def open_tickets(self, mechanic_id):
+        """A mechanic's count as this worker knows it (None if unknown)"""
+        state = self._mechanics.get(mechanic_id)
+        return state[2] if state is not None else None
+
+    def take(self, specialty=None, weighted=False):
+        """
+        The best mechanic for a ticket needing `specialty`, counted as
+        having one more ticket straight away so concurrent requests in
+        this worker spread out. adjust(id, -1) if the assignment fails.
+
+        Returns:
+            int: mechanic id, or None if nobody has the specialty
+        """
+        with self._lock:
+            heap = self._heaps.get((specialty, weighted), [])
+            while heap and not self._current(heap[0]):
+                heapq.heappop(heap)
+            if not heap:
+                return None
+            mechanic_id = heap[0][1]
+            self._adjust(mechanic_id, 1)
+            return mechanic_id
+
+
+def _load_rows(where=None):
+    """(id, specialty, hourly_rate, open tickets) for mechanics - one query"""
+    mechanics = Mechanic.__table__
+    links, tickets = workflow.links, workflow.tickets
+    query = (
+        select(mechanics.c.id, mechanics.c.specialty,
+               mechanics.c.hourly_rate, func.count(tickets.c.id))
+        .select_from(
+            mechanics
+            .outerjoin(links, links.c.mechanic_id == mechanics.c.id)
+            .outerjoin(tickets, and_(
+                tickets.c.id == links.c.service_ticket_id,
+                workflow.current_status.notin_(workflow.FINAL)
+            ))
+        )
+        .group_by(mechanics.c.id, mechanics.c.specialty,
+                  mechanics.c.hourly_rate)
+    )
+    if where is not None:
+        query = query.where(where)
+    return db.session.execute(query).all()
+
+
+def get_board():
+    """
+    This app's board, loaded from the database on first use
+
+    Once it's older than DISPATCH_LOAD_TTL, the one caller that claims the
+    reload runs it; everyone else carries on with the current board.
+    """
+    board = current_app.extensions.setdefault('dispatch_board', LoadBoard())
+    if board.built_at is None:
+        with _first_load:  # concurrent first requests wait for one load
+            if board.built_at is None:
+                board.load(_load_rows())
+        return board
+    ttl = current_app.config.get('DISPATCH_LOAD_TTL', 60)
+    if time.monotonic() - board.built_at > ttl and board.claim_load():
+        try:
+            board.load(_load_rows())
+        except Exception:
+            board.abandon_load()
+            raise
+    return board
+
+
+def warm_up(app):
+    """Load the board as a worker starts (see gunicorn.conf.py)"""
+    with app.app_context():
+        try:
+            get_board()
+        except SQLAlchemyError:
+            # Tables not created yet - the first dispatch loads it instead
+            app.logger.warning('Dispatch board not loaded at startup')
+
+
+def _built_board():
+    """The board if this worker has loaded one yet - else nothing to update"""
+    board = current_app.extensions.get('dispatch_board')
+    return board if board is not None and board.built_at else None
+
+
+def auto_assign(ticket_id, specialty, weighted=False):
+    """
+    Put a new Open ticket on the least-loaded mechanic for its specialty
+
+    Runs in the caller's transaction like workflow.assign; if the caller
+    rolls back it must release() the mechanic this returned.
+
+    Returns:
+        int: the mechanic assigned, or None (the ticket stays Open)
+    """
+    board = get_board()
+    for _ in range(ASSIGN_ATTEMPTS):
+        mechanic_id = board.take(specialty, weighted)
+        if mechanic_id is None:
+            break
+        if workflow.assign(ticket_id, mechanic_id) is None:
+            # An atomic batch can roll back after the route committed
+            on_rollback(recount, [mechanic_id])
+            return mechanic_id
+        # Deleted by another worker since the board was loaded
+        board.remove(mechanic_id)
+        workflow.sync_status([ticket_id])
+    return None
+
+
+def _adjust(mechanic_id, delta):
+    board = _built_board()
+    if board is not None:
+        board.adjust(mechanic_id, delta)
+
+
+def release(mechanic_id):
+    """Undo the count auto_assign() added when its transaction failed"""
+    if mechanic_id is not None:
+        _adjust(mechanic_id, -1)
+
+
+def assigned(mechanic_id):
+    """A mechanic took an Open ticket (claim-next)"""
+    after_commit(_adjust, mechanic_id, 1)
+
+
+def recount(mechanic_ids):
+    """Reload some mechanics' counts after assignments changed"""
+    if mechanic_ids:
+        after_commit(_recount, set(mechanic_ids))
+
+
+def _recount(mechanic_ids):
+    board = _built_board()
+    if board is None:
+        return
+    rows = _load_rows(Mechanic.__table__.c.id.in_(mechanic_ids))
+    board.update(rows)
+    for mechanic_id in mechanic_ids - {row[0] for row in rows}:
+        board.remove(mechanic_id)
+
+
+def recount_ticket(ticket_id):
+    """Reload the counts of everyone on a ticket that just closed"""
+    if _built_board() is None:
+        return
+    links = workflow.links
+    recount(db.session.execute(
+        select(links.c.mechanic_id)
+        .where(links.c.service_ticket_id == ticket_id)
+    ).scalars().all())
+
+
+def mechanic_changed(mechanic):
+    """A mechanic was added or their specialty / rate changed"""
+    recount([mechanic.id])
+
+
+def mechanic_removed(mechanic_id):
+    after_commit(_remove, mechanic_id)
+
+
+def _remove(mechanic_id):
+    board = _built_board()
+    if board is not None:
+        board.remove(mechanic_id)
@@ -0,0 +1,274 @@
+"""
+Live ticket events for the shop-floor displays
+(GET /service-tickets/events, Server-Sent Events)
+
+Routes publish() after they commit: one row in ticket_events, carrying the
+ticket's status at that moment. Each worker runs one background thread
+that tails the table and wakes the streams it's serving, so any worker's
+displays see every worker's writes - the table is the broker, and a
+display costs nothing while the shop is quiet.
+
+Event ids are the row ids. A display that reconnects sends the last one
+back as Last-Event-ID (EventSource does this itself) and gets everything
+after it from the table before it goes live again.
+"""
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import SQLAlchemyError
+from app.batch import after_commit
+from app.extention import db
+from app.models import ServiceTicket, TicketEvent
+
+CREATED = 'created'
+STATUS_CHANGED = 'status-changed'
+MECHANIC_ASSIGNED = 'mechanic-assigned'
+MECHANIC_REMOVED = 'mechanic-removed'
+MECHANICS_CHANGED = 'mechanics-changed'
+PART_ADDED = 'part-added'
+DELETED = 'deleted'
+
+BUFFER = 1000  # events each worker keeps in memory for live streams
+GAP_WAIT = 2.0  # seconds to wait for a lower id to commit (Postgres)
+
+events = TicketEvent.__table__
+
+
+def publish(event_type, ticket_id, **data):
+    """
+    Record an event - call after the change itself has committed
+
+    A failure is logged, not raised: the change is already saved and a
+    display that misses an event catches up on the next one for the ticket.
+    Where commits are held back (batch.after_commit) the event waits for
+    the real one, so failing to record it can't roll the change back.
+    """
+    after_commit(_record, event_type, ticket_id, data)
+
+
+def _record(event_type, ticket_id, data):
+    status = select(ServiceTicket.status) \
+        .where(ServiceTicket.id == ticket_id).scalar_subquery()
+    try:
+        db.session.execute(insert(events).values(
+            ticket_id=ticket_id, type=event_type, status=status,
+            data=json.dumps(data), created_at=datetime.utcnow()
+        ))
+        db.session.commit()
+    except SQLAlchemyError:
+        db.session.rollback()
+        current_app.logger.exception('Ticket event %s for %s not recorded',
+                                     event_type, ticket_id)
+
+
+def _as_dict(row):
+    return dict(json.loads(row.data or '{}'), id=row.id,
+                ticket_id=row.ticket_id, type=row.type, status=row.status,
+                created_at=row.created_at.isoformat())
+
+
+def read_events(after_id, limit=BUFFER):
+    """Events with id > after_id, oldest first"""
+    rows = db.session.execute(
+        select(events).where(events.c.id > after_id)
+        .order_by(events.c.id).limit(limit)
+    ).all()
+    return [_as_dict(row) for row in rows]
+
+
+def settled(rows, after_id, through=None):
+    """
+    Rows read after after_id, up to the first missing id that might still
+    commit
+
+    Ids up to `through` - as far as the broker has read, waiting out each
+    gap (EventBroker._without_gaps) - are settled: one missing there was
+    rolled back. Past it a stream can't tell, so it stops and lets the
+    broker hand it the rest.
+    """
+    expected = after_id + 1
+    for i, event in enumerate(rows):
+        if event['id'] != expected and (through is None
+                                        or event['id'] - 1 > through):
+            return rows[:i]
+        expected = event['id'] + 1
+    return rows
+
+
+def latest_id():
+    """Id of the newest event, 0 if there are none"""
+    return db.session.execute(
+        select(func.coalesce(func.max(events.c.id), 0))
+    ).scalar()
+
+
+def format_event(event):
+    """One SSE message"""
+    return (f"id: {event['id']}\nevent: {event['type']}\n"
+            f"data: {json.dumps(event)}\n\n")
+
+
+class EventBroker:
+    """
+    Tails ticket_events for one worker and hands new rows to its streams
+
+    The tail thread only runs while a stream is listening and reads at most
+    one short indexed range per EVENT_POLL_INTERVAL, however many displays
+    are connected.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._cond = threading.Condition()
+        self._events = deque(maxlen=BUFFER)
+        self._listeners = 0
+        self._thread = None
+        self._gap_since = None
+        self.last_id = None  # newest event read from the table
+        self.dropped_through = 0  # newest event no longer in memory
+
+    def _without_gaps(self, rows):
+        """
+        Rows up to the first missing id that might still commit
+
+        Postgres hands out ids before commit, so id 7 can appear while id
+        6 is still in flight; stopping there keeps 6 from being skipped.
+        An id missing for GAP_WAIT seconds was rolled back - move on.
+        """
+        expected = self.last_id + 1
+        for i, event in enumerate(rows):
+            if event['id'] != expected:
+                now = time.monotonic()
+                if self._gap_since is None:
+                    self._gap_since = now
+                if now - self._gap_since < GAP_WAIT:
+                    return rows[:i]
+                self._gap_since = None
+            expected = event['id'] + 1
+        return rows
+
+    def poll(self):
+        """Read new events into memory and wake the streams"""
+        if self.last_id is None:
+            # Streams read anything older from the table themselves
+            with self._cond:
+                self.last_id = self.dropped_through = latest_id()
+                self._cond.notify_all()
+        rows = self._without_gaps(read_events(self.last_id))
+        if not rows:
+            return 0
+        with self._cond:
+            for event in rows:
+                if len(self._events) == self._events.maxlen:
+                    self.dropped_through = self._events[0]['id']
+                self._events.append(event)
+            self.last_id = rows[-1]['id']
+            self._cond.notify_all()
+        return len(rows)
+
+    def wait(self, after_id, timeout):
+        """
+        Events after after_id, waiting up to timeout for the first
+
+        Returns:
+            list: events (empty on timeout), or None if some of them are
+            no longer in memory and the stream should read the table
+        """
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self.last_id is not None and self.last_id > after_id,
+                timeout
+            )
+            if after_id < self.dropped_through:
+                return None
+            return [event for event in self._events
+                    if event['id'] > after_id]
+
+    def _run(self):
+        interval = self.app.config.get('EVENT_POLL_INTERVAL', 0.5)
+        while True:
+            with self._cond:
+                if not self._listeners:
+                    self._thread = None
+                    return
+            with self.app.app_context():
+                try:
+                    self.poll()
+                except SQLAlchemyError:
+                    self.app.logger.exception('Ticket event tail failed')
+                finally:
+                    db.session.remove()
+            time.sleep(interval)
+
+    @contextmanager
+    def listening(self):
+        """Keep the tail thread running while a stream is open"""
+        with self._cond:
+            self._listeners += 1
+            if self._thread is None:
+                # Nothing was read while stopped - start from the top
+                self.last_id = None
+                self._events.clear()
+                self._thread = threading.Thread(
+                    target=self._run, name='ticket-events', daemon=True
+                )
+                self._thread.start()
+        try:
+            yield self
+        finally:
+            with self._cond:
+                self._listeners -= 1
+
+
+def get_broker():
+    """This worker's broker"""
+    app = current_app._get_current_object()
+    return app.extensions.setdefault('ticket_events', EventBroker(app))
+
+
+def stream(after_id):
+    """
+    SSE messages for everything after after_id, then live events
+
+    Ends after EVENT_STREAM_SECONDS so worker threads are handed back;
+    EventSource reconnects by itself and resumes from the last id.
+    """
+    config = current_app.config
+    deadline = time.monotonic() + config.get('EVENT_STREAM_SECONDS', 300)
+    heartbeat = config.get('EVENT_HEARTBEAT_SECONDS', 15)
+    yield 'retry: 3000\n\n'
+
+    def catch_up():
+        nonlocal after_id
+        while True:
+            backlog = read_events(after_id)
+            ready = settled(backlog, after_id, get_broker().last_id)
+            for event in ready:
+                after_id = event['id']
+                yield format_event(event)
+            if len(ready) < BUFFER:
+                break
+        # Don't hold a pooled connection for the rest of the stream
+        db.session.close()
+
+    yield from catch_up()
+    if time.monotonic() >= deadline:
+        return
+    with get_broker().listening() as broker:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            live = broker.wait(after_id, timeout=min(heartbeat, remaining))
+            if live is None:
+                yield from catch_up()  # fell behind the in-memory buffer
+            elif not live:
+                yield ': keep-alive\n\n'
+            for event in live or ():
+                after_id = event['id']
+                yield format_event(event)
@@ -0,0 +1,131 @@
+"""
+Streaming exports behind the /exports blueprint
+
+Full dumps used to mean paging through the JSON list routes, each page a
+batch of ORM objects and their relationships. An export is one Core
+SELECT instead, read with yield_per (a server-side cursor on Postgres) and
+written out BATCH rows at a time as CSV or NDJSON - so memory stays flat
+however big the table is. app/compression.py gzips the stream as it goes.
+
+Each export lists the columns a client may pick and the ones it may
+filter on by equality; every export also takes updated_since.
+"""
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from sqlalchemy import select
+from app.extention import db
+from app.models import Customer, Inventory, ServiceTicket
+
+BATCH = 1000
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+
+class Export:
+    """A table that can be dumped, minus the columns it must never leak"""
+
+    def __init__(self, model, filters, hidden=()):
+        self.table = model.__table__
+        self.columns = [column.name for column in self.table.columns
+                        if column.name not in hidden]
+        self.filters = filters
+
+    def query(self, columns=None, since=None, **filters):
+        """
+        SELECT of `columns` (default: all) by id, streamed in batches
+
+        Raises:
+            ValueError: an unknown column or filter, or a filter value of
+                the wrong type
+        """
+        columns = columns or self.columns
+        unknown = [name for name in columns if name not in self.columns] \
+            + [name for name in filters if name not in self.filters]
+        if unknown:
+            raise ValueError(f'unknown column or filter: {unknown[0]}')
+        c = self.table.c
+        query = select(*(c[name] for name in columns))
+        for name, value in filters.items():
+            # Query string values are text; int('x') is a ValueError too
+            query = query.where(c[name] == c[name].type.python_type(value))
+        if since is not None:
+            query = query.where(c.updated_at > since)
+        return query.order_by(c.id).execution_options(yield_per=BATCH)
+
+
+EXPORTS = {
+    'service-tickets': Export(
+        ServiceTicket, ['status', 'priority', 'customer_id', 'vehicle_id',
+                        'specialty']),
+    'customers': Export(Customer, ['email'], hidden=['password_hash']),
+    'inventory': Export(Inventory, ['category', 'supplier']),
+}
+
+
+def _plain(value):
+    """A column value as CSV / JSON can take it"""
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def csv_chunks(columns, rows):
+    """CSV text with a header row, BATCH rows per chunk"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for n, row in enumerate(rows, 1):
+        writer.writerow([_plain(value) for value in row])
+        if n % BATCH == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def ndjson_chunks(columns, rows):
+    """One JSON object per line, BATCH lines per chunk"""
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(columns,
+                                         (_plain(v) for v in row)))))
+        if len(lines) == BATCH:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+WRITERS = {'csv': csv_chunks, 'ndjson': ndjson_chunks}
+
+
+def export_rows(name, format, columns=None, since=None, **filters):
+    """
+    Stream an export as text chunks
+
+    Args:
+        name (str): a key of EXPORTS
+        format (str): a key of FORMATS
+        columns (list): column names, default all of them
+        since (datetime): only rows updated after this
+        **filters: column=value equality filters
+
+    Returns:
+        iterator: chunks of text; the SELECT runs on the first one
+
+    Raises:
+        ValueError: an unknown column or filter
+    """
+    export = EXPORTS[name]
+    columns = columns or export.columns
+    query = export.query(columns, since, **filters)
+
+    def rows():
+        for row in db.session.execute(query):
+            yield row
+
+    return WRITERS[format](columns, rows())
@@ -0,0 +1,183 @@
+"""
+Full-text search over service tickets (title, description, vehicle_info)
+A LIKE '%brake%' has to read every ticket, so each database gets a real
+full-text index instead:
+
+- SQLite: an FTS5 external-content table kept in sync by triggers
+- Postgres: a generated tsvector column with a GIN index
+
+Both are created with the service_tickets table (db.create_all) and stay in
+sync for every write path - ORM, Core bulk inserts and raw SQL alike.
+`flask search-index` adds them to a database created before this existed.
+"""
+import re
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import event, or_, text
+from app.extention import db
+from app.models import ServiceTicket
+
+# Relative weight of each column when ranking (title matters most)
+WEIGHTS = {'title': 10.0, 'description': 5.0, 'vehicle_info': 1.0}
+
+SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS service_tickets_fts USING fts5(
+        title, description, vehicle_info,
+        content='service_tickets', content_rowid='id',
+        tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS service_tickets_fts_insert
+    AFTER INSERT ON service_tickets BEGIN
+        INSERT INTO service_tickets_fts(rowid, title, description,
+                                        vehicle_info)
+        VALUES (new.id, new.title, new.description, new.vehicle_info);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS service_tickets_fts_delete
+    AFTER DELETE ON service_tickets BEGIN
+        INSERT INTO service_tickets_fts(service_tickets_fts, rowid, title,
+                                        description, vehicle_info)
+        VALUES ('delete', old.id, old.title, old.description,
+                old.vehicle_info);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS service_tickets_fts_update
+    AFTER UPDATE OF title, description, vehicle_info ON service_tickets
+    BEGIN
+        INSERT INTO service_tickets_fts(service_tickets_fts, rowid, title,
+                                        description, vehicle_info)
+        VALUES ('delete', old.id, old.title, old.description,
+                old.vehicle_info);
+        INSERT INTO service_tickets_fts(rowid, title, description,
+                                        vehicle_info)
+        VALUES (new.id, new.title, new.description, new.vehicle_info);
+    END
+    """,
+]
+
+POSTGRES_DDL = [
+    """
+    ALTER TABLE service_tickets ADD COLUMN IF NOT EXISTS search_vector
+    tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(vehicle_info, '')), 'C')
+    ) STORED
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_service_tickets_search
+    ON service_tickets USING GIN (search_vector)
+    """,
+]
+
+
+def install_search_index(connection):
+    """Create the full-text index for this database if it's supported"""
+    statements = {
+        'sqlite': SQLITE_DDL,
+        'postgresql': POSTGRES_DDL,
+    }.get(connection.dialect.name, [])
+    for statement in statements:
+        connection.exec_driver_sql(statement)
+
+
+def rebuild_search_index(connection):
+    """Re-read every ticket into the index (SQLite only - PG is generated)"""
+    if connection.dialect.name == 'sqlite':
+        connection.exec_driver_sql(
+            "INSERT INTO service_tickets_fts(service_tickets_fts) "
+            "VALUES ('rebuild')"
+        )
+
+
+@event.listens_for(ServiceTicket.__table__, 'after_create')
+def _create_search_index(target, connection, **kw):
+    install_search_index(connection)
+
+
+@event.listens_for(ServiceTicket.__table__, 'before_drop')
+def _drop_search_index(target, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        connection.exec_driver_sql('DROP TABLE IF EXISTS service_tickets_fts')
+
+
+def search_terms(q):
+    """Words from the user's query, without any search syntax"""
+    return re.findall(r'\w+', q or '')
+
+
+def search_ticket_ids(q, page=1, per_page=10):
+    """
+    Rank tickets matching every word in q
+
+    Args:
+        q (str): free text typed by the user
+        page (int): 1-based page number
+        per_page (int): results per page
+
+    Returns:
+        tuple: (ticket ids for this page, best match first; total matches)
+    """
+    terms = search_terms(q)
+    if not terms:
+        return [], 0
+    params = {'limit': per_page, 'offset': (page - 1) * per_page}
+    dialect = db.engine.dialect.name
+
+    if dialect == 'sqlite':
+        # Quoting each word keeps characters like - or " from being
+        # read as FTS5 operators
+        params['q'] = ' '.join('"%s"' % term for term in terms)
+        weights = ', '.join(str(w) for w in WEIGHTS.values())
+        rows = db.session.execute(text(
+            "SELECT rowid FROM service_tickets_fts "
+            "WHERE service_tickets_fts MATCH :q "
+            f"ORDER BY bm25(service_tickets_fts, {weights}), rowid "
+            "LIMIT :limit OFFSET :offset"
+        ), params)
+        total = db.session.execute(text(
+            "SELECT count(*) FROM service_tickets_fts "
+            "WHERE service_tickets_fts MATCH :q"
+        ), params).scalar()
+    elif dialect == 'postgresql':
+        params['q'] = ' '.join(terms)
+        rows = db.session.execute(text(
+            "SELECT id FROM service_tickets, "
+            "plainto_tsquery('english', :q) query "
+            "WHERE search_vector @@ query "
+            "ORDER BY ts_rank(search_vector, query) DESC, id "
+            "LIMIT :limit OFFSET :offset"
+        ), params)
+        total = db.session.execute(text(
+            "SELECT count(*) FROM service_tickets "
+            "WHERE search_vector @@ plainto_tsquery('english', :q)"
+        ), params).scalar()
+    else:
+        # No full-text support - correct but scans the table
+        columns = [ServiceTicket.title, ServiceTicket.description,
+                   ServiceTicket.vehicle_info]
+        query = ServiceTicket.query.filter(*[
+            or_(*[column.ilike(f'%{term}%') for column in columns])
+            for term in terms
+        ])
+        total = query.count()
+        rows = query.with_entities(ServiceTicket.id).order_by(
+            ServiceTicket.id.desc()
+        ).limit(per_page).offset(params['offset'])
+
+    return [row[0] for row in rows], total
+
+
+@click.command('search-index')
+@with_appcontext
+def search_index_command():
+    """Create and rebuild the service ticket full-text index."""
+    with db.engine.begin() as connection:
+        install_search_index(connection)
+        rebuild_search_index(connection)
+    click.echo(f'Search index ready ({db.engine.dialect.name})')
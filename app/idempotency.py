@@ -0,0 +1,202 @@
+"""
+Idempotency keys - safe client retries for POST/PUT
+
+A client that times out can't tell whether its request went through. If
+it sends the same Idempotency-Key header when it retries, the first
+response is replayed instead of the route running again:
+
+- the first request for a key claims it by inserting an idempotency_keys
+  row (status NULL - in flight) and committing, before the route runs
+- the route's commits are held back (batch.deferred_commits) and its
+  status and body are saved on the row in that same transaction, so the
+  work and its recorded response commit or roll back together
+- a retry with the same key and request gets that response back, marked
+  Idempotent-Replayed: true
+- a duplicate that arrives while the first request is still running
+  waits for it - woken straight away in the same worker, polling the row
+  from other workers - for up to IDEMPOTENCY_WAIT_SECONDS, then gets 409
+- the same key on a different method, path, body or Authorization is a
+  422: that's a client bug, not a retry
+
+5xx responses and exceptions roll the route's work back and release the
+key, so a retry runs the route again. Rows are kept IDEMPOTENCY_TTL
+seconds and expired ones are deleted by the next claim. A claim older
+than IDEMPOTENCY_LOCK_SECONDS that never finished belongs to a worker
+that died, and is taken over.
+"""
+import hashlib
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import current_app, g, jsonify, request
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from app.batch import deferred_commits
+from app.extention import db
+from app.models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+keys = IdempotencyKey.__table__
+
+# Keys this worker is running now, so duplicates here needn't poll
+_inflight = {}
+_lock = threading.Lock()
+
+
+def _fingerprint():
+    """What a retry must match: method, path, caller and body"""
+    digest = hashlib.sha256()
+    for part in (request.method, request.full_path,
+                 request.headers.get('Authorization', '')):
+        digest.update(part.encode() + b'\0')
+    digest.update(request.get_data())  # cached for the route's .json
+    return digest.hexdigest()
+
+
+def _claim(key, fingerprint):
+    """Insert the in-flight row; False if someone already has the key"""
+    config = current_app.config
+    now = datetime.utcnow()
+    abandoned = now - timedelta(
+        seconds=config.get('IDEMPOTENCY_LOCK_SECONDS', 60))
+    db.session.execute(delete(keys).where(keys.c.expires_at < now))
+    db.session.execute(delete(keys).where(
+        keys.c.key == key, keys.c.status.is_(None),
+        keys.c.created_at < abandoned
+    ))
+    try:
+        db.session.execute(insert(keys).values(
+            key=key, fingerprint=fingerprint, created_at=now,
+            expires_at=now + timedelta(
+                seconds=config.get('IDEMPOTENCY_TTL', 24 * 60 * 60))
+        ))
+        db.session.commit()
+        return True
+    except IntegrityError:
+        db.session.rollback()
+        return False
+
+
+def _wait(key, fingerprint):
+    """
+    The key's row once it's finished, gone or not ours to wait on
+
+    Returns the row still in flight if IDEMPOTENCY_WAIT_SECONDS runs out,
+    and None if the first request failed and released the key.
+    """
+    config = current_app.config
+    poll = config.get('IDEMPOTENCY_POLL_INTERVAL', 0.1)
+    deadline = time.monotonic() + config.get('IDEMPOTENCY_WAIT_SECONDS', 10)
+    while True:
+        row = db.session.execute(
+            select(keys).where(keys.c.key == key)
+        ).first()
+        db.session.commit()  # end the read so the next one sees new rows
+        remaining = deadline - time.monotonic()
+        if row is None or row.status is not None or \
+                row.fingerprint != fingerprint or remaining <= 0:
+            return row
+        with _lock:
+            running = _inflight.get(key)
+        if running is not None:
+            running.wait(min(poll, remaining))
+        else:
+            time.sleep(min(poll, remaining))
+
+
+def _release(key):
+    try:
+        db.session.rollback()
+        db.session.execute(delete(keys).where(keys.c.key == key))
+        db.session.commit()
+    except SQLAlchemyError:
+        db.session.rollback()
+        current_app.logger.exception('Idempotency key %s not released', key)
+
+
+def _run(key, view, args, kwargs):
+    """
+    Run the route and commit its work with its response saved on the key,
+    or roll the work back and release the key if the response isn't final
+    """
+    session = db.session()
+    # An atomic batch already holds commits back and commits for us
+    guard = deferred_commits(session) \
+        if g.get('deferred_commits') is None else None
+    try:
+        with guard or nullcontext():
+            response = current_app.make_response(view(*args, **kwargs))
+            final = response.status_code < 500 and not response.is_streamed
+            if final:
+                session.execute(update(keys).where(keys.c.key == key).values(
+                    status=response.status_code, mimetype=response.mimetype,
+                    body=response.get_data()
+                ))
+        if final:
+            session.commit()
+    except Exception:
+        _release(key)
+        if guard is not None:
+            guard.finish(committed=False)
+        raise
+    if not final:
+        _release(key)
+    if guard is not None:
+        guard.finish(committed=final)
+    return response
+
+
+def _replay(row):
+    response = current_app.response_class(row.body, status=row.status,
+                                          mimetype=row.mimetype)
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view):
+    """
+    Replay the first response to requests sent with the same
+    Idempotency-Key (requests without the header run as usual)
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return view(*args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return jsonify({
+                'error': f'{HEADER} must be 1-{MAX_KEY_LENGTH} characters'
+            }), 400
+
+        fingerprint = _fingerprint()
+        while not _claim(key, fingerprint):
+            row = _wait(key, fingerprint)
+            if row is None:
+                continue  # the first request failed - run it ourselves
+            if row.fingerprint != fingerprint:
+                return jsonify({
+                    'error': f'{HEADER} was already used for a different '
+                             f'request'
+                }), 422
+            if row.status is None:
+                return jsonify({
+                    'error': 'A request with this Idempotency-Key is still '
+                             'running'
+                }), 409, {'Retry-After': '1'}
+            return _replay(row)
+
+        running = threading.Event()
+        with _lock:
+            _inflight[key] = running
+        try:
+            return _run(key, view, args, kwargs)
+        finally:
+            with _lock:
+                _inflight.pop(key, None)
+            running.set()
+
+    return wrapper
@@ -0,0 +1,57 @@
+"""
+Eager loading options for the list and detail routes
+The schemas dump relationship ids (mechanics, inventory_items, etc.), so a
+plain query loads those one row at a time while serializing - the classic
+N+1 problem. Each route asks for the options of the model it returns instead.
+"""
+from flask import current_app
+from sqlalchemy.orm import raiseload, selectinload
+from app.models import Customer, Mechanic, ServiceTicket, Inventory
+
+
+def strict_loading(*options):
+    """
+    Add raiseload('*') to a list of loader options when strict mode is on
+
+    With RAISE_ON_LAZY_LOAD enabled any relationship that wasn't eager
+    loaded raises instead of quietly emitting SQL (lazy="raise_on_sql"),
+    so a new N+1 shows up as an error in development and in the tests.
+
+    Args:
+        *options: loader options the route already needs
+
+    Returns:
+        list: options to pass to query.options()
+    """
+    options = list(options)
+    if current_app.config.get('RAISE_ON_LAZY_LOAD'):
+        options.append(raiseload('*', sql_only=True))
+    return options
+
+
+def service_ticket_options():
+    """Relationships dumped by ServiceTicketSchema"""
+    return strict_loading(
+        selectinload(ServiceTicket.customer),
+        selectinload(ServiceTicket.mechanics),
+        selectinload(ServiceTicket.parts),
+    )
+
+
+def mechanic_options():
+    """Relationships dumped by MechanicSchema"""
+    return strict_loading(selectinload(Mechanic.service_tickets))
+
+
+def inventory_options():
+    """Relationships dumped by InventorySchema"""
+    return strict_loading(selectinload(Inventory.service_tickets))
+
+
+def customer_options():
+    """Nested service tickets dumped by the customer detail schema"""
+    tickets = selectinload(Customer.service_tickets)
+    return strict_loading(
+        tickets.selectinload(ServiceTicket.mechanics),
+        tickets.selectinload(ServiceTicket.parts),
+    )
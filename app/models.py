@@ -2,9 +2,18 @@
 Database models for the Mechanic Shop API
 """
 from app.extention import db
-from datetime import datetime
+from datetime import date, datetime
+from flask import current_app
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
 from werkzeug.security import generate_password_hash, check_password_hash
 
+
+def default_labor_hours():
+    """Hours charged on a ticket nobody has logged time against"""
+    return current_app.config.get('DEFAULT_LABOR_HOURS', 2)
+
+
 # Association tables for many-to-many relationships
 
 # Links mechanics to service tickets (one mechanic can work on many tickets)
@@ -15,13 +24,8 @@ mechanic_service_ticket = db.Table('mechanic_service_ticket',
               db.ForeignKey('service_tickets.id'), primary_key=True)
 )
 
-# Links inventory items to service tickets (tickets can need multiple parts)
-inventory_service_ticket = db.Table('inventory_service_ticket',
-    db.Column('inventory_id', db.Integer,
-              db.ForeignKey('inventory.id'), primary_key=True),
-    db.Column('service_ticket_id', db.Integer,
-              db.ForeignKey('service_tickets.id'), primary_key=True)
-)
+# Inventory items on a ticket are the ServiceTicketPart association object
+# further down - it also records how many of each part the ticket used
 
 
 class Customer(db.Model):
@@ -41,6 +45,7 @@ class Customer(db.Model):
     service_tickets = db.relationship('ServiceTicket', backref='customer',
                                       lazy=True,
                                       cascade='all, delete-orphan')
+    vehicles = db.relationship('Vehicle', backref='customer', lazy=True)
 
     def set_password(self, password):
         """Hash and set password"""
@@ -85,6 +90,30 @@ class Mechanic(db.Model):
         return f'<Mechanic {self.name}>'
 
 
+class Vehicle(db.Model):
+    __tablename__ = 'vehicles'
+
+    id = db.Column(db.Integer, primary_key=True)
+    # VIN is unique when known; older tickets may only give year/make/model
+    vin = db.Column(db.String(17), unique=True, index=True)
+    plate = db.Column(db.String(20), index=True)
+    make = db.Column(db.String(50))
+    model = db.Column(db.String(100))
+    year = db.Column(db.Integer)
+    customer_id = db.Column(db.Integer, db.ForeignKey('customers.id'),
+                            index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow,
+                           onupdate=datetime.utcnow)
+
+    # Relationships
+    service_tickets = db.relationship('ServiceTicket',
+                                      back_populates='vehicle')
+
+    def __repr__(self):
+        return f'<Vehicle {self.vin or self.id} {self.year} {self.make}>'
+
+
 class ServiceTicket(db.Model):
     __tablename__ = 'service_tickets'
 
@@ -94,13 +123,30 @@ class ServiceTicket(db.Model):
     customer_id = db.Column(db.Integer, db.ForeignKey('customers.id'),
                             nullable=False)
     vehicle_info = db.Column(db.Text)
+    vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicles.id'),
+                           index=True)
     estimated_cost = db.Column(db.Numeric(10, 2))
     status = db.Column(db.String(50), default='Open')
     priority = db.Column(db.String(20), default='Medium')
+    # Mechanic specialty the job needs; NULL means anyone can take it
+    specialty = db.Column(db.String(100))
     completion_date = db.Column(db.Date)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow,
                            onupdate=datetime.utcnow)
+    # Bumped on every ORM update, which only succeeds if it's unchanged
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+
+    __mapper_args__ = {'version_id_col': version}
+
+    # Open tickets for one specialty, oldest first (the claim-next queue
+    # sorts by priority rank on top, so it can't take its order from here)
+    __table_args__ = (
+        db.Index('ix_service_tickets_queue', 'status', 'specialty',
+                 'created_at'),
+        # Incremental jobs pick up rows written since their last run
+        db.Index('ix_service_tickets_updated_at', 'updated_at'),
+    )
 
     # Relationships
     # Many-to-many with mechanics
@@ -108,25 +154,55 @@ class ServiceTicket(db.Model):
                                 secondary=mechanic_service_ticket,
                                 back_populates='service_tickets')
 
-    # Many-to-many with inventory items
+    # The vehicle this ticket is for (vehicle_info is the free-text original)
+    vehicle = db.relationship('Vehicle', back_populates='service_tickets')
+
+    # Parts used on this ticket, with quantities
+    parts = db.relationship('ServiceTicketPart',
+                            back_populates='service_ticket',
+                            cascade='all, delete-orphan')
+
+    # Hours mechanics logged against this ticket (see TimeEntry)
+    time_entries = db.relationship('TimeEntry',
+                                   back_populates='service_ticket',
+                                   cascade='all, delete-orphan')
+
+    # Many-to-many view of the same rows, for schemas that only need ids
     inventory_items = db.relationship('Inventory',
-                                      secondary=inventory_service_ticket,
-                                      back_populates='service_tickets')
+                                      secondary='inventory_service_ticket',
+                                      back_populates='service_tickets',
+                                      viewonly=True)
 
     def calculate_total_cost(self):
-        """Calculate total cost including labor and parts"""
+        """
+        Calculate total cost including labor and parts
+
+        Labor is the hours logged against the ticket at each mechanic's
+        rate. A ticket nobody has logged time on yet is charged the
+        DEFAULT_LABOR_HOURS setting at the crew's average rate instead.
+        """
         total_cost = float(self.estimated_cost or 0)
 
-        # Add labor costs from assigned mechanics
-        if self.mechanics:
-            avg_rate = (sum(mechanic.hourly_rate for mechanic in
-                           self.mechanics) / len(self.mechanics))
-            # Assuming 2 hours of work - this could be made configurable
-            total_cost += float(avg_rate) * 2
+        # Add labor costs from logged time, or the assigned mechanics
+        labor = db.session.execute(
+            # Float: a Numeric result would be cut to the cent first
+            select(func.sum(TimeEntry.hours
+                            * func.coalesce(TimeEntry.rate, 0),
+                            type_=db.Float))
+            .where(TimeEntry.service_ticket_id == self.id)
+        ).scalar()  # NULL if no time is logged
+        if labor is not None:
+            total_cost += float(labor)
+        else:
+            rates = [mechanic.hourly_rate for mechanic in self.mechanics
+                     if mechanic.hourly_rate is not None]
+            if rates:
+                avg_rate = sum(rates) / len(rates)
+                total_cost += float(avg_rate) * default_labor_hours()
 
         # Add parts costs
-        for item in self.inventory_items:
-            total_cost += float(item.price)
+        for part in self.parts:
+            total_cost += float(part.inventory.price) * part.quantity
 
         return round(total_cost, 2)
 
@@ -144,14 +220,265 @@ class Inventory(db.Model):
     price = db.Column(db.Numeric(10, 2))
     category = db.Column(db.String(100))
     supplier = db.Column(db.String(100))
+    # Reorder once quantity drops to this level (0 = when it runs out)
+    reorder_threshold = db.Column(db.Integer, nullable=False, default=0,
+                                  server_default='0')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow,
                            onupdate=datetime.utcnow)
+    # Optimistic concurrency, as on ServiceTicket
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+
+    __mapper_args__ = {'version_id_col': version}
+
+    # Partial index holding only the low-stock rows, ordered for the
+    # per-supplier report - the rest of the catalog never enters it
+    __table_args__ = (
+        db.Index('ix_inventory_low_stock', 'supplier', 'name',
+                 postgresql_where=db.text('quantity <= reorder_threshold'),
+                 sqlite_where=db.text('quantity <= reorder_threshold')),
+    )
 
     # Relationships
+    ticket_parts = db.relationship('ServiceTicketPart',
+                                   back_populates='inventory',
+                                   cascade='all, delete-orphan')
     service_tickets = db.relationship('ServiceTicket',
-                                      secondary=inventory_service_ticket,
-                                      back_populates='inventory_items')
+                                      secondary='inventory_service_ticket',
+                                      back_populates='inventory_items',
+                                      viewonly=True)
+
+    @classmethod
+    def low_stock_filter(cls):
+        """WHERE clause matching ix_inventory_low_stock exactly"""
+        return cls.quantity <= cls.reorder_threshold
 
     def __repr__(self):
         return f'<Inventory {self.name}>'
+
+
+class ServiceTicketPart(db.Model):
+    """Association object - which parts a ticket used and how many"""
+    __tablename__ = 'inventory_service_ticket'
+
+    inventory_id = db.Column(db.Integer, db.ForeignKey('inventory.id'),
+                             primary_key=True)
+    service_ticket_id = db.Column(db.Integer,
+                                  db.ForeignKey('service_tickets.id'),
+                                  primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False, default=1)
+
+    service_ticket = db.relationship('ServiceTicket', back_populates='parts')
+    inventory = db.relationship('Inventory', back_populates='ticket_parts')
+
+    def __repr__(self):
+        return (f'<ServiceTicketPart {self.service_ticket_id}:'
+                f'{self.inventory_id} x{self.quantity}>')
+
+
+# Table object for Core queries and bulk inserts
+inventory_service_ticket = ServiceTicketPart.__table__
+
+
+class TimeEntry(db.Model):
+    """
+    Hours a mechanic worked on a ticket on one day
+    rate is the mechanic's hourly_rate when the time was logged, so a
+    raise doesn't reprice old work and a deleted mechanic's hours still
+    cost what they did.
+    """
+    __tablename__ = 'time_entries'
+
+    id = db.Column(db.Integer, primary_key=True)
+    service_ticket_id = db.Column(db.Integer,
+                                  db.ForeignKey('service_tickets.id'),
+                                  nullable=False, index=True)
+    mechanic_id = db.Column(db.Integer,
+                            db.ForeignKey('mechanics.id', ondelete='SET NULL'),
+                            index=True)
+    work_date = db.Column(db.Date, nullable=False, default=date.today)
+    hours = db.Column(db.Numeric(5, 2), nullable=False)
+    rate = db.Column(db.Numeric(10, 2))
+    note = db.Column(db.String(200))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    service_ticket = db.relationship('ServiceTicket',
+                                     back_populates='time_entries')
+
+    def __repr__(self):
+        return (f'<TimeEntry {self.service_ticket_id}:{self.mechanic_id} '
+                f'{self.work_date} {self.hours}h>')
+
+
+class TicketEvent(db.Model):
+    """
+    Something that happened to a ticket, for the live stream
+    Append-only; every worker tails it (see app/events.py). No foreign key
+    so a deleted ticket keeps its events.
+    """
+    __tablename__ = 'ticket_events'
+
+    id = db.Column(db.Integer, primary_key=True)
+    ticket_id = db.Column(db.Integer, nullable=False, index=True)
+    type = db.Column(db.String(30), nullable=False)
+    status = db.Column(db.String(20))  # the ticket's status right after
+    data = db.Column(db.Text)  # JSON
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f'<TicketEvent {self.id} {self.type} {self.ticket_id}>'
+
+
+class ChangeLog(db.Model):
+    """
+    Append-only log of writes for GET /changes (see app/changes.py)
+    One row per changed customer, mechanic, inventory item or ticket,
+    written in the same transaction as the change; compaction keeps only
+    the newest row per entity.
+    """
+    __tablename__ = 'change_log'
+    __table_args__ = (
+        db.Index('ix_change_log_entity', 'entity', 'entity_id', 'seq'),
+    )
+
+    seq = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(20), nullable=False)  # table name
+    entity_id = db.Column(db.Integer, nullable=False)
+    op = db.Column(db.String(1), nullable=False)  # U, D (P: see changes.py)
+    changed_at = db.Column(db.DateTime, default=datetime.utcnow,
+                           nullable=False)
+
+    def __repr__(self):
+        return f'<ChangeLog {self.seq} {self.op} {self.entity}:' \
+            f'{self.entity_id}>'
+
+
+class IdempotencyKey(db.Model):
+    """
+    First response to a request sent with an Idempotency-Key header
+    status is NULL while the first request is still running (see
+    app/idempotency.py); rows are deleted once expires_at passes.
+    """
+    __tablename__ = 'idempotency_keys'
+
+    key = db.Column(db.String(255), primary_key=True)
+    fingerprint = db.Column(db.String(64), nullable=False)
+    status = db.Column(db.Integer)
+    mimetype = db.Column(db.String(100))
+    body = db.Column(db.LargeBinary)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow,
+                           nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<IdempotencyKey {self.key} {self.status}>'
+
+
+class TicketCount(db.Model):
+    """
+    Ticket counts by status and priority for GET /service-tickets/stats
+    Triggers append a +1 / -1 row per ticket write (see app/stats.py), so
+    a count is the sum of its rows; reconciliation folds them back into
+    one row per pair.
+    """
+    __tablename__ = 'ticket_counts'
+
+    id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(50), nullable=False)
+    priority = db.Column(db.String(20), nullable=False)
+    delta = db.Column(db.Integer, nullable=False)
+
+
+class MechanicLoad(db.Model):
+    """Open tickets per mechanic, kept the same way as TicketCount"""
+    __tablename__ = 'mechanic_loads'
+
+    id = db.Column(db.Integer, primary_key=True)
+    mechanic_id = db.Column(db.Integer, nullable=False)
+    delta = db.Column(db.Integer, nullable=False)
+
+
+class MechanicRollup(db.Model):
+    """Completed-ticket labor and revenue per mechanic per day"""
+    __tablename__ = 'rollup_mechanic_daily'
+
+    day = db.Column(db.Date, primary_key=True)
+    mechanic_id = db.Column(db.Integer, primary_key=True)
+    tickets = db.Column(db.Integer, nullable=False)
+    labor = db.Column(db.Numeric(12, 2), nullable=False)
+    revenue = db.Column(db.Numeric(12, 2), nullable=False)
+
+
+class PartRollup(db.Model):
+    """Parts used on completed tickets per inventory category per day"""
+    __tablename__ = 'rollup_parts_daily'
+
+    day = db.Column(db.Date, primary_key=True)
+    category = db.Column(db.String(100), primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False)
+    spend = db.Column(db.Numeric(12, 2), nullable=False)
+
+
+class PriorityRollup(db.Model):
+    """Completed-ticket cost per priority per day"""
+    __tablename__ = 'rollup_priority_daily'
+
+    day = db.Column(db.Date, primary_key=True)
+    priority = db.Column(db.String(20), primary_key=True)
+    tickets = db.Column(db.Integer, nullable=False)
+    labor = db.Column(db.Numeric(12, 2), nullable=False)
+    parts = db.Column(db.Numeric(12, 2), nullable=False)
+    total = db.Column(db.Numeric(12, 2), nullable=False)
+
+
+class Watermark(db.Model):
+    """How far an incremental job has read, by job name"""
+    __tablename__ = 'watermarks'
+
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<Watermark {self.name} {self.value}>'
+
+
+@event.listens_for(Session, 'before_flush')
+def _touch_related(session, flush_context, instances):
+    """
+    Bump updated_at on rows whose dumped relationships changed
+
+    Assigning a mechanic or adding a part only writes link rows, so the
+    ticket, mechanic and inventory rows that list those links would keep
+    their old updated_at - and their old ETag (app/conditional.py).
+    """
+    now = datetime.utcnow()
+    touched = (ServiceTicket, Mechanic, Inventory)
+    stale = {model: set() for model in touched}
+
+    for obj in session.dirty:
+        # Only collections changed - nothing would UPDATE the row itself
+        if isinstance(obj, touched) and session.is_modified(obj) and \
+                not session.is_modified(obj, include_collections=False):
+            obj.updated_at = now
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, ServiceTicketPart):
+            stale[ServiceTicket].add(obj.service_ticket_id)
+            stale[Inventory].add(obj.inventory_id)
+        elif isinstance(obj, TimeEntry):
+            # Logged time changes the ticket's cost (app/reports.py)
+            stale[ServiceTicket].add(obj.service_ticket_id)
+    for obj in session.deleted:
+        if isinstance(obj, ServiceTicket):
+            stale[Mechanic].update(m.id for m in obj.mechanics)
+        elif isinstance(obj, Mechanic):
+            stale[ServiceTicket].update(t.id for t in obj.service_tickets)
+
+    for model, ids in stale.items():
+        ids.discard(None)
+        if ids:
+            # Core UPDATE by id - the rows usually aren't loaded
+            session.connection().execute(
+                model.__table__.update()
+                .where(model.__table__.c.id.in_(ids))
+                .values(updated_at=now)
+            )
@@ -0,0 +1,166 @@
+"""
+Reporting rollups behind the /reports blueprint
+
+Revenue per mechanic, parts spend per category and ticket cost per
+priority used to mean loading every completed ticket and calling
+calculate_total_cost() on each. Instead `flask refresh-reports` folds
+completed tickets into three small tables keyed by completion day and
+dimension, and the reports only sum the days they cover - so a year's
+report reads about 365 rows per key, however much history piles up.
+
+Ticket costs come from the SQL in app/costing.py, which prices tickets
+the way calculate_total_cost() does. A mechanic is credited with the
+labor of the hours they logged (or, on a ticket without logged time, an
+equal share of the default hours at their own rate) and an equal share of
+the ticket total.
+
+Each refresh only rebuilds the completion days of tickets written since
+the last run (service_tickets.updated_at, which assignments and parts
+bump too), re-reading OVERLAP before the watermark for transactions that
+committed late. Deleted tickets and moved completion dates aren't picked
+up until `flask refresh-reports --rebuild`.
+"""
+import time
+from datetime import timedelta
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import case, delete, func, insert, select, true
+from app.extention import db
+from app.costing import (
+    completed_tickets, inventory, mechanics, parts, ticket_costs,
+    time_entries
+)
+from app.models import (
+    MechanicRollup, PartRollup, PriorityRollup, Watermark,
+    default_labor_hours
+)
+from app.workflow import COMPLETED, links, tickets
+
+WATERMARK = 'reports'
+OVERLAP = timedelta(minutes=5)
+UNCATEGORIZED = 'Uncategorized'
+DAYS_PER_BATCH = 500
+
+mechanic_rollups = MechanicRollup.__table__
+part_rollups = PartRollup.__table__
+priority_rollups = PriorityRollup.__table__
+ROLLUPS = (mechanic_rollups, part_rollups, priority_rollups)
+
+
+def _rebuild(days):
+    """Replace the rollup rows for `days` (None: all of them)"""
+    for table in ROLLUPS:
+        statement = delete(table)
+        if days is not None:
+            statement = statement.where(table.c.day.in_(days))
+        db.session.execute(statement)
+
+    done = completed_tickets(days=days)
+    costs = ticket_costs(done)
+    db.session.execute(insert(priority_rollups).from_select(
+        ['day', 'priority', 'tickets', 'labor', 'parts', 'total'],
+        select(costs.c.day, costs.c.priority, func.count(),
+               func.sum(costs.c.labor), func.sum(costs.c.parts),
+               func.sum(costs.c.total))
+        .group_by(costs.c.day, costs.c.priority)
+    ))
+    worked = (
+        select(time_entries.c.service_ticket_id.label('ticket_id'),
+               time_entries.c.mechanic_id,
+               func.sum(time_entries.c.hours
+                        * func.coalesce(time_entries.c.rate, 0))
+               .label('amount'))
+        .join(done, done.c.id == time_entries.c.service_ticket_id)
+        .group_by(time_entries.c.service_ticket_id,
+                  time_entries.c.mechanic_id)
+        .subquery('worked')
+    )
+    rate = func.coalesce(mechanics.c.hourly_rate, 0)
+    labor = case(
+        (costs.c.hours.isnot(None), func.coalesce(worked.c.amount, 0)),
+        else_=rate * default_labor_hours() / costs.c.crew
+    )
+    db.session.execute(insert(mechanic_rollups).from_select(
+        ['day', 'mechanic_id', 'tickets', 'labor', 'revenue'],
+        select(costs.c.day, links.c.mechanic_id, func.count(),
+               func.sum(labor), func.sum(costs.c.total / costs.c.crew))
+        .join(links, links.c.service_ticket_id == costs.c.id)
+        .join(mechanics, mechanics.c.id == links.c.mechanic_id)
+        .outerjoin(worked, (worked.c.ticket_id == costs.c.id)
+                   & (worked.c.mechanic_id == links.c.mechanic_id))
+        .group_by(costs.c.day, links.c.mechanic_id)
+    ))
+    category = func.coalesce(inventory.c.category, UNCATEGORIZED)
+    db.session.execute(insert(part_rollups).from_select(
+        ['day', 'category', 'quantity', 'spend'],
+        select(done.c.day, category, func.sum(parts.c.quantity),
+               func.sum(func.coalesce(inventory.c.price, 0)
+                        * parts.c.quantity))
+        .join(parts, parts.c.service_ticket_id == done.c.id)
+        .join(inventory, inventory.c.id == parts.c.inventory_id)
+        .group_by(done.c.day, category)
+    ))
+
+
+def refresh(rebuild=False):
+    """
+    Bring the rollups up to date with tickets written since the last run
+
+    Args:
+        rebuild (bool): recompute every day instead
+
+    Returns:
+        dict: 'days' rebuilt (None for all) and the new 'watermark'
+    """
+    mark = db.session.get(Watermark, WATERMARK) or Watermark(name=WATERMARK)
+    since = None if rebuild else mark.value
+    window = tickets.c.updated_at > since - OVERLAP \
+        if since is not None else true()
+    latest = db.session.execute(
+        select(func.max(tickets.c.updated_at)).where(window)
+    ).scalar()
+
+    if since is None:
+        _rebuild(None)
+        days = None
+    else:
+        days = db.session.execute(
+            select(tickets.c.completion_date).distinct()
+            .where(window, tickets.c.status == COMPLETED,
+                   tickets.c.completion_date.isnot(None))
+        ).scalars().all()
+        for start in range(0, len(days), DAYS_PER_BATCH):
+            _rebuild(days[start:start + DAYS_PER_BATCH])
+
+    if latest is not None and (mark.value is None or latest > mark.value):
+        mark.value = latest
+    db.session.add(mark)
+    db.session.commit()
+    return {'days': None if days is None else len(days),
+            'watermark': mark.value}
+
+
+def refreshed_through():
+    """Newest ticket write the rollups include, None before the first run"""
+    mark = db.session.get(Watermark, WATERMARK)
+    return mark.value if mark else None
+
+
+def month(day):
+    """'YYYY-MM' of a date column, in this database's dialect"""
+    if db.engine.dialect.name == 'sqlite':
+        return func.strftime('%Y-%m', day)
+    return func.to_char(day, 'YYYY-MM')
+
+
+@click.command('refresh-reports')
+@click.option('--rebuild', is_flag=True,
+              help='Recompute every day instead of only recent writes.')
+@with_appcontext
+def refresh_reports_command(rebuild):
+    """Fold newly completed tickets into the reporting rollups."""
+    start = time.perf_counter()
+    result = refresh(rebuild=rebuild)
+    days = 'all' if result['days'] is None else result['days']
+    click.echo(f"Rebuilt {days} days through {result['watermark']} in "
+               f"{time.perf_counter() - start:.1f}s")
@@ -0,0 +1,306 @@
+"""
+Bulk data seeder - `flask seed`
+Creating rows through the models (like BaseTestCase.create_test_data does)
+is far too slow for capacity testing, so rows are generated as plain dicts
+and written with Core executemany inserts in large batches.
+
+Every chunk of rows gets its own random seed derived from --seed, so the
+output is identical whether chunks are generated in one process or many.
+"""
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func, select, text
+from werkzeug.security import generate_password_hash
+from app.extention import db
+from app.models import (
+    Customer, Mechanic, ServiceTicket, Inventory,
+    mechanic_service_ticket, inventory_service_ticket
+)
+
+# Every seeded customer and mechanic logs in with this password
+SEED_PASSWORD = 'seedpass123'
+
+SPECIALTIES = ['Engine', 'Brakes', 'Transmission', 'Electrical', 'Body Work']
+CATEGORIES = ['Filters', 'Brakes', 'Fluids', 'Ignition', 'Suspension']
+SUPPLIERS = ['AutoParts Inc', 'Parts Plus', 'Brake World', 'OEM Direct']
+STATUSES = ['Open', 'In Progress', 'Completed', 'Cancelled']
+PRIORITIES = ['Low', 'Medium', 'High', 'Urgent']
+# Words for ticket text, so full-text search has something real to match
+JOBS = ['Brake pad replacement', 'Oil change', 'Timing belt replacement',
+        'Transmission flush', 'Battery replacement', 'Wheel alignment',
+        'Coolant leak repair', 'Annual inspection', 'Clutch replacement',
+        'Spark plug replacement', 'Suspension repair', 'AC recharge']
+# Specialty each job needs (claim-next queue); the rest anyone can take
+JOB_SPECIALTY = {'Brake pad replacement': 'Brakes',
+                 'Timing belt replacement': 'Engine',
+                 'Transmission flush': 'Transmission',
+                 'Battery replacement': 'Electrical',
+                 'Clutch replacement': 'Transmission',
+                 'Spark plug replacement': 'Engine',
+                 'AC recharge': 'Electrical'}
+SYMPTOMS = ['grinding noise when braking', 'check engine light on',
+            'vibration at highway speed', 'hard starting in the morning',
+            'fluid leak under the car', 'squealing belt on startup',
+            'pulls to the left', 'warning light on dashboard',
+            'overheating in traffic', 'rough idle']
+MAKES = ['Toyota Corolla', 'Honda Civic', 'Ford Focus', 'Chevrolet Malibu',
+         'Nissan Altima', 'Subaru Outback', 'Jeep Wrangler', 'Tesla Model 3',
+         'Volkswagen Golf', 'BMW 330i']
+
+
+def _rng(seed, table, chunk):
+    """Independent, reproducible random stream for one chunk of rows"""
+    return random.Random(f'{seed}:{table}:{chunk}')
+
+
+def _customers(job):
+    seed, chunk, start, stop, password_hash, now = job
+    return [{
+        'id': i,
+        'name': f'Customer {i}',
+        'email': f'customer{i}@seed.local',
+        'phone': f'555-{i:07d}',
+        'address': f'{i} Seed St',
+        'password_hash': password_hash,
+        'created_at': now,
+        'updated_at': now,
+    } for i in range(start, stop)]
+
+
+def _mechanics(job):
+    seed, chunk, start, stop, password_hash, now = job
+    rng = _rng(seed, 'mechanics', chunk)
+    return [{
+        'id': i,
+        'name': f'Mechanic {i}',
+        'email': f'mechanic{i}@seed.local',
+        'phone': f'555-{i:07d}',
+        'specialty': SPECIALTIES[i % len(SPECIALTIES)],
+        'hourly_rate': rng.randint(40, 120),
+        'password_hash': password_hash,
+        'created_at': now,
+        'updated_at': now,
+    } for i in range(start, stop)]
+
+
+def _parts(job):
+    seed, chunk, start, stop, now = job
+    rng = _rng(seed, 'inventory', chunk)
+    return [{
+        'id': i,
+        'name': f'Part {i}',
+        'description': 'Seeded part',
+        'quantity': rng.randint(0, 200),
+        'price': round(rng.uniform(2, 400), 2),
+        'category': CATEGORIES[i % len(CATEGORIES)],
+        'supplier': SUPPLIERS[i % len(SUPPLIERS)],
+        'created_at': now,
+        'updated_at': now,
+    } for i in range(start, stop)]
+
+
+def _tickets(job):
+    """Tickets for one chunk plus their mechanic and part links"""
+    (seed, chunk, start, stop, customer_ids, mechanic_ids, part_ids,
+     mechanics_per_ticket, parts_per_ticket, now) = job
+    rng = _rng(seed, 'service_tickets', chunk)
+    tickets, mechanic_links, part_links = [], [], []
+    for i in range(start, stop):
+        created = now - timedelta(minutes=rng.randint(0, 525600))
+        title = rng.choice(JOBS)
+        tickets.append({
+            'id': i,
+            'title': title,
+            'specialty': JOB_SPECIALTY.get(title),
+            'description': f'Customer reports {rng.choice(SYMPTOMS)} and '
+                           f'{rng.choice(SYMPTOMS)}',
+            'customer_id': rng.randrange(*customer_ids),
+            'vehicle_info': f'{rng.randint(1995, 2024)} {rng.choice(MAKES)}',
+            'estimated_cost': round(rng.uniform(50, 1500), 2),
+            'status': rng.choice(STATUSES),
+            'priority': rng.choice(PRIORITIES),
+            'created_at': created,
+            'updated_at': created,
+        })
+        # No extra draws, so the same seed still makes the same rows
+        tickets[-1]['completion_date'] = \
+            min(created + timedelta(days=i % 7), now).date() \
+            if tickets[-1]['status'] == 'Completed' else None
+        fan_out = rng.randint(0, min(mechanics_per_ticket,
+                                     len(range(*mechanic_ids))))
+        for mechanic_id in rng.sample(range(*mechanic_ids), fan_out):
+            mechanic_links.append(
+                {'mechanic_id': mechanic_id, 'service_ticket_id': i}
+            )
+        fan_out = rng.randint(0, min(parts_per_ticket, len(range(*part_ids))))
+        for inventory_id in rng.sample(range(*part_ids), fan_out):
+            part_links.append({'inventory_id': inventory_id,
+                               'service_ticket_id': i,
+                               'quantity': rng.randint(1, 4)})
+    return tickets, mechanic_links, part_links
+
+
+def _chunks(first_id, count, batch_size):
+    """(chunk number, start id, stop id) for count rows from first_id"""
+    return [
+        (n, start, min(start + batch_size, first_id + count))
+        for n, start in enumerate(range(first_id, first_id + count,
+                                        batch_size))
+    ]
+
+
+def _next_id(conn, table):
+    return (conn.execute(select(func.max(table.c.id))).scalar() or 0) + 1
+
+
+def _reset_sequences(conn, tables):
+    """Explicit ids don't advance Postgres sequences, so move them on"""
+    if conn.dialect.name != 'postgresql':
+        return
+    for table in tables:
+        conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+            f"(SELECT COALESCE(MAX(id), 1) FROM {table.name}))"
+        ))
+
+
+def seed_dataset(customers=1000, mechanics=50, parts=500, tickets=10000,
+                 mechanics_per_ticket=2, parts_per_ticket=3,
+                 batch_size=10000, seed=42, workers=1,
+                 password=SEED_PASSWORD):
+    """
+    Bulk load generated rows, appending after any existing ids
+
+    Args:
+        customers (int): number of customers
+        mechanics (int): number of mechanics
+        parts (int): number of inventory items
+        tickets (int): number of service tickets
+        mechanics_per_ticket (int): max mechanics linked to each ticket
+        parts_per_ticket (int): max parts linked to each ticket
+        batch_size (int): rows per chunk and per INSERT batch
+        seed (int): random seed - same seed, same data
+        workers (int): processes generating rows; 1 generates inline
+        password (str): login password for every customer and mechanic
+
+    Returns:
+        dict: row counts per table
+    """
+    now = datetime.utcnow()
+    # Hashing is deliberately slow, so hash once and share it
+    password_hash = generate_password_hash(password)
+    pool = ProcessPoolExecutor(workers) if workers > 1 else None
+    generate = pool.map if pool else map
+
+    tables = (Customer.__table__, Mechanic.__table__, Inventory.__table__,
+              ServiceTicket.__table__)
+    counts = {'mechanic_service_ticket': 0, 'inventory_service_ticket': 0}
+    try:
+        with db.engine.connect() as conn:
+            if conn.dialect.name == 'sqlite':
+                # Durability doesn't matter while bulk loading test data
+                conn.exec_driver_sql('PRAGMA synchronous = OFF')
+            first = {table.name: _next_id(conn, table) for table in tables}
+
+            def load(table, generator, jobs):
+                for rows in generate(generator, jobs):
+                    conn.execute(table.insert(), rows)
+                    conn.commit()
+
+            load(Customer.__table__, _customers, [
+                (seed, n, start, stop, password_hash, now)
+                for n, start, stop in _chunks(first['customers'], customers,
+                                              batch_size)
+            ])
+            load(Mechanic.__table__, _mechanics, [
+                (seed, n, start, stop, password_hash, now)
+                for n, start, stop in _chunks(first['mechanics'], mechanics,
+                                              batch_size)
+            ])
+            load(Inventory.__table__, _parts, [
+                (seed, n, start, stop, now)
+                for n, start, stop in _chunks(first['inventory'], parts,
+                                              batch_size)
+            ])
+
+            ranges = (
+                (first['customers'], first['customers'] + customers),
+                (first['mechanics'], first['mechanics'] + mechanics),
+                (first['inventory'], first['inventory'] + parts),
+            )
+            jobs = [
+                (seed, n, start, stop) + ranges
+                + (mechanics_per_ticket, parts_per_ticket, now)
+                for n, start, stop in _chunks(first['service_tickets'],
+                                              tickets, batch_size)
+            ]
+            for ticket_rows, mechanic_links, part_links in generate(
+                _tickets, jobs
+            ):
+                conn.execute(ServiceTicket.__table__.insert(), ticket_rows)
+                if mechanic_links:
+                    conn.execute(mechanic_service_ticket.insert(),
+                                 mechanic_links)
+                if part_links:
+                    conn.execute(inventory_service_ticket.insert(),
+                                 part_links)
+                conn.commit()
+                counts['mechanic_service_ticket'] += len(mechanic_links)
+                counts['inventory_service_ticket'] += len(part_links)
+
+            _reset_sequences(conn, tables)
+            conn.commit()
+    finally:
+        if pool:
+            pool.shutdown()
+
+    counts.update({
+        'customers': customers,
+        'mechanics': mechanics,
+        'inventory': parts,
+        'service_tickets': tickets,
+    })
+    return counts
+
+
+@click.command('seed')
+@click.option('--customers', default=1000, show_default=True)
+@click.option('--mechanics', default=50, show_default=True)
+@click.option('--parts', default=500, show_default=True)
+@click.option('--tickets', default=10000, show_default=True)
+@click.option('--mechanics-per-ticket', default=2, show_default=True)
+@click.option('--parts-per-ticket', default=3, show_default=True)
+@click.option('--batch-size', default=10000, show_default=True)
+@click.option('--seed', default=42, show_default=True,
+              help='Same seed, same data.')
+@click.option('--workers', default=os.cpu_count() or 1, show_default=True,
+              help='Processes generating rows.')
+@click.option('--password', default=SEED_PASSWORD, show_default=True,
+              help='Login password for seeded customers and mechanics.')
+@click.option('--reset', is_flag=True,
+              help='Drop and recreate all tables first.')
+@with_appcontext
+def seed_command(customers, mechanics, parts, tickets, mechanics_per_ticket,
+                 parts_per_ticket, batch_size, seed, workers, password,
+                 reset):
+    """Bulk load generated customers, mechanics, parts and tickets."""
+    if reset:
+        db.drop_all()
+    db.create_all()
+
+    start = time.perf_counter()
+    counts = seed_dataset(
+        customers=customers, mechanics=mechanics, parts=parts,
+        tickets=tickets, mechanics_per_ticket=mechanics_per_ticket,
+        parts_per_ticket=parts_per_ticket, batch_size=batch_size,
+        seed=seed, workers=workers, password=password,
+    )
+    elapsed = time.perf_counter() - start
+    for table, count in counts.items():
+        click.echo(f'{table}: {count}')
+    click.echo(f'Seeded {sum(counts.values())} rows in {elapsed:.1f}s')
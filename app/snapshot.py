@@ -0,0 +1,190 @@
+"""
+Offline analytics snapshot - a SQLite copy reporting can query instead of
+the production database
+
+`flask snapshot-analytics analytics.db` copies customers, mechanics,
+inventory and service tickets, with their mechanic links, parts and time
+entries, into a SQLite file. After the first run it only copies what
+changed:
+
+- rows with updated_at past the table's watermark (less OVERLAP, for
+  transactions that committed late) are upserted
+- a changed ticket's links, parts and time entries are replaced whole -
+  they have no updated_at, but every write to them bumps the ticket's
+- deletes come from the change log's tombstones (app/changes.py), which
+  `flask compact-changes` keeps for 30 days by default; run at least that
+  often or pass --full
+
+The watermarks are stored in the snapshot itself, so a new file starts
+with a full copy. Password hashes are never copied. The source is read
+in one REPEATABLE READ snapshot on Postgres, BATCH rows at a time.
+"""
+import time
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import (
+    Column, Index, MetaData, Table, create_engine, delete, func, insert,
+    select
+)
+from app.changes import DELETE, change_log
+from app.exports import BATCH
+from app.extention import db
+from app.models import (
+    Customer, Inventory, Mechanic, ServiceTicket, TimeEntry, Watermark,
+    inventory_service_ticket, mechanic_service_ticket
+)
+from app.reports import OVERLAP
+
+# Copied by updated_at, deleted by change log tombstones
+ENTITIES = [model.__table__ for model in
+            (Customer, Mechanic, Inventory, ServiceTicket)]
+# Copied with their ticket
+CHILDREN = [mechanic_service_ticket, inventory_service_ticket,
+            TimeEntry.__table__]
+HIDDEN = {'password_hash'}
+
+
+def snapshot_metadata():
+    """
+    The snapshot's tables: same names and columns, no foreign keys (rows
+    arrive in any order) and no triggers or server defaults
+    """
+    metadata = MetaData()
+    for table in ENTITIES + CHILDREN + [Watermark.__table__]:
+        Table(table.name, metadata, *(
+            Column(column.name, column.type, primary_key=column.primary_key,
+                   autoincrement=False)
+            for column in table.columns if column.name not in HIDDEN
+        ))
+    for table in CHILDREN:
+        Index(f'ix_{table.name}_ticket',
+              metadata.tables[table.name].c.service_ticket_id)
+    return metadata
+
+
+def _columns(table):
+    return [column for column in table.columns if column.name not in HIDDEN]
+
+
+def _delete_children(target, metadata, ticket_ids):
+    for table in CHILDREN:
+        copy = metadata.tables[table.name]
+        target.execute(delete(copy)
+                       .where(copy.c.service_ticket_id.in_(ticket_ids)))
+
+
+def _copy_children(target, metadata, ticket_ids):
+    """Replace the links, parts and time entries of these tickets"""
+    _delete_children(target, metadata, ticket_ids)
+    for table in CHILDREN:
+        rows = db.session.execute(
+            select(*_columns(table))
+            .where(table.c.service_ticket_id.in_(ticket_ids))
+        ).mappings().all()
+        if rows:
+            target.execute(insert(metadata.tables[table.name]), rows)
+
+
+def _copy_entity(target, metadata, table, since):
+    """
+    Apply deletes, then upsert rows written after `since`
+
+    Returns:
+        tuple: (rows upserted, rows deleted, newest updated_at read)
+    """
+    copy = metadata.tables[table.name]
+    is_ticket = table is ServiceTicket.__table__
+
+    deleted = 0
+    if since is not None:
+        gone = db.session.execute(
+            select(change_log.c.entity_id).distinct()
+            .where(change_log.c.entity == table.name,
+                   change_log.c.op == DELETE,
+                   change_log.c.changed_at > since - OVERLAP)
+        ).scalars().all()
+        for start in range(0, len(gone), BATCH):
+            ids = gone[start:start + BATCH]
+            deleted += target.execute(
+                delete(copy).where(copy.c.id.in_(ids))).rowcount
+            if is_ticket:
+                _delete_children(target, metadata, ids)
+
+    query = select(*_columns(table)).order_by(table.c.id)
+    if since is not None:
+        query = query.where(table.c.updated_at > since - OVERLAP)
+    result = db.session.execute(query.execution_options(yield_per=BATCH))
+    copied, latest = 0, since
+    for batch in result.mappings().partitions():
+        # SQLite's upsert - the whole row is rewritten
+        target.execute(insert(copy).prefix_with('OR REPLACE'), batch)
+        copied += len(batch)
+        newest = max((row['updated_at'] for row in batch
+                      if row['updated_at'] is not None), default=None)
+        if newest is not None and (latest is None or newest > latest):
+            latest = newest
+        if is_ticket:
+            _copy_children(target, metadata, [row['id'] for row in batch])
+    return copied, deleted, latest
+
+
+def export_snapshot(path, full=False):
+    """
+    Bring the SQLite snapshot at `path` up to date
+
+    Args:
+        path (str): snapshot file, created if missing
+        full (bool): copy everything again instead of only changes
+
+    Returns:
+        dict: table name -> {'copied', 'deleted'} this run, and for the
+        link tables {'rows'} now in the snapshot
+    """
+    metadata = snapshot_metadata()
+    engine = create_engine(f'sqlite:///{path}')
+    metadata.create_all(engine)
+    marks = metadata.tables[Watermark.__tablename__]
+
+    if db.engine.dialect.name == 'postgresql':
+        db.session.connection(
+            execution_options={'isolation_level': 'REPEATABLE READ'}
+        )
+    counts = {}
+    try:
+        with engine.begin() as target:
+            if full:
+                for table in reversed(metadata.sorted_tables):
+                    target.execute(delete(table))
+            stored = dict(target.execute(select(marks.c.name,
+                                                marks.c.value)).all())
+            for table in ENTITIES:
+                since = stored.get(table.name)
+                copied, deleted, latest = _copy_entity(target, metadata,
+                                                       table, since)
+                counts[table.name] = {'copied': copied, 'deleted': deleted}
+                if latest is not None and latest != since:
+                    target.execute(insert(marks).prefix_with('OR REPLACE'),
+                                   {'name': table.name, 'value': latest})
+            counts.update({table.name: {'rows': target.execute(
+                select(func.count()).select_from(
+                    metadata.tables[table.name])).scalar()}
+                for table in CHILDREN})
+    finally:
+        db.session.rollback()  # end the read snapshot
+        engine.dispose()
+    return counts
+
+
+@click.command('snapshot-analytics')
+@click.argument('path', default='analytics.db')
+@click.option('--full', is_flag=True,
+              help='Copy every row again instead of only changes.')
+@with_appcontext
+def snapshot_analytics_command(path, full):
+    """Copy changed rows into the SQLite analytics snapshot at PATH."""
+    start = time.perf_counter()
+    counts = export_snapshot(path, full=full)
+    for name, count in counts.items():
+        detail = ', '.join(f'{value} {key}' for key, value in count.items())
+        click.echo(f'{name}: {detail}')
+    click.echo(f'Updated {path} in {time.perf_counter() - start:.1f}s')
@@ -0,0 +1,309 @@
+"""
+Dashboard counters behind GET /service-tickets/stats
+
+Counting tickets by status and priority, and open tickets per mechanic,
+with GROUP BY reads the whole ticket table on every dashboard refresh.
+Instead triggers on service_tickets and mechanic_service_ticket append a
++1 / -1 row to ticket_counts and mechanic_loads for every ticket insert,
+delete, status or priority change and assignment - in the writing
+statement's transaction, for ORM writes, the Core UPDATEs in
+app/workflow.py and the seed's bulk inserts alike (like app/fulltext.py).
+
+Appending instead of updating one row per count means concurrent writers
+never wait on, or deadlock over, the same hot counter row. A count is the
+sum of its rows; `flask reconcile-stats` recomputes everything from the
+tickets, reports any drift and folds the rows back to one per count. Run
+it periodically, and once to install the triggers on an existing database.
+"""
+import time
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import event, func, insert, select
+from app.extention import db
+from app.models import Mechanic, MechanicLoad, TicketCount
+from app.workflow import FINAL, OPEN, current_status, links, tickets
+
+# Tickets saved without a priority count as the column default
+DEFAULT_PRIORITY = 'Medium'
+
+ticket_counts = TicketCount.__table__
+mechanic_loads = MechanicLoad.__table__
+current_priority = func.coalesce(tickets.c.priority, DEFAULT_PRIORITY)
+
+_final = ', '.join(f"'{status}'" for status in FINAL)
+
+
+def _status(row):
+    return f"coalesce({row}.status, '{OPEN}')"
+
+
+def _priority(row):
+    return f"coalesce({row}.priority, '{DEFAULT_PRIORITY}')"
+
+
+def _is_open(row):
+    return f"{_status(row)} NOT IN ({_final})"
+
+
+SQLITE_DDL = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS ticket_counts_insert
+    AFTER INSERT ON service_tickets BEGIN
+        INSERT INTO ticket_counts (status, priority, delta)
+        VALUES ({_status('new')}, {_priority('new')}, 1);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS ticket_counts_delete
+    AFTER DELETE ON service_tickets BEGIN
+        INSERT INTO ticket_counts (status, priority, delta)
+        VALUES ({_status('old')}, {_priority('old')}, -1);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS ticket_counts_update
+    AFTER UPDATE OF status, priority ON service_tickets
+    WHEN old.status IS NOT new.status OR old.priority IS NOT new.priority
+    BEGIN
+        INSERT INTO ticket_counts (status, priority, delta)
+        VALUES ({_status('old')}, {_priority('old')}, -1),
+               ({_status('new')}, {_priority('new')}, 1);
+        INSERT INTO mechanic_loads (mechanic_id, delta)
+        SELECT mechanic_id, CASE WHEN {_is_open('new')} THEN 1 ELSE -1 END
+        FROM mechanic_service_ticket
+        WHERE service_ticket_id = new.id
+          AND ({_is_open('old')}) != ({_is_open('new')});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS mechanic_loads_insert
+    AFTER INSERT ON mechanic_service_ticket BEGIN
+        INSERT INTO mechanic_loads (mechanic_id, delta)
+        SELECT new.mechanic_id, 1 FROM service_tickets
+        WHERE id = new.service_ticket_id AND {_is_open('service_tickets')};
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS mechanic_loads_delete
+    AFTER DELETE ON mechanic_service_ticket BEGIN
+        INSERT INTO mechanic_loads (mechanic_id, delta)
+        SELECT old.mechanic_id, -1 FROM service_tickets
+        WHERE id = old.service_ticket_id AND {_is_open('service_tickets')};
+    END
+    """,
+]
+
+POSTGRES_DDL = [
+    f"""
+    CREATE OR REPLACE FUNCTION ticket_counts_sync() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP <> 'INSERT' THEN
+            INSERT INTO ticket_counts (status, priority, delta)
+            VALUES ({_status('OLD')}, {_priority('OLD')}, -1);
+        END IF;
+        IF TG_OP <> 'DELETE' THEN
+            INSERT INTO ticket_counts (status, priority, delta)
+            VALUES ({_status('NEW')}, {_priority('NEW')}, 1);
+        END IF;
+        IF TG_OP = 'UPDATE' AND ({_is_open('OLD')}) <> ({_is_open('NEW')})
+        THEN
+            INSERT INTO mechanic_loads (mechanic_id, delta)
+            SELECT mechanic_id,
+                   CASE WHEN {_is_open('NEW')} THEN 1 ELSE -1 END
+            FROM mechanic_service_ticket
+            WHERE service_ticket_id = NEW.id;
+        END IF;
+        RETURN NULL;
+    END $$
+    """,
+    f"""
+    CREATE OR REPLACE FUNCTION mechanic_loads_sync() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            INSERT INTO mechanic_loads (mechanic_id, delta)
+            SELECT NEW.mechanic_id, 1 FROM service_tickets
+            WHERE id = NEW.service_ticket_id
+              AND {_is_open('service_tickets')};
+        ELSE
+            INSERT INTO mechanic_loads (mechanic_id, delta)
+            SELECT OLD.mechanic_id, -1 FROM service_tickets
+            WHERE id = OLD.service_ticket_id
+              AND {_is_open('service_tickets')};
+        END IF;
+        RETURN NULL;
+    END $$
+    """,
+    "DROP TRIGGER IF EXISTS ticket_counts_sync ON service_tickets",
+    """
+    CREATE TRIGGER ticket_counts_sync
+    AFTER INSERT OR DELETE ON service_tickets
+    FOR EACH ROW EXECUTE FUNCTION ticket_counts_sync()
+    """,
+    "DROP TRIGGER IF EXISTS ticket_counts_update ON service_tickets",
+    """
+    CREATE TRIGGER ticket_counts_update
+    AFTER UPDATE OF status, priority ON service_tickets
+    FOR EACH ROW WHEN (OLD.status IS DISTINCT FROM NEW.status
+                       OR OLD.priority IS DISTINCT FROM NEW.priority)
+    EXECUTE FUNCTION ticket_counts_sync()
+    """,
+    "DROP TRIGGER IF EXISTS mechanic_loads_sync ON mechanic_service_ticket",
+    """
+    CREATE TRIGGER mechanic_loads_sync
+    AFTER INSERT OR DELETE ON mechanic_service_ticket
+    FOR EACH ROW EXECUTE FUNCTION mechanic_loads_sync()
+    """,
+]
+
+
+def install_counters(connection):
+    """Create the counter tables and their triggers if they're missing"""
+    ticket_counts.create(connection, checkfirst=True)
+    mechanic_loads.create(connection, checkfirst=True)
+    statements = {
+        'sqlite': SQLITE_DDL,
+        'postgresql': POSTGRES_DDL,
+    }.get(connection.dialect.name, [])
+    for statement in statements:
+        connection.exec_driver_sql(statement)
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _create_counters(target, connection, **kw):
+    # After every table, since the triggers span three of them
+    install_counters(connection)
+
+
+def _stored_counts():
+    """(status, priority) -> tickets, summed from the counter rows"""
+    counts = db.session.execute(
+        select(ticket_counts.c.status, ticket_counts.c.priority,
+               func.sum(ticket_counts.c.delta))
+        .group_by(ticket_counts.c.status, ticket_counts.c.priority)
+    ).all()
+    return {(status, priority): total for status, priority, total in counts
+            if total}
+
+
+def _stored_loads():
+    """mechanic id -> open tickets, summed from the counter rows"""
+    loads = db.session.execute(
+        select(mechanic_loads.c.mechanic_id, func.sum(mechanic_loads.c.delta))
+        .group_by(mechanic_loads.c.mechanic_id)
+    ).all()
+    return {mechanic_id: total for mechanic_id, total in loads if total}
+
+
+def _actual():
+    """The same counts recomputed from the tickets - a full scan"""
+    counts = db.session.execute(
+        select(current_status, current_priority, func.count())
+        .group_by(current_status, current_priority)
+    ).all()
+    loads = db.session.execute(
+        select(links.c.mechanic_id, func.count())
+        .join(tickets, tickets.c.id == links.c.service_ticket_id)
+        .where(current_status.notin_(FINAL))
+        .group_by(links.c.mechanic_id)
+    ).all()
+    return ({(status, priority): total for status, priority, total in counts},
+            {mechanic_id: total for mechanic_id, total in loads})
+
+
+def _drift(stored, actual):
+    """key -> (stored, actual) wherever they disagree"""
+    return {key: (stored.get(key, 0), actual.get(key, 0))
+            for key in set(stored) | set(actual)
+            if stored.get(key, 0) != actual.get(key, 0)}
+
+
+def ticket_stats():
+    """
+    Counts by status and priority, and open tickets per mechanic
+
+    Returns:
+        dict: by_status {status: {priority: n}}, total, and open_by_mechanic
+        [{mechanic_id, name, open_tickets}] busiest first
+    """
+    counts = _stored_counts()
+    by_status = {}
+    for (status, priority), total in sorted(counts.items()):
+        by_status.setdefault(status, {})[priority] = total
+
+    open_tickets = func.coalesce(func.sum(mechanic_loads.c.delta), 0)
+    mechanics = Mechanic.__table__
+    loads = db.session.execute(
+        select(mechanics.c.id, mechanics.c.name, open_tickets)
+        .outerjoin(mechanic_loads,
+                   mechanic_loads.c.mechanic_id == mechanics.c.id)
+        .group_by(mechanics.c.id, mechanics.c.name)
+        .order_by(open_tickets.desc(), mechanics.c.id)
+    ).all()
+
+    return {
+        'by_status': by_status,
+        'total': sum(counts.values()),
+        'open_by_mechanic': [
+            {'mechanic_id': mechanic_id, 'name': name, 'open_tickets': total}
+            for mechanic_id, name, total in loads
+        ],
+    }
+
+
+def reconcile():
+    """
+    Recompute every counter from the tickets and replace the stored rows
+
+    On Postgres this runs in one REPEATABLE READ snapshot: rows appended by
+    transactions that commit meanwhile are neither read nor deleted, and
+    neither are their ticket writes, so they still add up afterwards.
+
+    Returns:
+        dict: 'tickets' {(status, priority): (stored, actual)} and
+        'mechanics' {mechanic_id: (stored, actual)} for every count that
+        had drifted
+    """
+    if db.engine.dialect.name == 'postgresql':
+        db.session.connection(
+            execution_options={'isolation_level': 'REPEATABLE READ'}
+        )
+    stored_counts, stored_loads = _stored_counts(), _stored_loads()
+    counts, loads = _actual()
+
+    db.session.execute(ticket_counts.delete())
+    db.session.execute(mechanic_loads.delete())
+    if counts:
+        db.session.execute(insert(ticket_counts), [
+            {'status': status, 'priority': priority, 'delta': total}
+            for (status, priority), total in counts.items()
+        ])
+    if loads:
+        db.session.execute(insert(mechanic_loads), [
+            {'mechanic_id': mechanic_id, 'delta': total}
+            for mechanic_id, total in loads.items()
+        ])
+    db.session.commit()
+    return {'tickets': _drift(stored_counts, counts),
+            'mechanics': _drift(stored_loads, loads)}
+
+
+@click.command('reconcile-stats')
+@with_appcontext
+def reconcile_stats_command():
+    """Recount ticket dashboard counters and report any drift."""
+    start = time.perf_counter()
+    with db.engine.begin() as connection:
+        install_counters(connection)
+    drift = reconcile()
+    for (status, priority), (stored, actual) in \
+            sorted(drift['tickets'].items()):
+        click.echo(f'{status} / {priority}: counted {stored}, '
+                   f'actually {actual}')
+    for mechanic_id, (stored, actual) in sorted(drift['mechanics'].items()):
+        click.echo(f'Mechanic {mechanic_id}: counted {stored} open, '
+                   f'actually {actual}')
+    click.echo(f"Counters reconciled in {time.perf_counter() - start:.1f}s "
+               f"({len(drift['tickets']) + len(drift['mechanics'])} "
+               f"drifted)")
@@ -0,0 +1,268 @@
+"""
+In-process prefix index for the front desk typeahead (/search/suggest)
+Keeps customers (name/phone/email), mechanics (name/specialty) and parts
+(name) in one sorted list of (term, type, id) tuples, so a keystroke is a
+bisect into memory instead of a database query.
+
+Each worker builds its own index from the database the first time it's used
+and the create/update/delete routes keep it current. Writes made by other
+gunicorn workers show up when the index is rebuilt after SUGGEST_INDEX_TTL
+seconds - by one background thread, while keystrokes keep using the old
+index.
+"""
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+from app.batch import after_commit
+from app.models import Customer, Mechanic, Inventory
+
+WORD = re.compile(r'\w+')
+LAST_CHAR = '\U0010ffff'  # sorts after anything that can follow a prefix
+MAX_SCAN = 5000  # index entries looked at per query, at most
+PHONE = re.compile(r'[\d\s().+-]+')
+
+_first_build = threading.Lock()
+
+
+def _words(text):
+    return [word.lower() for word in WORD.findall(text or '')]
+
+
+def _digits(text):
+    return re.sub(r'\D', '', text or '')
+
+
+def customer_entry(customer):
+    """(label, detail, terms) for a customer"""
+    email = (customer.email or '').lower()
+    terms = _words(customer.name) + [email, email.split('@')[0]]
+    if _digits(customer.phone):
+        terms.append(_digits(customer.phone))
+    return customer.name, customer.email, terms
+
+
+def mechanic_entry(mechanic):
+    """(label, detail, terms) for a mechanic"""
+    terms = _words(mechanic.name) + _words(mechanic.specialty)
+    return mechanic.name, mechanic.specialty, terms
+
+
+def part_entry(item):
+    """(label, detail, terms) for an inventory item"""
+    return item.name, item.category, _words(item.name)
+
+
+class PrefixIndex:
+    """Sorted (term, type, id) list with bisect prefix lookups"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._keys = []
+        self._docs = {}
+        self._building = False
+        self._journal = None  # add/remove calls made during a rebuild
+        self.built_at = None
+
+    def __len__(self):
+        return len(self._docs)
+
+    def claim_build(self):
+        """True for the one caller that should rebuild, False if one is"""
+        with self._lock:
+            if self._building:
+                return False
+            self._building, self._journal = True, []
+            return True
+
+    def abandon_build(self):
+        """A claimed rebuild failed - let the next caller try"""
+        with self._lock:
+            self._building, self._journal = False, None
+
+    def load(self, entries):
+        """
+        Replace the whole index with (type, id, label, detail, terms)
+
+        The new lists are built without the lock, so searches carry on
+        against the old ones; add()/remove() calls made meanwhile are
+        replayed on the new lists before they're swapped in.
+        """
+        keys, docs = [], {}
+        for kind, row_id, label, detail, terms in entries:
+            terms = sorted(set(t for t in terms if t))
+            docs[(kind, row_id)] = (label, detail, terms)
+            keys.extend((term, kind, row_id) for term in terms)
+        keys.sort()
+        with self._lock:
+            journal = self._journal or []
+            self._keys, self._docs = keys, docs
+            self._building, self._journal = False, None
+            for method, args in journal:
+                method(*args)
+            self.built_at = time.monotonic()
+
+    def add(self, kind, row_id, label, detail, terms):
+        """Add or replace one entry"""
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append(
+                    (self.add, (kind, row_id, label, detail, terms)))
+            self._remove(kind, row_id)
+            terms = sorted(set(t for t in terms if t))
+            self._docs[(kind, row_id)] = (label, detail, terms)
+            for term in terms:
+                insort(self._keys, (term, kind, row_id))
+
+    def remove(self, kind, row_id):
+        """Drop one entry if it's indexed"""
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append((self.remove, (kind, row_id)))
+            self._remove(kind, row_id)
+
+    def _remove(self, kind, row_id):
+        doc = self._docs.pop((kind, row_id), None)
+        if doc is None:
+            return
+        for term in doc[2]:
+            i = bisect_left(self._keys, (term, kind, row_id))
+            if i < len(self._keys) and self._keys[i] == (term, kind, row_id):
+                del self._keys[i]
+
+    def _range(self, prefix):
+        """Slice of _keys whose term starts with prefix"""
+        return (bisect_left(self._keys, (prefix,)),
+                bisect_left(self._keys, (prefix + LAST_CHAR,)))
+
+    def search(self, q, limit=10, types=None):
+        """
+        Entries with a term starting with every word of q
+
+        The word with the fewest matching terms is walked in sorted order
+        (exact term first, then longer ones) and the other words only
+        filter; the walk stops once limit entries are found, so a one
+        letter query costs the same as a full name.
+        """
+        words = [_digits(q)] if PHONE.fullmatch(q or '') and _digits(q) \
+            else _words(q)
+        if not words:
+            return []
+
+        with self._lock:
+            keys, docs = self._keys, self._docs
+            ranges = {word: self._range(word) for word in words}
+            lead = min(words, key=lambda w: ranges[w][1] - ranges[w][0])
+            others = list(words)
+            others.remove(lead)
+
+            results, seen = [], set()
+            lo, hi = ranges[lead]
+            for term, kind, row_id in keys[lo:min(hi, lo + MAX_SCAN)]:
+                if (kind, row_id) in seen or (types and kind not in types):
+                    continue
+                label, detail, terms = docs[(kind, row_id)]
+                if any(not any(t.startswith(w) for t in terms)
+                       for w in others):
+                    continue
+                seen.add((kind, row_id))
+                results.append({'type': kind, 'id': row_id,
+                                'label': label, 'detail': detail})
+                if len(results) >= limit:
+                    break
+            return results
+
+
+def _load_entries():
+    """Read just the indexed columns - three queries for the whole index"""
+    for row in Customer.query.with_entities(
+        Customer.id, Customer.name, Customer.email, Customer.phone
+    ):
+        yield ('customer', row.id) + customer_entry(row)
+    for row in Mechanic.query.with_entities(
+        Mechanic.id, Mechanic.name, Mechanic.specialty
+    ):
+        yield ('mechanic', row.id) + mechanic_entry(row)
+    for row in Inventory.query.with_entities(
+        Inventory.id, Inventory.name, Inventory.category
+    ):
+        yield ('part', row.id) + part_entry(row)
+
+
+def _rebuild(app, index):
+    """Rebuild a claimed index in the background"""
+    with app.app_context():
+        try:
+            index.load(_load_entries())
+        except Exception:
+            index.abandon_build()
+            app.logger.exception('Typeahead index not rebuilt')
+
+
+def get_index():
+    """
+    This app's index, built from the database on first use
+
+    Once it's older than SUGGEST_INDEX_TTL, one thread rebuilds it in the
+    background and callers get the current one until the new one is in.
+    """
+    index = current_app.extensions.setdefault('suggest_index', PrefixIndex())
+    if index.built_at is None:
+        with _first_build:  # concurrent first requests wait for one build
+            if index.built_at is None:
+                index.load(_load_entries())
+        return index
+    ttl = current_app.config.get('SUGGEST_INDEX_TTL', 300)
+    if time.monotonic() - index.built_at > ttl and index.claim_build():
+        threading.Thread(target=_rebuild, daemon=True, args=(
+            current_app._get_current_object(), index)).start()
+    return index
+
+
+def warm_up(app):
+    """Build the index as a worker starts (see gunicorn.conf.py)"""
+    with app.app_context():
+        try:
+            get_index()
+        except SQLAlchemyError:
+            # Tables not created yet - the first request builds it instead
+            app.logger.warning('Typeahead index not built at startup')
+
+
+def _built_index():
+    """The index if this worker has built one yet - else nothing to update"""
+    index = current_app.extensions.get('suggest_index')
+    return index if index is not None and index.built_at else None
+
+
+def _add(kind, row_id, entry):
+    index = _built_index()
+    if index is not None:
+        index.add(kind, row_id, *entry)
+
+
+def _unindex(kind, row_id):
+    index = _built_index()
+    if index is not None:
+        index.remove(kind, row_id)
+
+
+# Entries are taken now and applied once the write commits (see
+# batch.after_commit)
+
+def index_customer(customer):
+    after_commit(_add, 'customer', customer.id, customer_entry(customer))
+
+
+def index_mechanic(mechanic):
+    after_commit(_add, 'mechanic', mechanic.id, mechanic_entry(mechanic))
+
+
+def index_part(item):
+    after_commit(_add, 'part', item.id, part_entry(item))
+
+
+def unindex(kind, row_id):
+    after_commit(_unindex, kind, row_id)
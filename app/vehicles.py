@@ -0,0 +1,262 @@
+"""
+Vehicles parsed out of the free-text ServiceTicket.vehicle_info
+Tickets used to describe the car only as text ("2019 Honda Civic VIN ..."),
+so finding every visit for one car meant scanning that text. Tickets now
+point at a Vehicle row instead; this module turns the text into one.
+
+`flask backfill-vehicles` upgrades an existing database: it adds the
+vehicles table and service_tickets.vehicle_id if they're missing, then links
+old tickets a batch at a time. It only touches tickets without a vehicle, so
+it can be stopped and run again.
+"""
+import re
+import time
+from datetime import datetime
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import bindparam, func, inspect, select
+from sqlalchemy.exc import IntegrityError
+from app import changes
+from app.extention import db
+from app.models import ServiceTicket, Vehicle
+
+# 17 characters, no I/O/Q, and at least one digit so long words don't match
+VIN = re.compile(r'\b(?=[A-Z]*\d)[A-HJ-NPR-Z0-9]{17}\b', re.IGNORECASE)
+PLATE = re.compile(r'\bplate\s*[:#]?\s*([A-Z0-9-]{2,10})\b', re.IGNORECASE)
+YEAR = re.compile(r'\b(19[5-9]\d|20\d\d)\b')
+LABEL = re.compile(r'\b(vin|plate)\b\s*[:#]?', re.IGNORECASE)
+
+
+def parse_vehicle_info(text):
+    """
+    Pull VIN, plate, year, make and model out of free text
+
+    Args:
+        text (str): a vehicle_info value, e.g. "2019 Honda Civic"
+
+    Returns:
+        dict: vin, plate, year, make, model (missing parts are None), or
+        None when there's neither a VIN nor a year and make to go on
+    """
+    if not text:
+        return None
+    info = {'vin': None, 'plate': None, 'year': None,
+            'make': None, 'model': None}
+
+    match = PLATE.search(text)
+    if match:
+        info['plate'] = match.group(1).upper()
+        text = text[:match.start()] + ' ' + text[match.end():]
+    match = VIN.search(text)
+    if match:
+        info['vin'] = match.group(0).upper()
+        text = text[:match.start()] + ' ' + text[match.end():]
+    match = YEAR.search(text)
+    if match:
+        info['year'] = int(match.group(0))
+        text = text[:match.start()] + ' ' + text[match.end():]
+
+    words = re.findall(r'[\w-]+', LABEL.sub(' ', text))
+    if words:
+        info['make'] = words[0][:50]
+        info['model'] = ' '.join(words[1:])[:100] or None
+
+    if info['vin'] is None and (info['year'] is None or
+                                info['make'] is None):
+        return None
+    return info
+
+
+def vehicle_key(info, customer_id):
+    """Identity of a parsed vehicle - the VIN, else owner + description"""
+    if info['vin']:
+        return ('vin', info['vin'])
+    return ('car', customer_id, info['year'], (info['make'] or '').lower(),
+            (info['model'] or '').lower())
+
+
+def _find_vehicle(customer_id, info):
+    if info['vin']:
+        return Vehicle.query.filter_by(vin=info['vin']).first()
+    return Vehicle.query.filter(
+        Vehicle.vin.is_(None),
+        Vehicle.customer_id == customer_id,
+        Vehicle.year == info['year'],
+        func.lower(Vehicle.make) == info['make'].lower(),
+        func.lower(func.coalesce(Vehicle.model, '')) ==
+        (info['model'] or '').lower(),
+    ).first()
+
+
+def _begin(session):
+    """
+    Make sure the database transaction has really begun - pysqlite only
+    sends BEGIN before the first write, so a SAVEPOINT before any would be
+    the outermost transaction and its RELEASE would commit
+    """
+    connection = session.connection()
+    if connection.dialect.name == 'sqlite' and \
+            not connection.connection.dbapi_connection.in_transaction:
+        connection.exec_driver_sql('BEGIN')
+
+
+def vehicle_for_ticket(customer_id, vehicle_info):
+    """
+    The Vehicle a new ticket's vehicle_info describes, added if it's new
+
+    A new VIN is inserted in a savepoint: if another request added the
+    same VIN since the lookup, the unique index rejects ours and theirs
+    is used instead of failing the ticket.
+
+    Returns:
+        Vehicle: existing or pending vehicle, or None if the text is too
+        vague to identify one
+    """
+    info = parse_vehicle_info(vehicle_info)
+    if info is None:
+        return None
+    vehicle = _find_vehicle(customer_id, info)
+    if vehicle is not None:
+        return vehicle
+    vehicle = Vehicle(customer_id=customer_id, **info)
+    if not info['vin']:
+        db.session.add(vehicle)
+        return vehicle
+    _begin(db.session)
+    try:
+        with db.session.begin_nested():
+            db.session.add(vehicle)
+    except IntegrityError:
+        vehicle = _find_vehicle(customer_id, info)
+    return vehicle
+
+
+def upgrade_schema(conn):
+    """Add the vehicles table and service_tickets.vehicle_id if missing"""
+    Vehicle.__table__.create(conn, checkfirst=True)
+    # The backfill logs the tickets it links (app/changes.py)
+    changes.change_log.create(conn, checkfirst=True)
+    columns = {c['name'] for c in inspect(conn).get_columns('service_tickets')}
+    if 'vehicle_id' not in columns:
+        conn.exec_driver_sql(
+            'ALTER TABLE service_tickets ADD COLUMN vehicle_id INTEGER '
+            'REFERENCES vehicles (id)'
+        )
+        for index in ServiceTicket.__table__.indexes:
+            if 'vehicle_id' in index.columns:
+                index.create(conn)
+
+
+def _known_vehicles(conn, keys):
+    """vehicle_key -> id for the keys that already have a vehicle row"""
+    vehicles = Vehicle.__table__
+    vins = {key[1] for key in keys if key[0] == 'vin'}
+    customers = {key[1] for key in keys if key[0] == 'car'}
+    known = {}
+    if vins:
+        for row in conn.execute(select(vehicles.c.id, vehicles.c.vin)
+                                .where(vehicles.c.vin.in_(vins))):
+            known[('vin', row.vin)] = row.id
+    if customers:
+        for row in conn.execute(
+            select(vehicles).where(vehicles.c.vin.is_(None),
+                                   vehicles.c.customer_id.in_(customers))
+        ):
+            known[vehicle_key(row._mapping, row.customer_id)] = row.id
+    return known
+
+
+def backfill_vehicles(batch_size=1000):
+    """
+    Link tickets without a vehicle to one parsed from vehicle_info
+
+    Each batch is one keyset-paginated SELECT, one lookup of the vehicles
+    it mentions, one multi-row INSERT for new vehicles and one executemany
+    UPDATE, committed on its own so a large table is never locked for long.
+
+    Args:
+        batch_size (int): tickets read and updated per transaction
+
+    Returns:
+        dict: tickets linked, vehicles created, tickets skipped
+    """
+    tickets = ServiceTicket.__table__
+    vehicles = Vehicle.__table__
+    counts = {'tickets': 0, 'vehicles': 0, 'skipped': 0}
+    known = {}
+    link = tickets.update().where(
+        tickets.c.id == bindparam('ticket_id')
+    ).values(vehicle_id=bindparam('new_vehicle_id'))
+
+    with db.engine.connect() as conn:
+        upgrade_schema(conn)
+        conn.commit()
+
+        last_id = 0
+        while True:
+            rows = conn.execute(
+                select(tickets.c.id, tickets.c.customer_id,
+                       tickets.c.vehicle_info)
+                .where(tickets.c.vehicle_id.is_(None),
+                       tickets.c.id > last_id)
+                .order_by(tickets.c.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            parsed = []
+            for row in rows:
+                info = parse_vehicle_info(row.vehicle_info)
+                if info is None:
+                    counts['skipped'] += 1
+                else:
+                    parsed.append((row, info, vehicle_key(info,
+                                                          row.customer_id)))
+            known.update(_known_vehicles(
+                conn, {key for _, _, key in parsed if key not in known}
+            ))
+
+            new = {}
+            for row, info, key in parsed:
+                if key not in known and key not in new:
+                    new[key] = dict(info, customer_id=row.customer_id,
+                                    created_at=datetime.utcnow(),
+                                    updated_at=datetime.utcnow())
+            if new:
+                ids = conn.execute(
+                    vehicles.insert().returning(
+                        vehicles.c.id, sort_by_parameter_order=True
+                    ),
+                    list(new.values())
+                ).scalars().all()
+                known.update(zip(new, ids))
+                counts['vehicles'] += len(new)
+
+            if parsed:
+                conn.execute(link, [
+                    {'ticket_id': row.id, 'new_vehicle_id': known[key]}
+                    for row, _, key in parsed
+                ])
+                changes.record('service_tickets',
+                               [row.id for row, _, _ in parsed],
+                               connection=conn)
+                counts['tickets'] += len(parsed)
+            conn.commit()
+
+    return counts
+
+
+@click.command('backfill-vehicles')
+@click.option('--batch-size', default=1000, show_default=True,
+              help='Tickets per transaction.')
+@with_appcontext
+def backfill_vehicles_command(batch_size):
+    """Create vehicles from ticket vehicle_info and link the tickets."""
+    start = time.perf_counter()
+    counts = backfill_vehicles(batch_size=batch_size)
+    elapsed = time.perf_counter() - start
+    click.echo(f"Linked {counts['tickets']} tickets to vehicles "
+               f"({counts['vehicles']} new, {counts['skipped']} skipped) "
+               f"in {elapsed:.1f}s")
@@ -0,0 +1,246 @@
+"""
+Ticket workflow - the status state machine and mechanic assignment
+Every status change is one compare-and-set UPDATE:
+
+    UPDATE service_tickets SET status = :to, version = version + 1
+    WHERE id = :id AND status IN (:allowed)
+
+so two tablets moving the same ticket can't both win and nothing has to
+load the ticket or its mechanics first. Assigning and removing mechanics
+write the link row and adjust Open / In Progress the same way, in the
+request's transaction - the caller commits or rolls back. Each one logs
+the tickets it wrote for GET /changes (app/changes.py), since Core
+statements don't go through the ORM flush that logs everything else.
+"""
+from datetime import date, datetime
+from sqlalchemy import and_, case, delete, exists, func, insert, literal, \
+    or_, select, update
+from app import changes
+from app.extention import db
+from app.models import Mechanic, ServiceTicket, mechanic_service_ticket
+
+OPEN = 'Open'
+IN_PROGRESS = 'In Progress'
+COMPLETED = 'Completed'
+CANCELLED = 'Cancelled'
+STATUSES = [OPEN, IN_PROGRESS, COMPLETED, CANCELLED]
+# Closed tickets no longer count as anyone's open work
+FINAL = [COMPLETED, CANCELLED]
+
+# Where each status can be moved next - Completed and Cancelled are final.
+# In Progress only goes back to Open when the last mechanic is taken off
+# (sync_status), never by request: claim-next would hand the ticket to
+# someone else while its mechanics are still on it.
+TRANSITIONS = {
+    OPEN: {IN_PROGRESS, CANCELLED},
+    IN_PROGRESS: {COMPLETED, CANCELLED},
+    COMPLETED: set(),
+    CANCELLED: set(),
+}
+
+# Most urgent first when mechanics pull work from the queue
+PRIORITY_RANK = {'Urgent': 4, 'High': 3, 'Medium': 2, 'Low': 1}
+
+tickets = ServiceTicket.__table__
+links = mechanic_service_ticket
+# Tickets created before status had a default count as Open
+current_status = func.coalesce(tickets.c.status, OPEN)
+
+
+def allowed_from(status):
+    """Statuses a ticket can be moved to `status` from"""
+    return sorted(s for s, targets in TRANSITIONS.items() if status in targets)
+
+
+def can_transition(current, status):
+    """True if a ticket in `current` may be set to `status`"""
+    current = current or OPEN
+    return status == current or status in TRANSITIONS.get(current, ())
+
+
+def transition(ticket_id, status):
+    """
+    Move a ticket to `status` if the state machine allows it from wherever
+    it is now - checked and written by the same UPDATE
+
+    Returns:
+        bool: False if the ticket doesn't exist or can't make this move
+    """
+    values = {'status': status, 'version': tickets.c.version + 1}
+    if status == COMPLETED:
+        values['completion_date'] = func.coalesce(
+            tickets.c.completion_date, date.today()
+        )
+    moved = db.session.execute(
+        update(tickets)
+        .where(tickets.c.id == ticket_id,
+               current_status.in_(allowed_from(status)))
+        .values(**values)
+    ).rowcount == 1
+    if moved:
+        changes.record('service_tickets', [ticket_id])
+    return moved
+
+
+def sync_status(ticket_ids):
+    """Open <-> In Progress to match whether anyone is assigned now"""
+    assigned = exists().where(links.c.service_ticket_id == tickets.c.id)
+    changes.record('service_tickets', ticket_ids)
+    return db.session.execute(
+        update(tickets)
+        .where(tickets.c.id.in_(ticket_ids))
+        .values(
+            status=case(
+                (and_(current_status == OPEN, assigned), IN_PROGRESS),
+                (and_(current_status == IN_PROGRESS, ~assigned), OPEN),
+                else_=tickets.c.status,
+            ),
+            version=tickets.c.version + 1,
+        )
+    ).rowcount
+
+
+def _touch_mechanics(mechanic_ids):
+    """Mechanics dump their ticket ids, so their ETags have to move too"""
+    if not mechanic_ids:
+        return 0
+    return db.session.execute(
+        update(Mechanic.__table__)
+        .where(Mechanic.__table__.c.id.in_(mechanic_ids))
+        .values(updated_at=datetime.utcnow())
+    ).rowcount
+
+
+def assign(ticket_id, mechanic_id):
+    """
+    Put a mechanic on a ticket; an Open ticket becomes In Progress
+
+    Three single-row statements, no reads: the ticket UPDATE and the
+    mechanic touch double as existence checks, then the link is inserted.
+
+    Returns:
+        str: None on success, else 'ticket' or 'mechanic' - whichever
+        doesn't exist
+
+    Raises:
+        IntegrityError: the mechanic is already on this ticket
+    """
+    moved = db.session.execute(
+        update(tickets)
+        .where(tickets.c.id == ticket_id)
+        .values(status=case((current_status == OPEN, IN_PROGRESS),
+                            else_=tickets.c.status),
+                version=tickets.c.version + 1)
+    ).rowcount
+    if not moved:
+        return 'ticket'
+    if not _touch_mechanics([mechanic_id]):
+        return 'mechanic'
+    db.session.execute(insert(links).values(mechanic_id=mechanic_id,
+                                            service_ticket_id=ticket_id))
+    changes.record('service_tickets', [ticket_id])
+    return None
+
+
+def unassign(ticket_id, mechanic_id):
+    """
+    Take a mechanic off a ticket; In Progress goes back to Open if nobody
+    is left on it
+
+    Returns:
+        bool: False if the mechanic wasn't on the ticket
+    """
+    removed = db.session.execute(
+        delete(links).where(links.c.service_ticket_id == ticket_id,
+                            links.c.mechanic_id == mechanic_id)
+    ).rowcount
+    if not removed:
+        return False
+    sync_status([ticket_id])
+    _touch_mechanics([mechanic_id])
+    return True
+
+
+def edit_mechanics(ticket_id, add_ids=(), remove_ids=()):
+    """
+    Add and remove several mechanics with set-based statements
+
+    Ids of mechanics that don't exist, aren't assigned (for remove) or are
+    already assigned (for add) are skipped. The ticket must exist.
+    """
+    if remove_ids:
+        db.session.execute(
+            delete(links).where(links.c.service_ticket_id == ticket_id,
+                                links.c.mechanic_id.in_(remove_ids))
+        )
+    if add_ids:
+        mechanics = Mechanic.__table__
+        already = exists().where(links.c.service_ticket_id == ticket_id,
+                                 links.c.mechanic_id == mechanics.c.id)
+        db.session.execute(
+            insert(links).from_select(
+                ['mechanic_id', 'service_ticket_id'],
+                select(mechanics.c.id, literal(ticket_id))
+                .where(mechanics.c.id.in_(add_ids), ~already)
+            )
+        )
+    sync_status([ticket_id])
+    _touch_mechanics(set(add_ids) | set(remove_ids))
+
+
+def _queue(specialty):
+    """
+    Next open ticket for a specialty: most urgent, then oldest
+
+    The CASE rank isn't a column, so ix_service_tickets_queue can't hand
+    the rows over in this order - every claim sorts the open tickets for
+    the specialty. That's cheap while the open queue is small.
+    """
+    rank = case(PRIORITY_RANK, value=tickets.c.priority, else_=2)
+    return (
+        select(tickets.c.id)
+        .where(current_status == OPEN,
+               or_(tickets.c.specialty == specialty,
+                   tickets.c.specialty.is_(None)))
+        .order_by(rank.desc(), tickets.c.created_at, tickets.c.id)
+        .limit(1)
+    )
+
+
+def claim_next(mechanic_id, specialty):
+    """
+    Take the next open ticket off the queue and assign it to a mechanic
+
+    Postgres: SELECT ... FOR UPDATE SKIP LOCKED, so concurrent claimers
+    each lock a different ticket instead of queueing behind the same one.
+    SQLite only ever has one writer, so one UPDATE that picks its own row
+    (WHERE id = (SELECT ...)) is already atomic.
+
+    Either way nobody has to retry, and an empty queue returns None.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        ticket_id = db.session.execute(
+            _queue(specialty).with_for_update(skip_locked=True)
+        ).scalar()
+        if ticket_id is None:
+            return None
+        db.session.execute(
+            update(tickets).where(tickets.c.id == ticket_id)
+            .values(status=IN_PROGRESS, version=tickets.c.version + 1)
+        )
+    else:
+        ticket_id = db.session.execute(
+            update(tickets)
+            .where(tickets.c.id == _queue(specialty).scalar_subquery(),
+                   current_status == OPEN)
+            .values(status=IN_PROGRESS, version=tickets.c.version + 1)
+            .returning(tickets.c.id)
+        ).scalar()
+        if ticket_id is None:
+            return None
+
+    db.session.execute(insert(links).values(mechanic_id=mechanic_id,
+                                            service_ticket_id=ticket_id))
+    _touch_mechanics([mechanic_id])
+    changes.record('service_tickets', [ticket_id])
+    return ticket_id
@@ -0,0 +1,4 @@
+"""
+HTTP benchmark suite for the Mechanic Shop API
+Seeds a large dataset and drives every blueprint route, see benchmarks/run.py
+"""
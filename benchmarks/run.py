@@ -0,0 +1,380 @@
+"""
+Benchmark runner for the Mechanic Shop API
+
+Seed a dataset and run every scenario through the Flask test client:
+    python -m benchmarks.run run --customers 100000 --tickets 1000000 \\
+        --parts 50000 --out results/base.json
+
+Run the same scenarios against a real gunicorn server:
+    python -m benchmarks.run run --reuse --gunicorn --workers 4 \\
+        --out results/gunicorn.json
+
+Compare two result files and exit 1 when something got slower:
+    python -m benchmarks.run compare results/base.json results/new.json
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+
+class InProcessClient:
+    """Sends requests through app.test_client() and counts SQL statements"""
+
+    mode = 'in-process'
+
+    def __init__(self, app):
+        from sqlalchemy import event
+        from app.extention import db
+
+        self.client = app.test_client()
+        self.queries = 0
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self.queries += 1
+
+    def request(self, method, path, json=None, headers=None):
+        response = self.client.open(path, method=method, json=json,
+                                    headers=headers or {})
+        return response.status_code, response.get_json(silent=True)
+
+
+class HttpClient:
+    """Sends requests to a running server over HTTP"""
+
+    mode = 'server'
+    queries = None
+
+    def __init__(self, base_url):
+        import requests
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+
+    def request(self, method, path, json=None, headers=None):
+        response = self.session.request(method, self.base_url + path,
+                                        json=json, headers=headers or {})
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+        return response.status_code, body
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(int(round(pct / 100.0 * len(ordered))) - 1, 0)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+def summarize(scenario, latencies, queries, statuses, wall_time):
+    """Turn raw timings for one scenario into the reported numbers"""
+    count = len(latencies)
+    return {
+        'method': scenario.method,
+        'route': scenario.route,
+        'requests': count,
+        'p50_ms': _ms(percentile(latencies, 50)),
+        'p95_ms': _ms(percentile(latencies, 95)),
+        'p99_ms': _ms(percentile(latencies, 99)),
+        'mean_ms': _ms(sum(latencies) / count) if count else None,
+        'throughput_rps': round(count / wall_time, 2) if wall_time else None,
+        'queries_per_request': (
+            round(sum(queries) / len(queries), 2) if queries else None
+        ),
+        'status_codes': dict(sorted(Counter(statuses).items())),
+    }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+def _timed_call(client, scenario, spec):
+    before = client.queries
+    start = time.perf_counter()
+    status, body = client.request(scenario.method, spec['path'],
+                                  json=spec.get('json'),
+                                  headers=spec.get('headers'))
+    elapsed = time.perf_counter() - start
+    queries = None if before is None else client.queries - before
+    return status, body, elapsed, queries
+
+
+def run_scenario(client, scenario, ctx, iterations, warmup=0,
+                 concurrency=1):
+    """
+    Run one scenario and return its summary
+
+    Requests are built up front so building them isn't timed. With
+    concurrency > 1 (server mode only) they're spread over threads and
+    queries per request isn't reported.
+    """
+    specs = []
+    for _ in range(warmup + iterations):
+        spec = scenario.build(ctx)
+        if spec is None:
+            break
+        specs.append(spec)
+
+    for spec in specs[:warmup]:
+        status, body, _, _ = _timed_call(client, scenario, spec)
+        if scenario.record and status < 300:
+            scenario.record(ctx, body)
+    specs = specs[warmup:]
+
+    latencies, queries, statuses = [], [], []
+    start = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(
+                lambda spec: _timed_call(client, scenario, spec), specs
+            ))
+    else:
+        results = [_timed_call(client, scenario, spec) for spec in specs]
+    wall_time = time.perf_counter() - start
+
+    for status, body, elapsed, query_count in results:
+        latencies.append(elapsed)
+        statuses.append(status)
+        if query_count is not None and concurrency == 1:
+            queries.append(query_count)
+        if scenario.record and status < 300:
+            scenario.record(ctx, body)
+    return summarize(scenario, latencies, queries, statuses, wall_time)
+
+
+def run_benchmark(client, counts, iterations=200, warmup=10, concurrency=1,
+                  only=None, seed=42):
+    """
+    Run every scenario (or the ones named in only) against a client
+
+    Returns:
+        dict: {'meta': {...}, 'routes': {scenario name: summary}}
+    """
+    from benchmarks.scenarios import SCENARIOS, BenchContext
+
+    ctx = BenchContext(counts, random.Random(seed))
+    routes = {}
+    for scenario in SCENARIOS:
+        if only and scenario.name not in only:
+            continue
+        routes[scenario.name] = run_scenario(
+            client, scenario, ctx, iterations, warmup, concurrency
+        )
+    return {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat(),
+            'mode': client.mode,
+            'iterations': iterations,
+            'warmup': warmup,
+            'concurrency': concurrency,
+            'seed': seed,
+            'dataset': counts,
+        },
+        'routes': routes,
+    }
+
+
+def compare_results(base, new, threshold=0.10):
+    """
+    Find routes that got slower between two result files
+
+    A route regresses when p95 latency grows by more than threshold,
+    throughput drops by more than threshold, or it runs more queries.
+
+    Returns:
+        list: one dict per regressed route with the reasons
+    """
+    regressions = []
+    for name, old in base['routes'].items():
+        current = new['routes'].get(name)
+        if current is None:
+            continue
+        reasons = []
+        if old['p95_ms'] and current['p95_ms'] and (
+            current['p95_ms'] > old['p95_ms'] * (1 + threshold)
+        ):
+            reasons.append(
+                f"p95 {old['p95_ms']}ms -> {current['p95_ms']}ms"
+            )
+        if old['throughput_rps'] and current['throughput_rps'] and (
+            current['throughput_rps'] < old['throughput_rps'] * (1 - threshold)
+        ):
+            reasons.append(f"throughput {old['throughput_rps']} -> "
+                           f"{current['throughput_rps']} req/s")
+        if old['queries_per_request'] is not None and (
+            current['queries_per_request'] is not None
+        ) and current['queries_per_request'] > old['queries_per_request']:
+            reasons.append(f"queries {old['queries_per_request']} -> "
+                           f"{current['queries_per_request']}")
+        if reasons:
+            regressions.append({'route': name, 'reasons': reasons})
+    return regressions
+
+
+def _prepare_database(args):
+    """Build the benchmark app and seed it unless --reuse is given"""
+    from app import create_app
+    from app.extention import db
+    from app.models import Customer, Mechanic, ServiceTicket, Inventory
+    from app.seed import seed_dataset
+    from app.reports import refresh as refresh_reports
+
+    app = create_app('benchmark')
+    with app.app_context():
+        if args.reuse and Customer.query.first() is not None:
+            counts = {
+                'customers': Customer.query.count(),
+                'mechanics': Mechanic.query.count(),
+                'inventory': Inventory.query.count(),
+                'service_tickets': ServiceTicket.query.count(),
+            }
+        else:
+            db.drop_all()
+            db.create_all()
+            start = time.perf_counter()
+            counts = seed_dataset(
+                customers=args.customers, mechanics=args.mechanics,
+                parts=args.parts, tickets=args.tickets,
+                mechanics_per_ticket=args.mechanics_per_ticket,
+                parts_per_ticket=args.parts_per_ticket, seed=args.seed,
+                workers=args.seed_workers,
+            )
+            print(f'Seeded {counts} in {time.perf_counter() - start:.1f}s',
+                  file=sys.stderr)
+            # The /reports scenarios read rollups, not tickets
+            refresh_reports(rebuild=True)
+    return app, counts
+
+
+def _start_gunicorn(args):
+    """Start gunicorn on the benchmark database and wait for /health"""
+    import requests
+
+    env = dict(os.environ, FLASK_ENV='benchmark')
+    env.pop('DATABASE_URL', None)  # flask_app.py would switch to production
+    server = subprocess.Popen(
+        ['gunicorn', '--bind', f'127.0.0.1:{args.port}',
+         '--workers', str(args.workers), 'flask_app:app'],
+        env=env,
+    )
+    url = f'http://127.0.0.1:{args.port}'
+    for _ in range(50):
+        try:
+            if requests.get(url + '/health', timeout=1).status_code == 200:
+                return server, url
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError('gunicorn did not start')
+
+
+def _write(results, path):
+    text = json.dumps(results, indent=2)
+    if path:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(text)
+    print(text)
+
+
+def cmd_run(args):
+    os.environ['BENCH_DATABASE_URL'] = args.database_url
+    app, counts = _prepare_database(args)
+
+    server = None
+    if args.gunicorn:
+        server, url = _start_gunicorn(args)
+        client = HttpClient(url)
+    elif args.server:
+        client = HttpClient(args.server)
+    else:
+        client = InProcessClient(app)
+
+    try:
+        results = run_benchmark(
+            client, counts, iterations=args.iterations, warmup=args.warmup,
+            concurrency=args.concurrency if client.mode == 'server' else 1,
+            only=args.only, seed=args.seed,
+        )
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    _write(results, args.out)
+    return 0
+
+
+def cmd_compare(args):
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    regressions = compare_results(base, new, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression['route']}: "
+              + '; '.join(regression['reasons']))
+    if not regressions:
+        print('No regressions')
+    return 1 if regressions else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='seed and benchmark every route')
+    run.add_argument('--database-url', default='sqlite:///benchmark.db')
+    run.add_argument('--customers', type=int, default=1000)
+    run.add_argument('--mechanics', type=int, default=50)
+    run.add_argument('--parts', type=int, default=500)
+    run.add_argument('--tickets', type=int, default=10000)
+    run.add_argument('--mechanics-per-ticket', type=int, default=2)
+    run.add_argument('--parts-per-ticket', type=int, default=3)
+    run.add_argument('--seed', type=int, default=42)
+    run.add_argument('--seed-workers', type=int, default=os.cpu_count() or 1,
+                     help='processes generating seed rows')
+    run.add_argument('--reuse', action='store_true',
+                     help='keep an already seeded database')
+    run.add_argument('--iterations', type=int, default=200)
+    run.add_argument('--warmup', type=int, default=10)
+    run.add_argument('--only', nargs='*',
+                     help='scenario names, e.g. service_tickets.list')
+    run.add_argument('--server', help='benchmark a running server URL')
+    run.add_argument('--gunicorn', action='store_true',
+                     help='start gunicorn for the run')
+    run.add_argument('--workers', type=int, default=2)
+    run.add_argument('--port', type=int, default=8765)
+    run.add_argument('--concurrency', type=int, default=1,
+                     help='client threads (server mode only)')
+    run.add_argument('--out', help='write the JSON results here')
+    run.set_defaults(func=cmd_run)
+
+    compare = commands.add_parser('compare', help='diff two result files')
+    compare.add_argument('base')
+    compare.add_argument('new')
+    compare.add_argument('--threshold', type=float, default=0.10,
+                         help='allowed slowdown, 0.10 = 10%%')
+    compare.set_defaults(func=cmd_compare)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,299 @@
+"""
+Benchmark scenarios - one per blueprint route
+Each scenario builds a request against the seeded dataset. Create scenarios
+remember the ids they made so the delete scenarios have something to delete.
+"""
+import itertools
+from collections import namedtuple
+from app.auth import encode_token, encode_mechanic_token
+from app.seed import SEED_PASSWORD, SPECIALTIES, JOBS, MAKES
+
+# build(ctx) returns dict(path=..., json=..., headers=...) or None to stop
+# record(ctx, body) is called with the JSON body of successful responses
+Scenario = namedtuple('Scenario', 'name method route build record')
+Scenario.__new__.__defaults__ = (None,)
+
+
+class BenchContext:
+    """Dataset sizes plus ids created while the benchmark runs"""
+
+    def __init__(self, counts, rng):
+        self.counts = counts
+        self.rng = rng
+        self.serial = itertools.count(1)
+        self.created = {
+            'customers': [], 'mechanics': [],
+            'service_tickets': [], 'inventory': [],
+        }
+
+    def pick(self, table):
+        """Random id of a seeded row"""
+        return self.rng.randint(1, self.counts[table])
+
+    def customer_headers(self, customer_id):
+        return {'Authorization': f'Bearer {encode_token(customer_id)}'}
+
+    def mechanic_headers(self, mechanic_id):
+        token = encode_mechanic_token(mechanic_id)
+        return {'Authorization': f'Bearer {token}'}
+
+    def pop_created(self, table):
+        """Id made by a create scenario, or None when they're used up"""
+        created = self.created[table]
+        return created.pop() if created else None
+
+
+def _remember(table):
+    def record(ctx, body):
+        if isinstance(body, dict) and 'id' in body:
+            ctx.created[table].append(body['id'])
+    return record
+
+
+def _delete_created(table, prefix, auth=None):
+    def build(ctx):
+        row_id = ctx.pop_created(table)
+        if row_id is None:
+            return None
+        headers = auth(ctx, row_id) if auth else {}
+        return {'path': f'{prefix}/{row_id}', 'headers': headers}
+    return build
+
+
+def _new_customer(ctx):
+    n = next(ctx.serial)
+    return {'path': '/customers/', 'json': {
+        'name': f'Bench Customer {n}',
+        'email': f'new-customer{n}@seed.local',
+        'phone': '555-555-0000',
+        'password': SEED_PASSWORD,
+    }}
+
+
+def _new_mechanic(ctx):
+    n = next(ctx.serial)
+    return {'path': '/mechanics/', 'json': {
+        'name': f'Bench Mechanic {n}',
+        'email': f'new-mechanic{n}@seed.local',
+        'phone': '555-555-0000',
+        'specialty': ctx.rng.choice(SPECIALTIES),
+        'hourly_rate': 65,
+        'password': SEED_PASSWORD,
+    }}
+
+
+def _new_ticket(ctx):
+    return {'path': '/service-tickets/', 'json': {
+        'title': 'Bench brake job',
+        'description': 'Created by the benchmark',
+        'customer_id': ctx.pick('customers'),
+        'vehicle_info': '2019 Bench Car',
+        'estimated_cost': 250,
+        'priority': 'Medium',
+    }}
+
+
+def _dispatched_ticket(ctx):
+    request = _new_ticket(ctx)
+    request['path'] += '?dispatch=least-loaded'
+    return request
+
+
+def _new_part(ctx):
+    n = next(ctx.serial)
+    return {
+        'path': '/inventory/',
+        'json': {'name': f'Bench Part {n}', 'price': 12.5, 'quantity': 10},
+        'headers': ctx.mechanic_headers(ctx.pick('mechanics')),
+    }
+
+
+def _my_tickets(ctx):
+    customer_id = ctx.pick('customers')
+    return {'path': '/customers/my-tickets',
+            'headers': ctx.customer_headers(customer_id)}
+
+
+def _claim_next(ctx):
+    return {'path': '/mechanics/me/claim-next',
+            'headers': ctx.mechanic_headers(ctx.pick('mechanics'))}
+
+
+def _report(name):
+    def build(ctx):
+        return {'path': f'/reports/{name}',
+                'headers': ctx.mechanic_headers(ctx.pick('mechanics'))}
+    return build
+
+
+def _update_customer(ctx):
+    customer_id = ctx.pick('customers')
+    return {'path': f'/customers/{customer_id}',
+            'json': {'address': f'{next(ctx.serial)} Updated Ave'},
+            'headers': ctx.customer_headers(customer_id)}
+
+
+def _update_mechanic(ctx):
+    mechanic_id = ctx.pick('mechanics')
+    return {'path': f'/mechanics/{mechanic_id}',
+            'json': {'hourly_rate': ctx.rng.randint(40, 120)},
+            'headers': ctx.mechanic_headers(mechanic_id)}
+
+
+def _update_part(ctx):
+    return {'path': f"/inventory/{ctx.pick('inventory')}",
+            'json': {'quantity': ctx.rng.randint(0, 200)},
+            'headers': ctx.mechanic_headers(ctx.pick('mechanics'))}
+
+
+def _ticket_mechanic(action):
+    def build(ctx):
+        return {'path': f"/service-tickets/{ctx.pick('service_tickets')}"
+                        f"/{action}/{ctx.pick('mechanics')}"}
+    return build
+
+
+def _edit_ticket(ctx):
+    return {'path': f"/service-tickets/{ctx.pick('service_tickets')}/edit",
+            'json': {'add_ids': [ctx.pick('mechanics')],
+                     'remove_ids': [ctx.pick('mechanics')]}}
+
+
+def _add_part(ctx):
+    return {'path': f"/service-tickets/{ctx.pick('service_tickets')}"
+                    f"/add-part/{ctx.pick('inventory')}",
+            'json': {'quantity': ctx.rng.randint(1, 4)}}
+
+
+def _page(prefix, table, per_page):
+    def build(ctx):
+        pages = max(ctx.counts[table] // per_page, 1)
+        page = ctx.rng.randint(1, pages)
+        return {'path': f'{prefix}/?page={page}&per_page={per_page}'}
+    return build
+
+
+def _search(ctx):
+    # A word from a job title, sometimes narrowed down by the car make
+    words = [ctx.rng.choice(JOBS).split()[0]]
+    if ctx.rng.random() < 0.5:
+        words.append(ctx.rng.choice(MAKES).split()[0])
+    return {'path': '/service-tickets/search?q=' + '+'.join(words)}
+
+
+def _detail(prefix, table):
+    def build(ctx):
+        return {'path': f'{prefix}/{ctx.pick(table)}'}
+    return build
+
+
+def _login(prefix, table, label):
+    def build(ctx):
+        return {'path': f'{prefix}/login', 'json': {
+            'email': f'{label}{ctx.pick(table)}@seed.local',
+            'password': SEED_PASSWORD,
+        }}
+    return build
+
+
+def _customer_auth(ctx, customer_id):
+    return ctx.customer_headers(customer_id)
+
+
+def _mechanic_auth(ctx, mechanic_id):
+    return ctx.mechanic_headers(mechanic_id)
+
+
+def _any_mechanic_auth(ctx, inventory_id):
+    return ctx.mechanic_headers(ctx.pick('mechanics'))
+
+
+# Read scenarios first, then writes, then deletes of the rows we created
+SCENARIOS = [
+    # customer blueprint
+    Scenario('customers.list', 'GET', '/customers/',
+             _page('/customers', 'customers', 20)),
+    Scenario('customers.detail', 'GET', '/customers/<id>',
+             _detail('/customers', 'customers')),
+    Scenario('customers.my_tickets', 'GET', '/customers/my-tickets',
+             _my_tickets),
+    Scenario('customers.login', 'POST', '/customers/login',
+             _login('/customers', 'customers', 'customer')),
+    Scenario('customers.create', 'POST', '/customers/', _new_customer,
+             _remember('customers')),
+    Scenario('customers.update', 'PUT', '/customers/<id>', _update_customer),
+    # mechanic blueprint
+    Scenario('mechanics.list', 'GET', '/mechanics/',
+             _page('/mechanics', 'mechanics', 20)),
+    Scenario('mechanics.detail', 'GET', '/mechanics/<id>',
+             _detail('/mechanics', 'mechanics')),
+    Scenario('mechanics.by_tickets', 'GET', '/mechanics/by-tickets',
+             lambda ctx: {'path': '/mechanics/by-tickets'}),
+    Scenario('mechanics.login', 'POST', '/mechanics/login',
+             _login('/mechanics', 'mechanics', 'mechanic')),
+    Scenario('mechanics.create', 'POST', '/mechanics/', _new_mechanic,
+             _remember('mechanics')),
+    Scenario('mechanics.update', 'PUT', '/mechanics/<id>', _update_mechanic),
+    Scenario('mechanics.claim_next', 'POST', '/mechanics/me/claim-next',
+             _claim_next),
+    # service ticket blueprint
+    Scenario('service_tickets.list', 'GET', '/service-tickets/',
+             _page('/service-tickets', 'service_tickets', 20)),
+    Scenario('service_tickets.detail', 'GET', '/service-tickets/<id>',
+             _detail('/service-tickets', 'service_tickets')),
+    Scenario('service_tickets.search', 'GET', '/service-tickets/search',
+             _search),
+    Scenario('service_tickets.stats', 'GET', '/service-tickets/stats',
+             lambda ctx: {'path': '/service-tickets/stats'}),
+    Scenario('service_tickets.create', 'POST', '/service-tickets/',
+             _new_ticket, _remember('service_tickets')),
+    Scenario('service_tickets.dispatch', 'POST',
+             '/service-tickets/?dispatch=least-loaded', _dispatched_ticket,
+             _remember('service_tickets')),
+    Scenario('service_tickets.update', 'PUT', '/service-tickets/<id>',
+             lambda ctx: {
+                 'path': f"/service-tickets/{ctx.pick('service_tickets')}",
+                 'json': {'priority': ctx.rng.choice(['Low', 'High'])}}),
+    Scenario('service_tickets.assign_mechanic', 'PUT',
+             '/service-tickets/<id>/assign-mechanic/<id>',
+             _ticket_mechanic('assign-mechanic')),
+    Scenario('service_tickets.remove_mechanic', 'PUT',
+             '/service-tickets/<id>/remove-mechanic/<id>',
+             _ticket_mechanic('remove-mechanic')),
+    Scenario('service_tickets.edit', 'PUT', '/service-tickets/<id>/edit',
+             _edit_ticket),
+    Scenario('service_tickets.add_part', 'PUT',
+             '/service-tickets/<id>/add-part/<id>', _add_part),
+    Scenario('service_tickets.transition', 'POST',
+             '/service-tickets/<id>/transition',
+             lambda ctx: {
+                 'path': f"/service-tickets/{ctx.pick('service_tickets')}"
+                         '/transition',
+                 'json': {'status': ctx.rng.choice(['In Progress',
+                                                    'Completed'])}}),
+    # inventory blueprint
+    Scenario('inventory.list', 'GET', '/inventory/',
+             lambda ctx: {'path': '/inventory/'}),
+    Scenario('inventory.detail', 'GET', '/inventory/<id>',
+             _detail('/inventory', 'inventory')),
+    # reports blueprint
+    Scenario('reports.mechanic_revenue', 'GET', '/reports/mechanic-revenue',
+             _report('mechanic-revenue')),
+    Scenario('reports.parts_spend', 'GET', '/reports/parts-spend',
+             _report('parts-spend')),
+    Scenario('reports.ticket_cost', 'GET', '/reports/ticket-cost',
+             _report('ticket-cost')),
+    Scenario('inventory.create', 'POST', '/inventory/', _new_part,
+             _remember('inventory')),
+    Scenario('inventory.update', 'PUT', '/inventory/<id>', _update_part),
+    # deletes only touch rows the create scenarios made
+    Scenario('customers.delete', 'DELETE', '/customers/<id>',
+             _delete_created('customers', '/customers', _customer_auth)),
+    Scenario('mechanics.delete', 'DELETE', '/mechanics/<id>',
+             _delete_created('mechanics', '/mechanics', _mechanic_auth)),
+    Scenario('service_tickets.delete', 'DELETE', '/service-tickets/<id>',
+             _delete_created('service_tickets', '/service-tickets')),
+    Scenario('inventory.delete', 'DELETE', '/inventory/<id>',
+             _delete_created('inventory', '/inventory',
+                             _any_mechanic_auth)),
+]
@@ -25,8 +25,65 @@ class Config:
     RATELIMIT_DEFAULT = "200 per day, 50 per hour"  # Default rate limits
 
     # Flask-Caching Configuration (assignment requirement)
-    CACHE_TYPE = "SimpleCache"  # Simple in-memory cache for development
+    # Redis when there is one, so gunicorn workers share entries and the
+    # refresh locks in app/caching.py; SimpleCache is per process
+    CACHE_TYPE = (
+        "RedisCache" if os.environ.get('REDIS_URL')
+        else "SimpleCache"  # Simple in-memory cache for development
+    )
+    CACHE_REDIS_URL = os.environ.get('REDIS_URL')
     CACHE_DEFAULT_TIMEOUT = 300  # 5 minutes
+    # Cached routes (app/caching.py): an expired entry is served for this
+    # long while one request refreshes it; waiters on a cold key give up
+    # after CACHE_WAIT_SECONDS, and a refresh lock lasts CACHE_LOCK_SECONDS
+    CACHE_STALE_SECONDS = 60
+    CACHE_WAIT_SECONDS = 5
+    CACHE_POLL_INTERVAL = 0.05
+    CACHE_LOCK_SECONDS = 30
+
+    # Raise on lazy relationship loads in the list/detail routes instead of
+    # silently running one query per row (see app/loaders.py)
+    RAISE_ON_LAZY_LOAD = os.environ.get('RAISE_ON_LAZY_LOAD') == '1'
+
+    # Typeahead index (app/suggest.py) - rebuilt from the database this
+    # often so writes handled by other workers show up
+    SUGGEST_INDEX_TTL = 300
+    # Open-ticket counts behind ?dispatch= (app/dispatch.py) - reloaded
+    # this often to pick up assignments made by other workers
+    DISPATCH_LOAD_TTL = 60
+
+    # Live ticket events (app/events.py): how often each worker reads new
+    # ticket_events rows, and how long one SSE response stays open before
+    # the display reconnects with Last-Event-ID
+    EVENT_POLL_INTERVAL = 0.5
+    EVENT_HEARTBEAT_SECONDS = 15
+    EVENT_STREAM_SECONDS = 300
+
+    # Labor hours charged on a ticket nobody has logged time against yet
+    # (mechanics clock time with POST /mechanics/me/time-entries)
+    DEFAULT_LABOR_HOURS = 2
+
+    # Response compression (app/compression.py): gzip, or brotli when it's
+    # installed, for these types once a body reaches COMPRESS_MIN_SIZE
+    COMPRESS_MIN_SIZE = 500
+    COMPRESS_LEVEL = 6
+    COMPRESS_BROTLI_QUALITY = 5
+    COMPRESS_MIMETYPES = [
+        'application/json', 'application/yaml', 'application/x-ndjson',
+        'text/csv', 'text/html', 'text/plain', 'text/css',
+        'application/javascript',
+    ]
+
+    # Most sub-requests one POST /batch may carry
+    BATCH_MAX_REQUESTS = 20
+
+    # Idempotency-Key (app/idempotency.py): how long a first response is
+    # kept for replay, how long a duplicate waits for the first request to
+    # finish, and when an unfinished first request counts as abandoned
+    IDEMPOTENCY_TTL = 24 * 60 * 60
+    IDEMPOTENCY_WAIT_SECONDS = 10
+    IDEMPOTENCY_POLL_INTERVAL = 0.1
+    IDEMPOTENCY_LOCK_SECONDS = 60
 
 
 class DevelopmentConfig(Config):
@@ -36,6 +93,7 @@ class DevelopmentConfig(Config):
         os.environ.get('DEV_DATABASE_URL') or
         'sqlite:///mechanic_shop.db'  # Use SQLite for development
     )
+    RAISE_ON_LAZY_LOAD = True  # Catch N+1 queries while developing
 
 
 class ProductionConfig(Config):
@@ -56,6 +114,18 @@ class TestingConfig(Config):
     # In-memory database for tests
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
+    RAISE_ON_LAZY_LOAD = True
+    EVENT_STREAM_SECONDS = 0  # send the backlog and close
+    CACHE_TYPE = "SimpleCache"  # even where REDIS_URL is set
+
+
+class BenchmarkConfig(Config):
+    """Benchmark environment configuration (see benchmarks/run.py)"""
+    SQLALCHEMY_DATABASE_URI = (
+        os.environ.get('BENCH_DATABASE_URL') or 'sqlite:///benchmark.db'
+    )
+    # The default limits would throttle the benchmark after 50 requests
+    RATELIMIT_ENABLED = False
 
 
 # Configuration mapping
@@ -63,5 +133,6 @@ config = {
     'development': DevelopmentConfig,
     'production': ProductionConfig,
     'testing': TestingConfig,
+    'benchmark': BenchmarkConfig,
     'default': DevelopmentConfig
 }
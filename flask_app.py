@@ -1,7 +1,17 @@
 ﻿import os
 from app import create_app
 from app.extention import db
-from app.models import Customer, Mechanic, ServiceTicket, Inventory
+from app.models import (
+    Customer, Mechanic, ServiceTicket, Inventory, Vehicle, TicketEvent
+)
+from app.seed import seed_command
+from app.fulltext import search_index_command
+from app.vehicles import backfill_vehicles_command
+from app.changes import compact_changes_command, backfill_changes_command
+from app.stats import reconcile_stats_command
+from app.reports import refresh_reports_command
+from app.costing import cost_tickets_command
+from app.snapshot import snapshot_analytics_command
 from flask import jsonify
 from datetime import datetime
 
@@ -26,6 +36,25 @@ app = create_app(config_name)
 # Expose app for Gunicorn
 application = app
 
+# `flask seed` bulk loads generated data for capacity testing
+app.cli.add_command(seed_command)
+# `flask search-index` adds ticket full-text search to an existing database
+app.cli.add_command(search_index_command)
+# `flask backfill-vehicles` links old tickets to vehicles parsed from text
+app.cli.add_command(backfill_vehicles_command)
+# `flask compact-changes` (retention) and `flask backfill-changes` for the
+# GET /changes sync feed
+app.cli.add_command(compact_changes_command)
+app.cli.add_command(backfill_changes_command)
+# `flask reconcile-stats` recounts the /service-tickets/stats counters
+app.cli.add_command(reconcile_stats_command)
+# `flask refresh-reports` folds completed tickets into the /reports rollups
+app.cli.add_command(refresh_reports_command)
+# `flask cost-tickets` writes a month-end invoice run as CSV
+app.cli.add_command(cost_tickets_command)
+# `flask snapshot-analytics` copies changed rows to a SQLite snapshot
+app.cli.add_command(snapshot_analytics_command)
+
 
 @app.shell_context_processor
 def make_shell_context():
@@ -39,6 +68,8 @@ def make_shell_context():
         "Mechanic": Mechanic,
         "ServiceTicket": ServiceTicket,
         "Inventory": Inventory,  # Added inventory model
+        "Vehicle": Vehicle,
+        "TicketEvent": TicketEvent,
     }
 
 
@@ -54,6 +85,12 @@ def index():
             "mechanics": "/mechanics",
             "service_tickets": "/service-tickets",
             "inventory": "/inventory",  # Added after implementing inventory
+            "search": "/search/suggest",
+            "vehicles": "/vehicles",
+            "changes": "/changes",
+            "reports": "/reports",
+            "exports": "/exports",
+            "batch": "/batch",
         },
     }
 
@@ -89,6 +126,8 @@ def api_info():
                     "mechanics": "/mechanics",
                     "service_tickets": "/service-tickets",
                     "inventory": "/inventory",
+                    "search": "/search/suggest",
+                    "vehicles": "/vehicles",
                     "health": "/health",
                     "info": "/info",
                 },
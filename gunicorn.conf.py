@@ -0,0 +1,17 @@
+"""
+Gunicorn settings hooks
+Gunicorn loads ./gunicorn.conf.py automatically, so the Procfile and
+render.yaml start commands pick this up without changes
+"""
+
+# Threaded workers: an open /service-tickets/events stream holds one
+# thread, not a whole sync worker (which --timeout would also kill)
+worker_class = 'gthread'
+threads = 16
+
+
+def post_worker_init(worker):
+    """Build per-worker in-memory indexes before the worker takes traffic"""
+    from app import dispatch, suggest
+    suggest.warm_up(worker.wsgi)
+    dispatch.warm_up(worker.wsgi)
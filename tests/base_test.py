@@ -4,13 +4,56 @@ Base test configuration and utilities
 import unittest
 import os
 import sys
+from contextlib import ContextDecorator
 
 # Add the parent directory to Python path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app import create_app
+from sqlalchemy import event
 from app.extention import db
-from app.models import Customer, Mechanic, ServiceTicket, Inventory
+from app.models import (
+    Customer, Mechanic, ServiceTicket, Inventory, ServiceTicketPart
+)
+
+
+class QueryBudget(ContextDecorator):
+    """
+    Count the SQL statements run inside a block and fail over budget
+
+    Works as a context manager around a test client call or as a decorator
+    on a test method:
+
+        with QueryBudget(4):
+            self.client.get('/service-tickets/')
+    """
+
+    def __init__(self, max_queries):
+        self.max_queries = max_queries
+        self.statements = []
+
+    def _record(self, conn, cursor, statement, parameters, context,
+                executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        self.statements = []
+        self.engine = db.engine
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        event.remove(self.engine, 'before_cursor_execute', self._record)
+        if exc_type is None and len(self.statements) > self.max_queries:
+            raise AssertionError(
+                f'{len(self.statements)} queries run, budget was '
+                f'{self.max_queries}:\n' + '\n'.join(self.statements)
+            )
+        return False
+
+    @property
+    def count(self):
+        return len(self.statements)
 
 
 class BaseTestCase(unittest.TestCase):
@@ -71,6 +114,55 @@ class BaseTestCase(unittest.TestCase):
         self.customer_id = self.test_customer.id
         self.mechanic_id = self.test_mechanic.id
 
+    def create_bulk_data(self, count=5):
+        """
+        Seed several linked customers, mechanics, parts and tickets
+        Used by the query budget tests so N+1 patterns actually show up
+        """
+        customers, mechanics, parts = [], [], []
+        for i in range(count):
+            customer = Customer(
+                name=f"Bulk Customer {i}",
+                email=f"bulk{i}@customer.com",
+                phone=f"555-000-{i:04d}"
+            )
+            customer.set_password("testpass123")
+            mechanic = Mechanic(
+                name=f"Bulk Mechanic {i}",
+                email=f"bulk{i}@mechanic.com",
+                phone=f"555-111-{i:04d}",
+                specialty="Engine",
+                hourly_rate=40 + i
+            )
+            mechanic.set_password("mechpass123")
+            part = Inventory(name=f"Bulk Part {i}", price=10 + i, quantity=5)
+            customers.append(customer)
+            mechanics.append(mechanic)
+            parts.append(part)
+        db.session.add_all(customers + mechanics + parts)
+
+        for i in range(count):
+            ticket = ServiceTicket(
+                title=f"Bulk Ticket {i}",
+                description="Seeded for query budget tests",
+                customer=customers[i],
+                vehicle_info="2018 Test Car",
+                estimated_cost=100
+            )
+            # Every ticket gets two mechanics and two parts
+            ticket.mechanics = [mechanics[i], mechanics[(i + 1) % count]]
+            ticket.parts = [
+                ServiceTicketPart(inventory=parts[i]),
+                ServiceTicketPart(inventory=parts[(i + 1) % count],
+                                  quantity=2),
+            ]
+            db.session.add(ticket)
+        db.session.commit()
+
+    def assertMaxQueries(self, max_queries):
+        """Context manager failing the test when SQL exceeds the budget"""
+        return QueryBudget(max_queries)
+
     def get_customer_token(self, email="test@customer.com", password="testpass123"):
         """Helper method to get customer JWT token"""
         response = self.client.post('/customers/login',
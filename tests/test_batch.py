@@ -0,0 +1,186 @@
+"""
+Unit tests for POST /batch
+"""
+import unittest
+from tests.base_test import BaseTestCase
+from app import suggest
+from app.batch import resolve, UnresolvedReference
+from app.dispatch import get_board
+from app.models import Inventory, ServiceTicket, ServiceTicketPart
+from app.extention import db
+
+
+class TestBatch(BaseTestCase):
+    """Test cases for running several API calls in one request"""
+
+    def setUp(self):
+        super().setUp()
+        self.parts = [Inventory(name=f'Part {i}', price=5, quantity=10)
+                      for i in range(3)]
+        db.session.add_all(self.parts)
+        db.session.commit()
+        self.part_ids = [part.id for part in self.parts]
+
+    def workflow(self, atomic=True, second_mechanic=None):
+        """Create a ticket, assign two mechanics and add three parts"""
+        requests = [{
+            'id': 'ticket', 'method': 'POST', 'path': '/service-tickets/',
+            'body': {'title': 'Brakes', 'description': 'Squealing',
+                     'customer_id': self.customer_id,
+                     'vehicle_info': '2019 Civic'}
+        }]
+        for mechanic_id in (self.mechanic_id,
+                            second_mechanic or self.mechanic_id + 1):
+            requests.append({
+                'method': 'PUT',
+                'path': f'/service-tickets/{{ticket.id}}/assign-mechanic/'
+                        f'{mechanic_id}'
+            })
+        for part_id in self.part_ids:
+            requests.append({
+                'method': 'PUT',
+                'path': f'/service-tickets/{{ticket.id}}/add-part/{part_id}',
+                'body': {'quantity': 2}
+            })
+        return self.client.post('/batch', json={'atomic': atomic,
+                                                'requests': requests})
+
+    def test_workflow_in_one_request(self):
+        """Test a later call can use the id an earlier one created"""
+        self.create_bulk_data(count=2)
+        second = self.mechanic_id + 1
+
+        response = self.workflow(second_mechanic=second)
+
+        self.assertEqual(response.status_code, 200, response.get_json())
+        data = response.get_json()
+        self.assertTrue(data['committed'])
+        self.assertEqual([r['status'] for r in data['results']],
+                         [201, 200, 200, 200, 200, 200])
+        ticket = db.session.get(ServiceTicket,
+                                data['results'][0]['body']['id'])
+        self.assertEqual({m.id for m in ticket.mechanics},
+                         {self.mechanic_id, second})
+        self.assertEqual(len(ticket.parts), 3)
+        self.assertEqual(db.session.get(Inventory, self.part_ids[0])
+                         .quantity, 8)
+
+    def test_atomic_failure_saves_nothing(self):
+        """Test an unknown mechanic rolls back the ticket and parts"""
+        tickets = ServiceTicket.query.count()
+
+        response = self.workflow(second_mechanic=999)
+
+        self.assertEqual(response.status_code, 400)
+        data = response.get_json()
+        self.assertFalse(data['committed'])
+        self.assertEqual([r['status'] for r in data['results']],
+                         [201, 200, 404])
+        db.session.expire_all()
+        self.assertEqual(ServiceTicket.query.count(), tickets)
+        self.assertEqual(ServiceTicketPart.query.count(), 0)
+
+    def test_atomic_failure_keeps_worker_memory(self):
+        """Test a rolled back batch leaves the index and board as they were"""
+        index = suggest.get_index()
+        board = get_board()
+        count = board.open_tickets(self.mechanic_id)
+
+        response = self.client.post('/batch', headers=self.get_auth_headers(
+            self.get_mechanic_token()
+        ), json={
+            'atomic': True,
+            'requests': [
+                {'method': 'POST', 'path': '/inventory/',
+                 'body': {'name': 'Zephyr Valve', 'price': 12.5}},
+                {'method': 'POST',
+                 'path': '/service-tickets/?dispatch=least-loaded',
+                 'body': {'title': 'Engine', 'description': 'Knocking',
+                          'customer_id': self.customer_id,
+                          'specialty': 'Test Repair'}},
+                {'method': 'PUT',
+                 'path': '/service-tickets/1/assign-mechanic/999'},
+            ]
+        })
+
+        self.assertFalse(response.get_json()['committed'])
+        self.assertEqual([r['status'] for r in
+                          response.get_json()['results']], [201, 201, 404])
+        self.assertEqual(index.search('zephyr'), [])
+        self.assertEqual(board.open_tickets(self.mechanic_id), count)
+
+    def test_non_atomic_keeps_going(self):
+        """Test each call stands alone and a failed reference is a 424"""
+        response = self.client.post('/batch', json={'requests': [
+            {'id': 'bad', 'method': 'POST', 'path': '/service-tickets/',
+             'body': {'title': 'No customer'}},
+            {'method': 'GET', 'path': '/service-tickets/{bad.id}'},
+            {'id': 'part', 'method': 'GET',
+             'path': f'/inventory/{self.part_ids[0]}'},
+            {'method': 'GET', 'path': '/inventory/{part.id}'},
+        ]})
+
+        self.assertEqual(response.status_code, 200)
+        results = response.get_json()['results']
+        self.assertEqual([r['status'] for r in results],
+                         [400, 424, 200, 200])
+        self.assertEqual(results[3]['body']['name'], 'Part 0')
+
+    def test_auth_is_forwarded(self):
+        """Test the batch's Authorization header reaches each call"""
+        requests = [{'method': 'GET', 'path': '/mechanics/me/time-entries'}]
+        response = self.client.post('/batch', json={'requests': requests})
+        self.assertEqual(response.get_json()['results'][0]['status'], 401)
+
+        headers = self.get_auth_headers(self.get_mechanic_token())
+        response = self.client.post('/batch', json={'requests': requests},
+                                    headers=headers)
+        self.assertEqual(response.get_json()['results'][0]['status'], 200)
+
+    def test_validation(self):
+        """Test empty, oversized, nested and malformed batches"""
+        self.app.config['BATCH_MAX_REQUESTS'] = 2
+        get = {'method': 'GET', 'path': '/inventory/'}
+        for body in ({'requests': []},
+                     {'requests': [get] * 3},
+                     {'requests': [{'method': 'POST', 'path': '/batch'}]},
+                     {'requests': [{'method': 'TRACE', 'path': '/'}]},
+                     {'requests': [{'method': 'GET', 'path': 'inventory'}]}):
+            response = self.client.post('/batch', json=body)
+            self.assertEqual(response.status_code, 400, body)
+            self.assertIn('error', response.get_json())
+
+    def test_encoded_batch_path_is_rejected(self):
+        """Test a batch can't reach POST /batch through an encoded path"""
+        tickets = ServiceTicket.query.count()
+
+        response = self.client.post('/batch', json={'atomic': True,
+                                                    'requests': [
+            {'method': 'POST', 'path': '/service-tickets/',
+             'body': {'title': 'Brakes', 'description': 'Squealing',
+                      'customer_id': self.customer_id}},
+            {'method': 'POST', 'path': '/%62atch',
+             'body': {'atomic': True, 'requests': [
+                 {'method': 'GET', 'path': '/inventory/'}]}},
+        ]})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([r['status'] for r in
+                          response.get_json()['results']], [201, 400])
+        db.session.expire_all()
+        self.assertEqual(ServiceTicket.query.count(), tickets)
+
+    def test_resolve(self):
+        """Test whole references keep their type and text is left alone"""
+        results = {'a': {'status': 201, 'body': {'id': 7, 'tags': ['x']}}}
+        self.assertEqual(resolve({'id': '{a.id}', 'note': 'n {a.id}',
+                                  'tag': '{a.tags.0}', 'raw': '{z.id}'},
+                                 results),
+                         {'id': 7, 'note': 'n 7', 'tag': 'x',
+                          'raw': '{z.id}'})
+        with self.assertRaises(UnresolvedReference):
+            resolve('{a.missing}', results)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+"""
+Unit tests for the benchmark suite
+Runs a tiny dataset through the in-process client and checks compare mode
+"""
+import unittest
+from app import create_app
+from app.extention import db
+from app.seed import seed_dataset
+from benchmarks.run import (
+    InProcessClient, run_benchmark, compare_results, percentile
+)
+
+
+class TestBenchmarks(unittest.TestCase):
+    """Test cases for the benchmark runner"""
+
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.counts = seed_dataset(customers=5, mechanics=3, parts=4,
+                                   tickets=20, batch_size=7)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        db.engine.dispose()
+        self.app_context.pop()
+
+    def test_seed_dataset_counts(self):
+        """Seeding creates the requested rows and association fan-out"""
+        self.assertEqual(self.counts['service_tickets'], 20)
+        self.assertGreater(self.counts['mechanic_service_ticket'], 0)
+        count = db.session.execute(
+            db.text('SELECT COUNT(*) FROM service_tickets')
+        ).scalar()
+        self.assertEqual(count, 20)
+
+    def test_run_benchmark_reports_latency_and_queries(self):
+        """Each scenario reports percentiles, throughput and queries"""
+        client = InProcessClient(self.app)
+        results = run_benchmark(
+            client, self.counts, iterations=3, warmup=0,
+            only=['service_tickets.list', 'service_tickets.detail']
+        )
+        route = results['routes']['service_tickets.list']
+        self.assertEqual(route['requests'], 3)
+        self.assertEqual(route['status_codes'], {200: 3})
+        self.assertEqual(route['queries_per_request'], 6)
+        self.assertIsNotNone(route['p99_ms'])
+        self.assertEqual(results['meta']['mode'], 'in-process')
+
+    def test_percentile(self):
+        """Nearest-rank percentile"""
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertIsNone(percentile([], 50))
+
+    def test_compare_flags_regressions(self):
+        """Compare mode flags slower p95 and extra queries"""
+        base = {'routes': {'a': {'p95_ms': 10, 'throughput_rps': 100,
+                                 'queries_per_request': 2}}}
+        same = {'routes': {'a': {'p95_ms': 10.5, 'throughput_rps': 98,
+                                 'queries_per_request': 2}}}
+        worse = {'routes': {'a': {'p95_ms': 20, 'throughput_rps': 100,
+                                  'queries_per_request': 3}}}
+        self.assertEqual(compare_results(base, same), [])
+        regressions = compare_results(base, worse)
+        self.assertEqual(regressions[0]['route'], 'a')
+        self.assertEqual(len(regressions[0]['reasons']), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
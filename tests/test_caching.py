@@ -0,0 +1,95 @@
+"""
+Unit tests for single-flight caching and stale-while-revalidate
+"""
+import threading
+import time
+import unittest
+from flask import jsonify
+from tests.base_test import BaseTestCase
+from app import caching
+from app.extention import cache
+
+
+class TestSingleFlightCache(BaseTestCase):
+    """Test cases for the cached() decorator on read routes"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.calls = 0
+        self.release = threading.Event()
+        self.release.set()
+
+        @caching.cached(timeout=300, key_prefix='test/slow', stale=60)
+        def slow():
+            self.calls += 1
+            self.release.wait(5)
+            return jsonify({'call': self.calls}), 200
+
+        self.app.add_url_rule('/test/slow', 'slow', slow)
+
+    def get_call(self):
+        return self.client.get('/test/slow').get_json()['call']
+
+    def expire(self):
+        entry = cache.get('test/slow')
+        entry['fresh_until'] = time.time() - 1
+        cache.set('test/slow', entry, timeout=60)
+
+    def test_concurrent_misses_run_once(self):
+        """Test requests missing together in one worker share one run"""
+        self.release.clear()
+        results = []
+        threads = [threading.Thread(
+            target=lambda: results.append(self.get_call()))
+            for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.2)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, [1] * 5)
+
+    def test_other_worker_holds_the_lock(self):
+        """Test a miss waits for another worker's result, then gives up"""
+        cache.add(caching.LOCK_PREFIX + 'test/slow', True)
+        threading.Timer(0.1, lambda: cache.set('test/slow', {
+            'body': b'{"call": 0}', 'mimetype': 'application/json',
+            'fresh_until': time.time() + 60})).start()
+        self.assertEqual(self.get_call(), 0)
+        self.assertEqual(self.calls, 0)
+
+        cache.delete('test/slow')
+        self.app.config['CACHE_WAIT_SECONDS'] = 0.1
+        self.assertEqual(self.get_call(), 1)
+
+    def test_stale_while_revalidate(self):
+        """Test an expired entry is served while someone refreshes it"""
+        self.assertEqual(self.get_call(), 1)
+        self.expire()
+
+        cache.add(caching.LOCK_PREFIX + 'test/slow', True)
+        self.assertEqual(self.get_call(), 1)  # stale, no wait
+        self.assertEqual(self.calls, 1)
+
+        cache.delete(caching.LOCK_PREFIX + 'test/slow')
+        self.assertEqual(self.get_call(), 2)  # this one refreshes
+        self.assertEqual(self.get_call(), 2)
+        self.assertIsNone(cache.get(caching.LOCK_PREFIX + 'test/slow'))
+
+    def test_inventory_still_cached(self):
+        """Test the inventory list is replayed from the cache"""
+        first = self.client.get('/inventory/')
+        with self.assertMaxQueries(1) as budget:
+            second = self.client.get('/inventory/')
+
+        self.assertEqual(budget.count, 1)  # just the ETag query
+        self.assertEqual(second.get_json(), first.get_json())
+        self.assertEqual(second.headers['ETag'], first.headers['ETag'])
+
+
+if __name__ == '__main__':
+    unittest.main()
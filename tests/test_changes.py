@@ -0,0 +1,212 @@
+"""
+Unit tests for the change feed (GET /changes) and its retention
+"""
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+from sqlalchemy import insert, update
+from tests.base_test import BaseTestCase, QueryBudget
+from app.extention import db
+from app.models import ChangeLog, Customer, Inventory, ServiceTicket
+from app import changes
+
+
+class ChangesTestCase(BaseTestCase):
+    """Helpers for reading the feed"""
+
+    def sync(self, since=0, status=200, **params):
+        response = self.client.get('/changes',
+                                   query_string=dict(since=since, **params))
+        self.assertEqual(response.status_code, status)
+        return response.get_json()
+
+    def cursor(self):
+        return self.sync()['cursor']
+
+    def summary(self, feed):
+        return [(change['type'], change['id'], change['op'])
+                for change in feed['changes']]
+
+
+class TestChangeFeed(ChangesTestCase):
+    """Test cases for logging writes and reading them back"""
+
+    def test_fixtures_are_logged(self):
+        """Test rows added through the ORM are in the feed from 0"""
+        feed = self.sync()
+
+        self.assertEqual(self.summary(feed),
+                         [('customers', self.customer_id, 'upsert'),
+                          ('mechanics', self.mechanic_id, 'upsert')])
+        self.assertEqual(feed['changes'][0]['data']['name'],
+                         'Test Customer')
+        self.assertNotIn('password_hash', feed['changes'][0]['data'])
+        self.assertNotIn('service_tickets', feed['changes'][1]['data'])
+
+    def test_update_and_delete_since_cursor(self):
+        """Test only later changes come back, newest state once per row"""
+        cursor = self.cursor()
+        token = self.get_mechanic_token()
+        headers = self.get_auth_headers(token)
+        part = self.client.post('/inventory/', json={
+            'name': 'Wiper Blade', 'price': 9.5, 'quantity': 4
+        }, headers=headers).get_json()
+        for price in (10.0, 11.0):
+            self.client.put(f"/inventory/{part['id']}", json={'price': price},
+                            headers=headers)
+        self.client.delete(f'/mechanics/{self.mechanic_id}',
+                           headers=headers)
+
+        feed = self.sync(cursor)
+
+        self.assertEqual(self.summary(feed),
+                         [('inventory', part['id'], 'upsert'),
+                          ('mechanics', self.mechanic_id, 'delete')])
+        self.assertEqual(feed['changes'][0]['data']['price'], 11.0)
+        self.assertEqual(self.sync(feed['cursor'])['changes'], [])
+
+    def test_workflow_writes_are_logged(self):
+        """Test Core status/assignment UPDATEs log the ticket they change"""
+        ticket = ServiceTicket(title='Brake job', description='Squeal',
+                               customer_id=self.customer_id)
+        db.session.add(ticket)
+        db.session.commit()
+        ticket_id = ticket.id
+        cursor = self.cursor()
+
+        self.client.put(f'/service-tickets/{ticket_id}'
+                        f'/assign-mechanic/{self.mechanic_id}')
+
+        change = self.sync(cursor)['changes'][-1]
+        self.assertEqual((change['type'], change['id']),
+                         ('service_tickets', ticket_id))
+        self.assertEqual(change['data']['status'], 'In Progress')
+        self.assertEqual(change['data']['mechanics'], [self.mechanic_id])
+
+    def test_rolled_back_write_is_not_logged(self):
+        """Test the log row shares the change's transaction"""
+        count = ChangeLog.query.count()
+        ghost = Customer(name='Ghost', email='ghost@shop.com')
+        ghost.set_password('ghostpass123')
+        db.session.add(ghost)
+        db.session.flush()
+        db.session.rollback()
+
+        self.assertEqual(ChangeLog.query.count(), count)
+
+    def test_logged_at_commit(self):
+        """Test rows get their seq at commit, one per row written"""
+        before = db.session.query(db.func.max(ChangeLog.seq)).scalar()
+        customer = Customer(name='Late', email='late@shop.com')
+        customer.set_password('latepass123')
+        db.session.add(customer)
+        db.session.flush()
+        customer.name = 'Later'
+        db.session.flush()
+        self.assertEqual(
+            ChangeLog.query.filter(ChangeLog.seq > before).count(), 0)
+
+        db.session.commit()
+        rows = ChangeLog.query.filter(ChangeLog.seq > before).all()
+        self.assertEqual([(row.entity, row.entity_id) for row in rows],
+                         [('customers', customer.id)])
+
+    def test_page_ends_at_unsettled_row(self):
+        """Test a row younger than SETTLE ends the page, later ones wait"""
+        since = db.session.query(db.func.max(ChangeLog.seq)).scalar()
+        old = datetime.utcnow() - timedelta(minutes=1)
+        db.session.execute(insert(changes.change_log), [
+            {'entity': 'customers', 'entity_id': self.customer_id,
+             'op': changes.UPSERT, 'changed_at': old},
+            {'entity': 'mechanics', 'entity_id': self.mechanic_id,
+             'op': changes.UPSERT, 'changed_at': datetime.utcnow()},
+            {'entity': 'customers', 'entity_id': self.customer_id,
+             'op': changes.DELETE, 'changed_at': old},
+        ])
+        db.session.commit()
+
+        with mock.patch.object(changes, '_holds_back', return_value=True):
+            rows, cursor, has_more = changes.read_changes(since)
+
+        self.assertEqual([row[1:] for row in rows],
+                         [('customers', self.customer_id, changes.UPSERT)])
+        self.assertEqual(cursor, since + 1)
+        self.assertFalse(has_more)
+
+    def test_types_and_paging(self):
+        """Test filtering by type and following cursors page by page"""
+        for i in range(3):
+            db.session.add(Inventory(name=f'Part {i}', price=1.0))
+        db.session.commit()
+
+        parts = self.sync(types='inventory')
+        self.assertEqual({change['type'] for change in parts['changes']},
+                         {'inventory'})
+        first = self.sync(limit=2)
+        self.assertTrue(first['has_more'])
+        rest = self.sync(first['cursor'], limit=10)
+        self.assertFalse(rest['has_more'])
+        self.assertEqual(len(first['changes']) + len(rest['changes']), 5)
+
+        self.sync(types='vehicles', status=400)
+
+    def test_sync_cost_follows_changes(self):
+        """Test a sync reads the log and the changed rows, nothing else"""
+        self.create_bulk_data(count=5)
+        cursor = self.cursor()
+        db.session.get(Customer, self.customer_id).address = '1 New St'
+        db.session.commit()
+
+        with QueryBudget(3):  # horizon, log, the one customer
+            feed = self.sync(cursor)
+        self.assertEqual(len(feed['changes']), 1)
+
+
+class TestChangeRetention(ChangesTestCase):
+    """Test cases for compaction, tombstone expiry and backfill"""
+
+    def test_compact_keeps_newest_per_row(self):
+        """Test superseded rows go and a sync from 0 is still complete"""
+        customer = db.session.get(Customer, self.customer_id)
+        for address in ('1 A St', '2 B St'):
+            customer.address = address
+            db.session.commit()
+        before = self.sync()
+
+        counts = changes.compact()
+
+        self.assertEqual(counts, {'superseded': 2, 'tombstones': 0})
+        self.assertEqual(self.summary(self.sync()), self.summary(before))
+
+    def test_expired_tombstones_need_resync(self):
+        """Test a cursor from before pruned deletes gets a 410"""
+        old_cursor = self.cursor()
+        self.client.delete(f'/mechanics/{self.mechanic_id}',
+                           headers=self.get_auth_headers(
+                               self.get_mechanic_token()))
+        db.session.execute(update(ChangeLog).values(
+            changed_at=datetime.utcnow() - timedelta(days=31)
+        ))
+        db.session.commit()
+
+        self.assertEqual(changes.compact(tombstone_days=30)['tombstones'], 1)
+
+        self.sync(old_cursor, status=410)
+        self.assertEqual(self.summary(self.sync()),
+                         [('customers', self.customer_id, 'upsert')])
+
+    def test_backfill_logs_existing_rows(self):
+        """Test rows written before the log existed get an upsert"""
+        db.session.execute(insert(Inventory.__table__).values(
+            name='Old stock', price=3.0
+        ))
+        db.session.commit()
+
+        self.assertEqual(changes.backfill(), 1)
+        self.assertEqual(changes.backfill(), 0)
+        self.assertIn('inventory', {change['type']
+                                    for change in self.sync()['changes']})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+"""
+Unit tests for response compression and precompressed static files
+"""
+import gzip
+import json
+import os
+import unittest
+from tests.base_test import BaseTestCase
+from app import compression
+from app.models import ServiceTicket
+
+GZIP = {'Accept-Encoding': 'gzip, deflate'}
+
+
+class TestCompression(BaseTestCase):
+    """Test cases for the after_request compressor and static cache"""
+
+    def setUp(self):
+        super().setUp()
+        self.create_bulk_data(count=5)
+
+    def test_large_json_is_gzipped(self):
+        """Test a page over the threshold is compressed for gzip clients"""
+        plain = self.client.get('/service-tickets/')
+        response = self.client.get('/service-tickets/', headers=GZIP)
+
+        self.assertGreater(len(plain.data), 500)
+        self.assertNotIn('Content-Encoding', plain.headers)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertLess(len(response.data), len(plain.data))
+        self.assertEqual(json.loads(gzip.decompress(response.data)),
+                         plain.get_json())
+
+    def test_threshold(self):
+        """Test small bodies and a raised threshold go out as they are"""
+        response = self.client.get('/health', headers=GZIP)
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+
+        self.app.config['COMPRESS_MIN_SIZE'] = 10 ** 6
+        response = self.client.get('/service-tickets/', headers=GZIP)
+        self.assertNotIn('Content-Encoding', response.headers)
+
+    def test_conditional_get_still_works(self):
+        """Test the compressed response's weak ETag still gets a 304"""
+        ticket_id = ServiceTicket.query.first().id
+        url = f'/service-tickets/{ticket_id}'
+        self.app.config['COMPRESS_MIN_SIZE'] = 0
+        response = self.client.get(url, headers=GZIP)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+
+        response = self.client.get(url, headers={
+            **GZIP, 'If-None-Match': response.headers['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    def test_streams_keep_streaming(self):
+        """Test a streamed export is compressed chunk by chunk"""
+        headers = {**GZIP, **self.get_auth_headers(
+            self.get_mechanic_token())}
+        response = self.client.get('/exports/service-tickets',
+                                   headers=headers)
+
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertNotIn('Content-Length', response.headers)
+        lines = gzip.decompress(response.data).decode().splitlines()
+        self.assertEqual(len(lines), ServiceTicket.query.count() + 1)
+
+    def test_static_is_precompressed(self):
+        """Test swagger.yaml is served from the startup cache"""
+        cache = self.app.extensions['compression']
+        self.assertIn('swagger.yaml', cache)
+        with open(os.path.join(self.app.static_folder, 'swagger.yaml'),
+                  'rb') as f:
+            original = f.read()
+
+        response = self.client.get('/static/swagger.yaml', headers=GZIP)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.mimetype, 'application/yaml')
+        self.assertEqual(response.data, cache['swagger.yaml']['bodies']
+                         ['gzip'])
+        self.assertEqual(gzip.decompress(response.data), original)
+
+        response = self.client.get('/static/swagger.yaml', headers={
+            **GZIP, 'If-None-Match': response.headers['ETag']})
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get('/static/swagger.yaml')
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(response.data, original)
+        response.close()
+
+    @unittest.skipIf(compression.brotli is None, 'brotli not installed')
+    def test_brotli_preferred(self):
+        """Test br wins when the client takes both"""
+        response = self.client.get('/service-tickets/', headers={
+            'Accept-Encoding': 'gzip, br'})
+        self.assertEqual(response.headers['Content-Encoding'], 'br')
+        self.assertEqual(json.loads(compression.brotli.decompress(
+            response.data)), self.client.get('/service-tickets/').get_json())
+
+    @unittest.skipUnless(compression.brotli is None, 'brotli installed')
+    def test_brotli_missing(self):
+        """Test a br-only client gets an uncompressed body"""
+        response = self.client.get('/service-tickets/', headers={
+            'Accept-Encoding': 'br'})
+        self.assertNotIn('Content-Encoding', response.headers)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,219 @@
+"""
+Unit tests for conditional requests - ETag / Last-Modified 304s on GET and
+If-Match version checks on PUT
+"""
+import unittest
+from sqlalchemy import update
+from sqlalchemy.orm.exc import StaleDataError
+from werkzeug.exceptions import NotFound
+from tests.base_test import BaseTestCase, QueryBudget
+from app.extention import db
+from app.conditional import precondition_failed
+from app.models import ServiceTicket, Inventory
+
+
+class ConditionalTestCase(BaseTestCase):
+    """A ticket and a part to read and write"""
+
+    def setUp(self):
+        super().setUp()
+        self.ticket = ServiceTicket(title='Brake job', description='Squeal',
+                                    customer_id=self.customer_id)
+        self.part = Inventory(name='Brake Pad', price=45.0, quantity=10)
+        db.session.add_all([self.ticket, self.part])
+        db.session.commit()
+        self.ticket_id = self.ticket.id
+        self.part_id = self.part.id
+        self.token = self.get_mechanic_token()
+
+    def etag(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.headers['ETag']
+
+    def assertNotModified(self, url, etag):
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+
+    def assertModified(self, url, etag):
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+
+class TestConditionalGet(ConditionalTestCase):
+    """Test cases for validators on the read routes"""
+
+    def test_detail_304_with_one_query(self):
+        """Test a matching If-None-Match is answered by the validator alone"""
+        url = f'/service-tickets/{self.ticket_id}'
+        response = self.client.get(url)
+        # Versioned rows get a strong tag, usable in If-Match
+        self.assertFalse(response.headers['ETag'].startswith('W/'))
+        self.assertIn('Last-Modified', response.headers)
+
+        with QueryBudget(1):
+            self.assertNotModified(url, response.headers['ETag'])
+
+    def test_if_modified_since(self):
+        """Test Last-Modified works as a validator for single rows"""
+        url = f'/mechanics/{self.mechanic_id}'
+        last_modified = self.client.get(url).headers['Last-Modified']
+
+        response = self.client.get(
+            url, headers={'If-Modified-Since': last_modified}
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_update_changes_etag(self):
+        """Test a PUT gives the ticket a new tag"""
+        url = f'/service-tickets/{self.ticket_id}'
+        etag = self.etag(url)
+
+        self.client.put(url, json={'priority': 'High'})
+
+        self.assertModified(url, etag)
+
+    def test_relationship_changes_etag(self):
+        """Test assigning a mechanic and adding a part invalidate tags"""
+        url = f'/service-tickets/{self.ticket_id}'
+        part_url = f'/inventory/{self.part_id}'
+        etag = self.etag(url)
+        self.client.put(f'{url}/assign-mechanic/{self.mechanic_id}')
+        self.assertModified(url, etag)
+
+        etag, part_etag = self.etag(url), self.etag(part_url)
+        self.client.put(f'{url}/add-part/{self.part_id}')
+        self.assertModified(url, etag)
+        self.assertModified(part_url, part_etag)
+
+    def test_list_etag(self):
+        """Test list tags change when a row is added or deleted"""
+        etag = self.etag('/service-tickets/')
+        self.assertNotModified('/service-tickets/', etag)
+
+        self.client.delete(f'/service-tickets/{self.ticket_id}')
+
+        self.assertModified('/service-tickets/', etag)
+
+    def test_customer_detail_follows_tickets(self):
+        """Test a customer's tag covers the tickets nested in it"""
+        url = f'/customers/{self.customer_id}'
+        etag = self.etag(url)
+
+        self.client.put(f'/service-tickets/{self.ticket_id}',
+                        json={'priority': 'Urgent'})
+
+        self.assertModified(url, etag)
+
+    def test_cached_route_serves_fresh_body(self):
+        """Test a cached inventory item is never served under a newer tag"""
+        url = f'/inventory/{self.part_id}'
+        self.client.get(url)  # cached
+
+        self.client.put(url, json={'price': 50.0},
+                        headers=self.get_auth_headers(self.token))
+
+        self.assertEqual(self.client.get(url).get_json()['price'], 50.0)
+
+    def test_missing_row_404(self):
+        """Test the validator 404s before the view runs"""
+        response = self.client.get('/service-tickets/9999',
+                                   headers={'If-None-Match': '*'})
+
+        self.assertEqual(response.status_code, 404)
+
+
+class TestOptimisticConcurrency(ConditionalTestCase):
+    """Test cases for version checks and If-Match on PUT"""
+
+    def test_if_match_current_version(self):
+        """Test a PUT naming the current version succeeds and bumps it"""
+        url = f'/service-tickets/{self.ticket_id}'
+        version = self.client.get(url).get_json()['version']
+
+        response = self.client.put(url, json={'priority': 'High'},
+                                   headers={'If-Match': f'"{version}"'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['version'], version + 1)
+
+    def test_if_match_stale_version(self):
+        """Test the second of two edits from the same read gets a 412"""
+        url = f'/service-tickets/{self.ticket_id}'
+        version = self.client.get(url).get_json()['version']
+        headers = {'If-Match': f'"{version}"'}
+        self.client.put(url, json={'priority': 'High'}, headers=headers)
+
+        response = self.client.put(url, json={'priority': 'Low'},
+                                   headers=headers)
+
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(response.get_json()['current_version'], version + 1)
+        self.assertEqual(self.client.get(url).get_json()['priority'], 'High')
+
+    def test_inventory_if_match(self):
+        """Test stock taken by a ticket makes an older inventory read stale"""
+        url = f'/inventory/{self.part_id}'
+        headers = self.get_auth_headers(self.token)
+        version = self.client.get(url).get_json()['version']
+        self.client.put(f'/service-tickets/{self.ticket_id}'
+                        f'/add-part/{self.part_id}')
+
+        headers['If-Match'] = f'"{version}"'
+        response = self.client.put(url, json={'quantity': 10},
+                                   headers=headers)
+
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(db.session.get(Inventory, self.part_id).quantity, 9)
+
+    def test_if_match_etag_from_get(self):
+        """Test the ETag a GET sent - plain or gzipped - works in If-Match"""
+        url = f'/service-tickets/{self.ticket_id}'
+        self.app.config['COMPRESS_MIN_SIZE'] = 0
+        etag = self.etag(url)
+        gzipped = self.client.get(url, headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(gzipped.headers['ETag'], etag[:-1] + '-gzip"')
+        self.assertNotModified(url, gzipped.headers['ETag'])
+
+        response = self.client.put(url, json={'priority': 'High'},
+                                   headers={'If-Match': etag})
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.put(url, json={'priority': 'Low'}, headers={
+            'If-Match': gzipped.headers['ETag']})
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(response.headers['ETag'], self.etag(url))
+
+    def test_weak_etag_never_matches(self):
+        """Test If-Match uses strong comparison"""
+        url = f'/service-tickets/{self.ticket_id}'
+        response = self.client.put(url, json={'priority': 'High'}, headers={
+            'If-Match': f'W/{self.etag(url)}'})
+        self.assertEqual(response.status_code, 412)
+
+    def test_precondition_failed_on_deleted_row(self):
+        """Test a row deleted between read and write is a 404, not a 500"""
+        with self.app.test_request_context():
+            with self.assertRaises(NotFound):
+                precondition_failed(None)
+
+    def test_concurrent_write_raises_stale_data(self):
+        """Test an UPDATE loses if the row changed after it was read"""
+        ticket = db.session.get(ServiceTicket, self.ticket_id)
+        # Another worker commits in between
+        db.session.execute(
+            update(ServiceTicket.__table__)
+            .where(ServiceTicket.id == self.ticket_id)
+            .values(version=ServiceTicket.version + 1)
+        )
+
+        ticket.title = 'Lost update'
+        with self.assertRaises(StaleDataError):
+            db.session.commit()
+        db.session.rollback()
+
+
+if __name__ == '__main__':
+    unittest.main()
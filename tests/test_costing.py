@@ -0,0 +1,130 @@
+"""
+Unit tests for batch ticket costing and the invoice run CSV
+"""
+import csv
+import io
+import unittest
+from datetime import date
+from tests.base_test import BaseTestCase, QueryBudget
+from app.extention import db
+from app.models import (
+    Inventory, Mechanic, ServiceTicket, ServiceTicketPart, TimeEntry
+)
+from app import costing
+
+
+class TestBatchCosting(BaseTestCase):
+    """Test cases for pricing a range of tickets in a few queries"""
+
+    def setUp(self):
+        super().setUp()
+        mechanic = db.session.get(Mechanic, self.mechanic_id)
+        helper = Mechanic(name='Helper', email='helper@shop.com',
+                          hourly_rate=33.33)
+        helper.set_password('mechpass123')
+        pads = Inventory(name='Brake Pad', price=45.99, quantity=50)
+        rotor = Inventory(name='Rotor', price=120.1, quantity=50)
+        # (completed on, estimate, crew, parts, logged (hours, rate))
+        jobs = [
+            (date(2026, 3, 1), 150.0, [mechanic, helper],
+             [(pads, 2), (rotor, 1)], []),
+            (date(2026, 3, 15), None, [helper], [(pads, 3)],
+             [(1.5, 33.33), (0.25, 40.0)]),
+            (date(2026, 3, 31), 80.5, [], [(rotor, 2)], []),
+            (date(2026, 3, 31), 99.99, [mechanic], [], [(3.75, None)]),
+            (date(2026, 4, 1), 500.0, [mechanic], [(pads, 1)], []),
+        ]
+        for day, estimate, crew, parts, logged in jobs:
+            ticket = self.add_ticket(day, estimate, crew, parts)
+            ticket.time_entries = [TimeEntry(hours=hours, rate=rate)
+                                   for hours, rate in logged]
+        # In the range but not finished
+        self.add_ticket(None, 60.0, [mechanic], [(pads, 1)],
+                        status='In Progress')
+        db.session.commit()
+        self.march = (date(2026, 3, 1), date(2026, 3, 31))
+
+    def add_ticket(self, day, estimate, crew, parts, status='Completed'):
+        ticket = ServiceTicket(
+            title='Job', customer_id=self.customer_id, status=status,
+            estimated_cost=estimate, completion_date=day, mechanics=crew
+        )
+        ticket.parts = [ServiceTicketPart(inventory=part, quantity=quantity)
+                        for part, quantity in parts]
+        db.session.add(ticket)
+        return ticket
+
+    def expected(self):
+        tickets = ServiceTicket.query.filter(
+            ServiceTicket.completion_date.between(*self.march)
+        ).order_by(ServiceTicket.id)
+        return [(ticket.id, ticket.calculate_total_cost())
+                for ticket in tickets]
+
+    def totals(self, engine):
+        return [(row[0], row[-1])
+                for row in costing.batch_costs(*self.march, engine=engine)]
+
+    def test_sql_matches_model(self):
+        """Test the SQL engine agrees with calculate_total_cost"""
+        self.assertEqual(self.totals('sql'), self.expected())
+
+    @unittest.skipIf(costing.np is None, 'NumPy not installed')
+    def test_numpy_matches_model(self):
+        """Test the NumPy engine agrees with calculate_total_cost"""
+        self.assertEqual(self.totals('numpy'), self.expected())
+
+    @unittest.skipIf(costing.np is None, 'NumPy not installed')
+    def test_numpy_query_count(self):
+        """Test tickets, crew rates, time and part lines are a query each"""
+        with QueryBudget(4):
+            list(costing.batch_costs(*self.march, engine='numpy'))
+
+    @unittest.skipUnless(costing.np is None, 'NumPy is installed')
+    def test_numpy_missing(self):
+        """Test asking for NumPy without it installed is an error"""
+        with self.assertRaises(RuntimeError):
+            costing.batch_costs(*self.march, engine='numpy')
+
+    def test_sql_is_one_query(self):
+        """Test the fallback aggregates in the database"""
+        with QueryBudget(1):
+            rows = list(costing.batch_costs(*self.march, engine='sql'))
+        self.assertEqual(len(rows), 4)
+
+    def test_invoices_csv(self):
+        """Test the endpoint streams a header and one row per ticket"""
+        headers = self.get_auth_headers(self.get_mechanic_token())
+        response = self.client.get('/reports/invoices', headers=headers,
+                                   query_string={'start': '2026-03-01',
+                                                 'end': '2026-03-31',
+                                                 'engine': 'sql'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/csv')
+        self.assertTrue(response.is_streamed)
+        rows = list(csv.DictReader(io.StringIO(response.get_data(True))))
+        self.assertEqual([(int(row['ticket_id']), float(row['total']))
+                          for row in rows], self.expected())
+        self.assertEqual(rows[0]['completion_date'], '2026-03-01')
+
+        response = self.client.get('/reports/invoices?engine=abacus',
+                                   headers=headers)
+        self.assertEqual(response.status_code, 400)
+
+    def test_cost_tickets_command(self):
+        """Test `flask cost-tickets` writes the same CSV"""
+        runner = self.app.test_cli_runner()
+        result = runner.invoke(costing.cost_tickets_command, [
+            '--start', '2026-03-01', '--end', '2026-03-31', '--engine', 'sql'
+        ])
+
+        self.assertEqual(result.exit_code, 0, result.stderr)
+        lines = result.stdout.splitlines()
+        self.assertEqual(lines[0], ','.join(costing.COLUMNS))
+        self.assertEqual(len(lines), 5)
+        self.assertIn('Costed 4 tickets', result.stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,176 @@
+"""
+Unit tests for least-loaded auto-dispatch (POST /service-tickets/?dispatch=)
+"""
+import unittest
+from tests.base_test import BaseTestCase, QueryBudget
+from app.extention import db
+from app.models import Mechanic
+from app.dispatch import LoadBoard, get_board
+
+
+class TestAutoDispatch(BaseTestCase):
+    """Test cases for assigning new tickets to the least-loaded mechanic"""
+
+    def setUp(self):
+        super().setUp()
+        self.brakes = []
+        for name, rate in (('Cheap', 40.0), ('Pricey', 90.0)):
+            mechanic = Mechanic(name=name, email=f'{name}@shop.com',
+                                specialty='Brakes', hourly_rate=rate)
+            mechanic.set_password('mechpass123')
+            db.session.add(mechanic)
+            self.brakes.append(mechanic)
+        db.session.commit()
+        self.cheap_id, self.pricey_id = (m.id for m in self.brakes)
+
+    def create_ticket(self, dispatch='least-loaded', specialty='Brakes'):
+        response = self.client.post(
+            '/service-tickets/', query_string={'dispatch': dispatch},
+            json={'title': 'Brake job', 'description': 'Grinding noise',
+                  'customer_id': self.customer_id, 'specialty': specialty}
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.get_json()
+
+    def test_spreads_tickets_by_open_count(self):
+        """Test new tickets go to whoever with the specialty has fewest"""
+        assigned = [self.create_ticket()['mechanics'] for _ in range(4)]
+
+        self.assertEqual(sorted(m for ids in assigned for m in ids),
+                         [self.cheap_id] * 2 + [self.pricey_id] * 2)
+        ticket = self.create_ticket()
+        self.assertEqual(ticket['status'], 'In Progress')
+        self.assertNotIn(self.mechanic_id, ticket['mechanics'])
+
+    def test_least_cost_weights_by_rate(self):
+        """Test least-cost keeps the cheaper mechanic busier"""
+        assigned = [self.create_ticket('least-cost')['mechanics'][0]
+                    for _ in range(3)]
+
+        # 40 * 1, 40 * 2 < 90 * 1, then 40 * 3 > 90 * 1
+        self.assertEqual(assigned,
+                         [self.cheap_id, self.cheap_id, self.pricey_id])
+
+    def test_no_specialty_and_no_match(self):
+        """Test any mechanic takes a general ticket, nobody an unknown one"""
+        general = self.create_ticket(specialty=None)
+        self.assertEqual(len(general['mechanics']), 1)
+
+        ticket = self.create_ticket(specialty='Transmission')
+        self.assertEqual(ticket['mechanics'], [])
+        self.assertEqual(ticket['status'], 'Open')
+
+    def test_counts_follow_routes(self):
+        """Test assign, remove and closing a ticket keep counts current"""
+        ticket_id = self.create_ticket()['id']
+        board = get_board()
+        first = self.cheap_id if board.open_tickets(self.cheap_id) \
+            else self.pricey_id
+        self.assertEqual(board.open_tickets(first), 1)
+
+        self.client.put(f'/service-tickets/{ticket_id}'
+                        f'/assign-mechanic/{self.mechanic_id}')
+        self.assertEqual(board.open_tickets(self.mechanic_id), 1)
+        self.client.post(f'/service-tickets/{ticket_id}/transition',
+                         json={'status': 'Completed'})
+        self.assertEqual(board.open_tickets(first), 0)
+        self.assertEqual(board.open_tickets(self.mechanic_id), 0)
+
+    def test_no_count_query_per_ticket(self):
+        """Test dispatch only adds the assignment and its event"""
+        self.create_ticket()  # loads the board
+        with QueryBudget(100) as plain:
+            self.create_ticket(dispatch=None)
+
+        # ticket UPDATE, mechanic touch, link INSERT, its change log row,
+        # event INSERT
+        with QueryBudget(plain.count + 5):
+            self.create_ticket()
+
+    def test_stale_board_reloaded_once(self):
+        """Test only the caller that claims the reload runs the count"""
+        board = get_board()
+        self.app.config['DISPATCH_LOAD_TTL'] = 0
+        self.assertTrue(board.claim_load())  # another request is reloading
+
+        with QueryBudget(0):
+            self.assertIs(get_board(), board)
+        board.abandon_load()
+        with QueryBudget(1):
+            get_board()
+
+    def test_invalid_mode(self):
+        """Test an unknown dispatch mode is rejected"""
+        response = self.client.post('/service-tickets/?dispatch=random',
+                                    json={})
+
+        self.assertEqual(response.status_code, 400)
+
+
+class TestLoadBoard(unittest.TestCase):
+    """Test cases for the in-memory heaps"""
+
+    def test_take_and_adjust(self):
+        """Test the lowest count wins and changes reorder the heap"""
+        board = LoadBoard()
+        board.load([(1, 'Brakes', 50, 2), (2, 'Brakes', 50, 0),
+                    (3, 'Engine', 50, 0)])
+
+        self.assertEqual(board.take('Brakes'), 2)
+        self.assertEqual(board.take('Brakes'), 2)
+        board.adjust(1, -2)
+        self.assertEqual(board.take('Brakes'), 1)
+        self.assertEqual(board.take(), 3)
+        self.assertIsNone(board.take('Paint'))
+
+    def test_removed_mechanic_is_skipped(self):
+        """Test a removed mechanic's stale entries are never returned"""
+        board = LoadBoard()
+        board.load([(1, 'Brakes', None, 0), (2, 'Brakes', None, 5)])
+        board.remove(1)
+
+        self.assertEqual(board.take('Brakes'), 2)
+        board.update([(1, 'Engine', None, 0)])
+        self.assertEqual(board.take('Brakes'), 2)
+        self.assertEqual(board.open_tickets(2), 7)
+
+    def test_take_during_load_uses_old_board(self):
+        """Test a reload in progress never leaves take() empty-handed"""
+        board = LoadBoard()
+        board.load([(1, 'Brakes', None, 0)])
+        taken = []
+
+        def rows():
+            # Another request dispatches while the new board is built
+            taken.append(board.take('Brakes'))
+            board.update([(3, 'Paint', None, 0)])
+            yield (2, 'Brakes', None, 0)
+
+        self.assertTrue(board.claim_load())
+        board.load(rows())
+
+        self.assertEqual(taken, [1])
+        self.assertIsNone(board.open_tickets(1))
+        self.assertEqual(board.take('Paint'), 3)  # replayed
+        self.assertEqual(board.take('Brakes'), 2)
+
+
+    def test_counts_changed_during_load_are_kept(self):
+        """Test take() and adjust() during a reload carry over to it"""
+        board = LoadBoard()
+        board.load([(1, 'Brakes', None, 0), (2, 'Brakes', None, 0)])
+
+        def rows():
+            board.take('Brakes')  # mechanic 1
+            board.adjust(2, 3)
+            yield (1, 'Brakes', None, 0)
+            yield (2, 'Brakes', None, 0)
+
+        self.assertTrue(board.claim_load())
+        board.load(rows())
+
+        self.assertEqual(board.open_tickets(1), 1)
+        self.assertEqual(board.open_tickets(2), 3)
+
+if __name__ == '__main__':
+    unittest.main()
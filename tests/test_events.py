@@ -0,0 +1,143 @@
+"""
+Unit tests for the live ticket event stream (GET /service-tickets/events)
+"""
+import json
+import time
+import unittest
+from tests.base_test import BaseTestCase
+from app.extention import db
+from app.models import Inventory, ServiceTicket
+from app import events
+
+
+class TestTicketEvents(BaseTestCase):
+    """Test cases for publishing and replaying ticket events"""
+
+    def setUp(self):
+        super().setUp()
+        self.part = Inventory(name='Brake Pad', price=45.0, quantity=10)
+        db.session.add(self.part)
+        db.session.commit()
+        self.part_id = self.part.id
+
+    def create_ticket(self):
+        response = self.client.post('/service-tickets/', json={
+            'title': 'Brake job', 'description': 'Squeal',
+            'customer_id': self.customer_id, 'priority': 'High'
+        })
+        return response.get_json()['id']
+
+    def read_stream(self, **headers):
+        response = self.client.get('/service-tickets/events',
+                                   headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        messages = []
+        for block in response.get_data(as_text=True).split('\n\n'):
+            fields = dict(line.split(': ', 1) for line in block.splitlines()
+                          if not line.startswith(':'))
+            if 'data' in fields:
+                messages.append((int(fields['id']), fields['event'],
+                                 json.loads(fields['data'])))
+        return messages
+
+    def test_replays_ticket_lifecycle(self):
+        """Test each workflow step is an event carrying the new status"""
+        ticket_id = self.create_ticket()
+        base = f'/service-tickets/{ticket_id}'
+        self.client.put(f'{base}/assign-mechanic/{self.mechanic_id}')
+        self.client.put(f'{base}/add-part/{self.part_id}')
+        self.client.post(f'{base}/transition', json={'status': 'Completed'})
+
+        messages = self.read_stream(**{'Last-Event-ID': '0'})
+
+        self.assertEqual(
+            [(kind, data['status']) for _, kind, data in messages],
+            [('created', 'Open'), ('mechanic-assigned', 'In Progress'),
+             ('part-added', 'In Progress'), ('status-changed', 'Completed')]
+        )
+        self.assertEqual(messages[0][2]['priority'], 'High')
+        self.assertEqual(messages[1][2]['mechanic_id'], self.mechanic_id)
+        self.assertEqual(messages[2][2]['inventory_id'], self.part_id)
+        self.assertEqual({data['ticket_id'] for _, _, data in messages},
+                         {ticket_id})
+
+    def test_resume_from_last_event_id(self):
+        """Test reconnecting only sends what came after the last id"""
+        first = self.create_ticket()
+        last_seen = self.read_stream(**{'Last-Event-ID': '0'})[-1][0]
+        self.client.delete(f'/service-tickets/{first}')
+        second = self.create_ticket()
+
+        messages = self.read_stream(**{'Last-Event-ID': str(last_seen)})
+
+        self.assertEqual([(kind, data['ticket_id'])
+                          for _, kind, data in messages],
+                         [('deleted', first), ('created', second)])
+        self.assertIsNone(messages[0][2]['status'])
+
+    def test_new_stream_starts_now(self):
+        """Test a display without Last-Event-ID isn't sent old events"""
+        self.create_ticket()
+
+        self.assertEqual(self.read_stream(), [])
+
+    def test_invalid_last_event_id(self):
+        """Test a malformed Last-Event-ID is a 400"""
+        response = self.client.get('/service-tickets/events',
+                                   headers={'Last-Event-ID': 'abc'})
+
+        self.assertEqual(response.status_code, 400)
+
+
+class TestEventBroker(BaseTestCase):
+    """Test cases for the per-worker tail of ticket_events"""
+
+    def setUp(self):
+        super().setUp()
+        self.broker = events.EventBroker(self.app)
+        self.broker.poll()  # starts at the current end of the table
+
+    def publish(self, count=1):
+        ticket = ServiceTicket(title='Job', description='Job',
+                               customer_id=self.customer_id)
+        db.session.add(ticket)
+        db.session.commit()
+        for _ in range(count):
+            events.publish(events.CREATED, ticket.id)
+
+    def test_poll_wakes_waiting_streams(self):
+        """Test new rows are handed to wait() without touching the table"""
+        self.publish(2)
+        self.assertEqual(self.broker.poll(), 2)
+
+        live = self.broker.wait(0, timeout=0)
+        self.assertEqual([event['id'] for event in live], [1, 2])
+        self.assertEqual(self.broker.wait(2, timeout=0), [])
+
+    def test_fell_behind_buffer(self):
+        """Test a stream older than the buffer is sent back to the table"""
+        self.broker.dropped_through = 5
+
+        self.assertIsNone(self.broker.wait(3, timeout=0))
+
+    def test_waits_for_missing_id(self):
+        """Test an id that may still be committing holds back later ones"""
+        self.broker.last_id = 0
+        rows = [{'id': 1}, {'id': 3}]
+
+        self.assertEqual(self.broker._without_gaps(rows), [{'id': 1}])
+        self.broker._gap_since = time.monotonic() - events.GAP_WAIT
+        self.assertEqual(self.broker._without_gaps(rows), rows)
+
+
+    def test_catch_up_stops_at_missing_id(self):
+        """Test the backlog stops before an id the broker hasn't passed"""
+        rows = [{'id': 1}, {'id': 3}, {'id': 4}]
+
+        self.assertEqual(events.settled(rows, 0), [{'id': 1}])
+        self.assertEqual(events.settled(rows, 0, through=1), [{'id': 1}])
+        self.assertEqual(events.settled(rows, 0, through=2), rows)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+"""
+Unit tests for the streaming /exports endpoints
+"""
+import csv
+import gzip
+import io
+import json
+import unittest
+from datetime import datetime
+from sqlalchemy import update
+from tests.base_test import BaseTestCase, QueryBudget
+from app.extention import db
+from app.models import ServiceTicket
+from app import exports
+
+
+class TestExports(BaseTestCase):
+    """Test cases for CSV / NDJSON dumps with filters and columns"""
+
+    def setUp(self):
+        super().setUp()
+        self.create_bulk_data(count=5)
+        self.headers = self.get_auth_headers(self.get_mechanic_token())
+
+    def export(self, name, status=200, encoding=None, **params):
+        headers = dict(self.headers)
+        if encoding:
+            headers['Accept-Encoding'] = encoding
+        response = self.client.get(f'/exports/{name}', query_string=params,
+                                   headers=headers)
+        self.assertEqual(response.status_code, status)
+        return response
+
+    def test_csv_of_every_ticket(self):
+        """Test the CSV has a header and one row per ticket, by id"""
+        response = self.export('service-tickets')
+
+        self.assertEqual(response.mimetype, 'text/csv')
+        self.assertTrue(response.is_streamed)
+        self.assertIn('service-tickets.csv',
+                      response.headers['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(response.get_data(True))))
+        ids = [ticket.id for ticket in
+               ServiceTicket.query.order_by(ServiceTicket.id)]
+        self.assertEqual([int(row['id']) for row in rows], ids)
+        self.assertEqual(list(rows[0]),
+                         exports.EXPORTS['service-tickets'].columns)
+
+    def test_ndjson_columns_and_filters(self):
+        """Test picking columns and filtering by equality"""
+        ticket = ServiceTicket.query.first()
+        response = self.export('service-tickets', format='ndjson',
+                               columns='id,title,estimated_cost',
+                               customer_id=ticket.customer_id)
+
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        rows = [json.loads(line)
+                for line in response.get_data(True).splitlines()]
+        expected = ServiceTicket.query.filter_by(
+            customer_id=ticket.customer_id).count()
+        self.assertEqual(len(rows), expected)
+        self.assertEqual(set(rows[0]), {'id', 'title', 'estimated_cost'})
+        self.assertIsInstance(rows[0]['estimated_cost'], float)
+
+    def test_updated_since(self):
+        """Test only rows written after updated_since come back"""
+        ticket = ServiceTicket.query.first()
+        db.session.execute(update(ServiceTicket.__table__).values(
+            updated_at=datetime(2026, 1, 1)))
+        db.session.execute(update(ServiceTicket.__table__).where(
+            ServiceTicket.id == ticket.id).values(
+            updated_at=datetime(2026, 2, 1)))
+        db.session.commit()
+
+        response = self.export('service-tickets', format='ndjson',
+                               columns='id',
+                               updated_since='2026-01-15T00:00:00')
+        self.assertEqual(response.get_data(True), f'{{"id": {ticket.id}}}\n')
+
+    def test_gzip_on_the_fly(self):
+        """Test the stream is gzipped when the client accepts it"""
+        response = self.export('inventory', encoding='gzip, deflate')
+
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        text = gzip.decompress(response.get_data()).decode()
+        self.assertEqual(text.splitlines()[0].split(','),
+                         exports.EXPORTS['inventory'].columns)
+        self.assertNotIn('Content-Encoding',
+                         self.export('inventory').headers)
+
+    def test_customers_never_include_password(self):
+        """Test password hashes can't be exported, even by name"""
+        header = self.export('customers').get_data(True).splitlines()[0]
+        self.assertNotIn('password_hash', header)
+        self.export('customers', status=400, columns='id,password_hash')
+
+    def test_one_query_whatever_the_size(self):
+        """Test the export is a single streamed SELECT"""
+        db.session.add_all(ServiceTicket(title=f'Job {i}',
+                                         customer_id=self.customer_id)
+                           for i in range(50))
+        db.session.commit()
+        with QueryBudget(2):  # token check, export
+            self.export('service-tickets').get_data()
+
+    def test_invalid_requests(self):
+        """Test bad formats, columns, filters and auth are rejected"""
+        self.export('inventory', status=400, format='xml')
+        body = self.export('inventory', status=400, columns='nope').json
+        self.assertIn('name', body['columns'])
+        self.export('inventory', status=400, price='10')  # not a filter
+        self.export('service-tickets', status=400, customer_id='abc')
+        self.export('service-tickets', status=400, updated_since='soon')
+        response = self.client.get('/exports/inventory')
+        self.assertEqual(response.status_code, 401)
+
+
+if __name__ == '__main__':
+    unittest.main()
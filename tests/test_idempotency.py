@@ -0,0 +1,154 @@
+"""
+Unit tests for Idempotency-Key handling on POST/PUT routes
+"""
+import threading
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+from sqlalchemy import insert, select
+from sqlalchemy.exc import OperationalError
+from tests.base_test import BaseTestCase
+from app import idempotency
+from app.extention import db
+from app.models import Customer, Inventory, ServiceTicket
+
+
+class TestIdempotency(BaseTestCase):
+    """Test cases for replaying the first response to a retried request"""
+
+    def new_customer(self, key, email='retry@customer.com'):
+        return self.client.post('/customers/', json={
+            'name': 'Retry', 'email': email, 'phone': '555-010-0100',
+            'password': 'secret123'
+        }, headers={'Idempotency-Key': key})
+
+    def claim(self, key, created_at=None, fingerprint=None):
+        """Insert an unfinished claim, as a request still running would"""
+        if fingerprint is None:
+            with self.app.test_request_context(
+                    '/customers/', method='POST', json={
+                        'name': 'Retry', 'email': 'retry@customer.com',
+                        'phone': '555-010-0100',
+                        'password': 'secret123'}):
+                fingerprint = idempotency._fingerprint()
+        now = datetime.utcnow()
+        db.session.execute(insert(idempotency.keys).values(
+            key=key, fingerprint=fingerprint,
+            created_at=created_at or now,
+            expires_at=now + timedelta(hours=1)
+        ))
+        db.session.commit()
+
+    def test_retry_replays_first_response(self):
+        """Test a retried create returns the same customer, made once"""
+        first = self.new_customer('abc-1')
+        retry = self.new_customer('abc-1')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', first.headers)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.headers['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.get_json(), first.get_json())
+        self.assertEqual(Customer.query.filter_by(
+            email='retry@customer.com').count(), 1)
+
+    def test_work_and_response_commit_together(self):
+        """Test the route's work is rolled back if its response isn't saved"""
+        failure = OperationalError('UPDATE idempotency_keys', {}, None)
+        with mock.patch.object(idempotency, 'update', side_effect=failure):
+            with self.assertRaises(OperationalError):
+                self.new_customer('abc-2')
+
+        self.assertEqual(Customer.query.filter_by(
+            email='retry@customer.com').count(), 0)
+        self.assertEqual(db.session.execute(
+            select(db.func.count()).select_from(idempotency.keys)
+        ).scalar(), 0)
+
+    def test_without_key_nothing_changes(self):
+        """Test requests without the header run every time"""
+        self.client.post('/customers/', json={
+            'name': 'A', 'email': 'a@customer.com', 'password': 'x1'})
+        response = self.client.post('/customers/', json={
+            'name': 'A', 'email': 'a@customer.com', 'password': 'x1'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(db.session.execute(
+            select(db.func.count()).select_from(idempotency.keys)
+        ).scalar(), 0)
+
+    def test_part_taken_once(self):
+        """Test a retried add-part doesn't take stock twice"""
+        ticket = ServiceTicket(title='T', description='D',
+                               customer_id=self.customer_id)
+        part = Inventory(name='Filter', price=5, quantity=10)
+        db.session.add_all([ticket, part])
+        db.session.commit()
+        url = f'/service-tickets/{ticket.id}/add-part/{part.id}'
+
+        for _ in range(2):
+            response = self.client.put(url, json={'quantity': 3},
+                                       headers={'Idempotency-Key': 'p-1'})
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Idempotent-Replayed'], 'true')
+        db.session.expire_all()
+        self.assertEqual(db.session.get(Inventory, part.id).quantity, 7)
+
+    def test_key_reused_for_another_request(self):
+        """Test the same key with a different body is a 422"""
+        self.new_customer('abc-2')
+        response = self.new_customer('abc-2', email='other@customer.com')
+        self.assertEqual(response.status_code, 422)
+        self.assertIsNone(Customer.query.filter_by(
+            email='other@customer.com').first())
+
+    def test_client_errors_replay(self):
+        """Test 4xx responses replay; a bad key is rejected outright"""
+        body = {'name': 'No email'}
+        first = self.client.post('/customers/', json=body,
+                                 headers={'Idempotency-Key': 'bad-1'})
+        retry = self.client.post('/customers/', json=body,
+                                 headers={'Idempotency-Key': 'bad-1'})
+        self.assertEqual(first.status_code, 400)
+        self.assertEqual(retry.headers['Idempotent-Replayed'], 'true')
+
+        response = self.new_customer('k' * 256)
+        self.assertEqual(response.status_code, 400)
+
+    def test_in_flight_duplicate_waits(self):
+        """Test a duplicate waits for the first request, then gets 409"""
+        self.app.config['IDEMPOTENCY_WAIT_SECONDS'] = 0.2
+        self.claim('busy-1')
+        running = threading.Event()
+        idempotency._inflight['busy-1'] = running
+
+        started = datetime.utcnow()
+        response = self.new_customer('busy-1')
+        idempotency._inflight.pop('busy-1')
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.headers['Retry-After'], '1')
+        self.assertGreaterEqual(datetime.utcnow() - started,
+                                timedelta(seconds=0.2))
+        self.assertIsNone(Customer.query.filter_by(
+            email='retry@customer.com').first())
+
+    def test_abandoned_and_expired_claims(self):
+        """Test a dead worker's claim is taken over and old rows purged"""
+        self.claim('dead-1', created_at=datetime.utcnow()
+                   - timedelta(minutes=5))
+        db.session.execute(insert(idempotency.keys).values(
+            key='old-1', fingerprint='x', status=201,
+            created_at=datetime(2026, 1, 1), expires_at=datetime(2026, 1, 2)
+        ))
+        db.session.commit()
+
+        response = self.new_customer('dead-1')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(db.session.execute(
+            select(idempotency.keys.c.key)
+        ).scalars().all(), ['dead-1'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,6 +4,8 @@ Tests all inventory-related routes including positive and negative test cases
 """
 import unittest
 from tests.base_test import BaseTestCase
+from app.extention import db
+from app.models import Inventory
 
 
 class TestInventoryRoutes(BaseTestCase):
@@ -245,6 +247,59 @@ class TestInventoryRoutes(BaseTestCase):
         # Responses should be identical due to caching
         self.assertEqual(response1.get_json(), response2.get_json())
 
+    def create_stock_items(self):
+        """Helper adding a mix of healthy and low-stock parts"""
+        db.session.add_all([
+            Inventory(name="Brake Pad", price=30, quantity=2,
+                      reorder_threshold=5, supplier="Brake World"),
+            Inventory(name="Brake Disc", price=80, quantity=5,
+                      reorder_threshold=5, supplier="Brake World"),
+            Inventory(name="Oil Filter", price=9, quantity=40,
+                      reorder_threshold=10, supplier="Parts Plus"),
+            Inventory(name="Air Filter", price=12, quantity=0,
+                      supplier="Parts Plus"),
+        ])
+        db.session.commit()
+
+    def test_low_stock_grouped_by_supplier(self):
+        """Test low-stock report lists only items at or below threshold"""
+        self.create_stock_items()
+
+        response = self.client.get('/inventory/low-stock')
+
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(data['total'], 3)
+        suppliers = {s['supplier']: s for s in data['suppliers']}
+        self.assertEqual(set(suppliers), {'Brake World', 'Parts Plus'})
+        brake_items = suppliers['Brake World']['items']
+        self.assertEqual([i['name'] for i in brake_items],
+                         ['Brake Disc', 'Brake Pad'])
+        self.assertEqual(brake_items[1]['shortfall'], 3)
+        self.assertEqual(suppliers['Parts Plus']['items'][0]['name'],
+                         'Air Filter')
+
+    def test_low_stock_supplier_filter(self):
+        """Test low-stock report filtered to one supplier"""
+        self.create_stock_items()
+
+        response = self.client.get('/inventory/low-stock?supplier=Parts Plus')
+
+        data = response.get_json()
+        self.assertEqual(data['total'], 1)
+        self.assertEqual(data['suppliers'][0]['supplier'], 'Parts Plus')
+
+    def test_low_stock_uses_partial_index(self):
+        """Test the low-stock query is answered from the partial index"""
+        query = db.select(Inventory).where(
+            Inventory.low_stock_filter()
+        ).order_by(Inventory.supplier, Inventory.name)
+        plan = db.session.execute(db.text(
+            'EXPLAIN QUERY PLAN ' + str(query.compile(db.engine))
+        )).all()
+
+        self.assertIn('ix_inventory_low_stock', str(plan))
+
 
 if __name__ == '__main__':
     unittest.main()
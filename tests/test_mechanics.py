@@ -3,7 +3,10 @@ Unit tests for Mechanic endpoints
 Tests all mechanic-related routes including positive and negative test cases
 """
 import unittest
+from datetime import datetime, timedelta
 from tests.base_test import BaseTestCase
+from app.extention import db
+from app.models import ServiceTicket
 
 
 class TestMechanicRoutes(BaseTestCase):
@@ -206,5 +209,63 @@ class TestMechanicRoutes(BaseTestCase):
         self.assertEqual(response.status_code, 404)
 
 
+class TestClaimNext(BaseTestCase):
+    """Test cases for the mechanic work queue (POST /me/claim-next)"""
+
+    def setUp(self):
+        super().setUp()
+        self.headers = self.get_auth_headers(self.get_mechanic_token())
+        # The test mechanic's specialty is "Test Repair"
+        now = datetime.utcnow()
+        self.tickets = {}
+        for title, priority, specialty, age in [
+            ('Old medium', 'Medium', 'Test Repair', 3),
+            ('New urgent', 'Urgent', None, 1),
+            ('Oldest urgent, other trade', 'Urgent', 'Body Work', 5),
+            ('Older medium', 'Medium', None, 4),
+        ]:
+            ticket = ServiceTicket(title=title, description='Queued',
+                                   customer_id=self.customer_id,
+                                   priority=priority, specialty=specialty,
+                                   created_at=now - timedelta(hours=age))
+            db.session.add(ticket)
+            self.tickets[title] = ticket
+        db.session.commit()
+
+    def claim(self):
+        return self.client.post('/mechanics/me/claim-next',
+                                headers=self.headers)
+
+    def test_claims_in_priority_then_age_order(self):
+        """Test urgent first, then oldest, skipping other specialties"""
+        titles = [self.claim().get_json()['title'] for _ in range(3)]
+
+        self.assertEqual(titles, ['New urgent', 'Older medium', 'Old medium'])
+        self.assertEqual(self.claim().status_code, 204)
+
+    def test_claim_assigns_ticket(self):
+        """Test the claimed ticket is In Progress with me assigned"""
+        data = self.claim().get_json()
+
+        self.assertEqual(data['status'], 'In Progress')
+        self.assertEqual(data['mechanics'], [self.mechanic_id])
+
+    def test_claim_legacy_ticket_without_status(self):
+        """Test a ticket with a NULL status counts as Open in the queue"""
+        ServiceTicket.query.update({'status': None})
+        db.session.commit()
+
+        data = self.claim().get_json()
+
+        self.assertEqual(data['title'], 'New urgent')
+        self.assertEqual(data['status'], 'In Progress')
+
+    def test_claim_requires_token(self):
+        """Test claiming needs a mechanic token"""
+        response = self.client.post('/mechanics/me/claim-next')
+
+        self.assertEqual(response.status_code, 401)
+
+
 if __name__ == '__main__':
     unittest.main()
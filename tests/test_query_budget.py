@@ -0,0 +1,115 @@
+"""
+Query budget tests for the list and detail endpoints
+Each route should run a fixed number of queries no matter how many rows
+it returns, so an N+1 regression fails here instead of in production
+"""
+import unittest
+from sqlalchemy.exc import InvalidRequestError
+from tests.base_test import BaseTestCase
+from app.extention import db
+from app.loaders import strict_loading
+from app.models import Mechanic, ServiceTicket, Inventory
+
+
+class TestQueryBudget(BaseTestCase):
+    """Test cases for the number of SQL statements per request"""
+
+    def setUp(self):
+        """Seed multi-row data with association rows"""
+        super().setUp()
+        self.create_bulk_data(count=6)
+        self.ticket_id = ServiceTicket.query.first().id
+        self.inventory_id = Inventory.query.first().id
+        # Fresh session so nothing is served from the identity map
+        db.session.expire_all()
+
+    def test_service_ticket_list_budget(self):
+        """Ticket list: validator, count, page, customers, mechanics, parts"""
+        with self.assertMaxQueries(6):
+            response = self.client.get('/service-tickets/?per_page=10')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.get_json()['service_tickets']), 6)
+
+    def test_service_ticket_detail_budget(self):
+        """Ticket detail: validator, ticket and its three relationships"""
+        with self.assertMaxQueries(5):
+            response = self.client.get(f'/service-tickets/{self.ticket_id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.get_json()['mechanics']), 2)
+
+    def test_mechanic_list_budget(self):
+        """Mechanic list: validator, count, page, tickets"""
+        with self.assertMaxQueries(4):
+            response = self.client.get('/mechanics/?per_page=10')
+        self.assertEqual(response.status_code, 200)
+
+    def test_mechanic_detail_budget(self):
+        """Mechanic detail: validator, mechanic plus tickets"""
+        with self.assertMaxQueries(3):
+            response = self.client.get(f'/mechanics/{self.mechanic_id}')
+        self.assertEqual(response.status_code, 200)
+
+    def test_mechanics_by_tickets_budget(self):
+        """By-tickets ranking counts in SQL instead of per mechanic"""
+        with self.assertMaxQueries(2):
+            response = self.client.get('/mechanics/by-tickets')
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(len(data), 6)
+        self.assertTrue(all(m['ticket_count'] == 2 for m in data))
+
+    def test_inventory_list_budget(self):
+        """Inventory list: validator, items plus tickets"""
+        with self.assertMaxQueries(3):
+            response = self.client.get('/inventory/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.get_json()), 6)
+
+    def test_inventory_detail_budget(self):
+        """Inventory detail: validator, item plus tickets"""
+        with self.assertMaxQueries(3):
+            response = self.client.get(f'/inventory/{self.inventory_id}')
+        self.assertEqual(response.status_code, 200)
+
+    def test_customer_list_budget(self):
+        """Customer list: validator, count and page only"""
+        with self.assertMaxQueries(3):
+            response = self.client.get('/customers/?per_page=10')
+        self.assertEqual(response.status_code, 200)
+
+    def test_customer_detail_budget(self):
+        """Customer detail: validator, customer, tickets, mechanics, parts"""
+        customer_id = ServiceTicket.query.first().customer_id
+        db.session.expire_all()
+        with self.assertMaxQueries(5):
+            response = self.client.get(f'/customers/{customer_id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.get_json()['service_tickets']), 1)
+
+    def test_my_tickets_budget(self):
+        """My tickets: tickets plus their three relationships"""
+        headers = self.get_auth_headers(
+            self.get_customer_token('bulk0@customer.com')
+        )
+        with self.assertMaxQueries(4):
+            response = self.client.get('/customers/my-tickets',
+                                       headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.get_json()), 1)
+
+    def test_budget_failure_lists_statements(self):
+        """Going over budget fails with the statements that ran"""
+        with self.assertRaises(AssertionError) as ctx:
+            with self.assertMaxQueries(0):
+                Mechanic.query.all()
+        self.assertIn('SELECT', str(ctx.exception))
+
+    def test_strict_loading_raises_on_lazy_load(self):
+        """Unexpected lazy loads raise when RAISE_ON_LAZY_LOAD is on"""
+        mechanic = Mechanic.query.options(*strict_loading()).first()
+        with self.assertRaises(InvalidRequestError):
+            mechanic.service_tickets
+
+
+if __name__ == '__main__':
+    unittest.main()
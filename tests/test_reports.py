@@ -0,0 +1,143 @@
+"""
+Unit tests for the reporting rollups and the /reports blueprint
+"""
+import unittest
+from datetime import date, datetime
+from sqlalchemy import update
+from tests.base_test import BaseTestCase, QueryBudget
+from app.extention import db
+from app.models import (
+    Inventory, Mechanic, PriorityRollup, ServiceTicket, ServiceTicketPart,
+    Watermark
+)
+from app import reports
+
+
+class TestReports(BaseTestCase):
+    """Test cases for refreshing rollups and reading reports from them"""
+
+    def setUp(self):
+        super().setUp()
+        self.mechanic = db.session.get(Mechanic, self.mechanic_id)
+        self.helper = Mechanic(name='Helper', email='helper@shop.com',
+                               hourly_rate=30.0)
+        self.helper.set_password('mechpass123')
+        self.pads = Inventory(name='Brake Pad', price=40.0, quantity=50,
+                              category='Brakes')
+        self.filter = Inventory(name='Oil Filter', price=10.0, quantity=50)
+        db.session.add_all([self.helper, self.pads, self.filter])
+        # (completed on, priority, crew, parts)
+        for day, priority, crew, parts in (
+            (date(2026, 1, 10), 'High', [self.mechanic, self.helper],
+             [(self.pads, 2)]),
+            (date(2026, 1, 20), 'High', [self.mechanic], [(self.filter, 1)]),
+            (date(2026, 2, 5), 'Low', [self.helper], []),
+        ):
+            self.add_ticket(day, priority, crew, parts)
+        # Unfinished work isn't revenue yet
+        self.add_ticket(None, 'High', [self.mechanic], [(self.pads, 1)],
+                        status='In Progress')
+        db.session.commit()
+        self.headers = self.get_auth_headers(self.get_mechanic_token())
+
+    def add_ticket(self, day, priority, crew, parts, status='Completed'):
+        ticket = ServiceTicket(
+            title='Job', customer_id=self.customer_id, estimated_cost=100.0,
+            status=status, priority=priority, completion_date=day,
+            mechanics=crew
+        )
+        ticket.parts = [ServiceTicketPart(inventory=part, quantity=quantity)
+                        for part, quantity in parts]
+        db.session.add(ticket)
+        return ticket
+
+    def report(self, name, status=200, **params):
+        params.setdefault('start', '2026-01-01')
+        params.setdefault('end', '2026-12-31')
+        response = self.client.get(f'/reports/{name}', query_string=params,
+                                   headers=self.headers)
+        self.assertEqual(response.status_code, status)
+        return response.get_json()
+
+    def test_costs_match_calculate_total_cost(self):
+        """Test the SQL rollup prices tickets like the model method"""
+        reports.refresh()
+
+        expected = {}
+        for ticket in ServiceTicket.query.filter_by(status='Completed'):
+            totals = expected.setdefault(ticket.priority, [0, 0.0])
+            totals[0] += 1
+            totals[1] += ticket.calculate_total_cost()
+        rows = self.report('ticket-cost')['rows']
+
+        self.assertEqual({row['priority']: [row['tickets'], row['total']]
+                          for row in rows}, expected)
+        high = next(row for row in rows if row['priority'] == 'High')
+        # (100 + 80 + 80) and (100 + 100 + 10)
+        self.assertEqual(high['average_cost'], 235.0)
+
+    def test_mechanic_revenue_and_parts_by_month(self):
+        """Test shared tickets are split and months kept apart"""
+        reports.refresh()
+
+        revenue = self.report('mechanic-revenue')
+        self.assertEqual(
+            [(row['month'], row['mechanic_id'], row['tickets'],
+              row['labor'], row['revenue']) for row in revenue['rows']],
+            [('2026-01', self.mechanic_id, 2, 150.0, 340.0),
+             ('2026-01', self.helper.id, 1, 30.0, 130.0),
+             ('2026-02', self.helper.id, 1, 60.0, 160.0)]
+        )
+        self.assertIsNotNone(revenue['refreshed_through'])
+        self.assertEqual(
+            [(row['category'], row['quantity'], row['spend'])
+             for row in self.report('parts-spend')['rows']],
+            [('Brakes', 2, 80.0), ('Uncategorized', 1, 10.0)]
+        )
+
+    def test_refresh_only_rebuilds_changed_days(self):
+        """Test a refresh after one completion rebuilds just its day"""
+        # Written long before the last run, outside its overlap window
+        db.session.execute(update(ServiceTicket.__table__).values(
+            updated_at=datetime(2026, 2, 6)
+        ))
+        db.session.commit()
+        self.assertIsNone(reports.refresh()['days'])
+        db.session.get(Watermark, reports.WATERMARK).value = \
+            datetime(2026, 3, 1)
+        db.session.commit()
+        self.assertEqual(reports.refresh()['days'], 0)
+
+        ticket_id = ServiceTicket.query.filter_by(
+            status='In Progress').one().id
+        self.client.post(f'/service-tickets/{ticket_id}/transition',
+                         json={'status': 'Completed'})
+
+        self.assertEqual(reports.refresh()['days'], 1)
+        today = date.today().isoformat()
+        rows = self.report('ticket-cost', start=today, end=today)['rows']
+        self.assertEqual([(row['priority'], row['tickets'])
+                          for row in rows], [('High', 1)])
+        self.assertEqual(PriorityRollup.query.count(), 4)
+
+    def test_reports_read_only_rollups(self):
+        """Test a report is two small reads, however many tickets"""
+        self.create_bulk_data(count=10)
+        reports.refresh()
+
+        with QueryBudget(2) as budget:  # watermark, rollup
+            self.report('mechanic-revenue')
+        self.assertFalse([sql for sql in budget.statements
+                          if 'service_tickets' in sql])
+
+    def test_invalid_range_and_auth(self):
+        """Test bad dates are a 400 and reports need a mechanic token"""
+        self.report('parts-spend', status=400, start='2026-13-01')
+        self.report('parts-spend', status=400, start='2026-05-01',
+                    end='2026-04-01')
+        response = self.client.get('/reports/ticket-cost')
+        self.assertEqual(response.status_code, 401)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+"""
+Unit tests for the typeahead endpoint (/search/suggest)
+"""
+import unittest
+from unittest import mock
+from tests.base_test import BaseTestCase, QueryBudget
+from app import suggest
+from app.extention import db
+from app.models import Inventory
+from app.suggest import PrefixIndex
+
+
+class TestSuggestRoutes(BaseTestCase):
+    """Test cases for the prefix index behind /search/suggest"""
+
+    def setUp(self):
+        super().setUp()
+        db.session.add(Inventory(name="Spark Plug Iridium", price=9.99,
+                                 category="Ignition"))
+        db.session.commit()
+
+    def suggest(self, q, **params):
+        response = self.client.get('/search/suggest',
+                                   query_string=dict(q=q, **params))
+        self.assertEqual(response.status_code, 200)
+        return response.get_json()['suggestions']
+
+    def test_suggest_across_types(self):
+        """Test a prefix matches customers, mechanics and parts"""
+        labels = {(s['type'], s['label']) for s in self.suggest('te')}
+
+        self.assertIn(('customer', 'Test Customer'), labels)
+        self.assertIn(('mechanic', 'Test Mechanic'), labels)
+
+    def test_suggest_by_phone_email_and_specialty(self):
+        """Test phone digits, email and specialty are searchable"""
+        self.assertEqual(self.suggest('555-123')[0]['id'], self.customer_id)
+        self.assertEqual(self.suggest('test@cust')[0]['type'], 'customer')
+        self.assertEqual(self.suggest('repair')[0]['id'], self.mechanic_id)
+        self.assertEqual(self.suggest('spark pl')[0]['type'], 'part')
+
+    def test_suggest_types_filter(self):
+        """Test limiting suggestions to some types"""
+        suggestions = self.suggest('test', types='mechanic')
+
+        self.assertEqual({s['type'] for s in suggestions}, {'mechanic'})
+
+    def test_suggest_invalid_type(self):
+        """Test an unknown type is rejected"""
+        response = self.client.get('/search/suggest?q=te&types=vehicle')
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_suggest_does_not_query_database(self):
+        """Test keystrokes are answered from memory once the index is built"""
+        self.suggest('te')
+
+        with QueryBudget(0):
+            self.suggest('tes')
+            self.suggest('test cu')
+
+    def test_routes_update_index(self):
+        """Test create, update and delete routes keep the index current"""
+        self.suggest('te')  # build the index
+        token = self.get_mechanic_token()
+        headers = self.get_auth_headers(token)
+
+        created = self.client.post('/inventory/', headers=headers, json={
+            'name': 'Wiper Blade', 'price': 12.5
+        }).get_json()
+        self.assertEqual(self.suggest('wiper')[0]['id'], created['id'])
+
+        self.client.put(f"/inventory/{created['id']}", headers=headers,
+                        json={'name': 'Windshield Wiper'})
+        self.assertEqual(self.suggest('windsh')[0]['id'], created['id'])
+        self.assertEqual(self.suggest('blade'), [])
+
+        self.client.delete(f"/inventory/{created['id']}", headers=headers)
+        self.assertEqual(self.suggest('wind'), [])
+
+    def test_new_customer_is_suggested(self):
+        """Test a customer created through the API shows up immediately"""
+        self.suggest('te')
+        self.client.post('/customers/', json={
+            'name': 'Zelda Quinn',
+            'email': 'zelda@example.com',
+            'phone': '555-444-3333',
+            'password': 'secret123'
+        })
+
+        self.assertEqual(self.suggest('zel')[0]['label'], 'Zelda Quinn')
+
+    def test_stale_index_rebuilt_once_in_background(self):
+        """Test an expired index is still served while one thread rebuilds"""
+        self.suggest('te')  # build the index
+        db.session.add(Inventory(name='Sparkle Wax', price=5))  # unindexed
+        db.session.commit()
+        self.app.config['SUGGEST_INDEX_TTL'] = 0
+
+        with mock.patch.object(suggest.threading, 'Thread') as thread:
+            for _ in range(3):
+                self.assertEqual(len(self.suggest('spark')), 1)
+        self.assertEqual(thread.call_count, 1)
+
+        suggest._rebuild(*thread.call_args.kwargs['args'])
+        self.app.config['SUGGEST_INDEX_TTL'] = 300
+        self.assertEqual(len(self.suggest('spark')), 2)
+
+
+class TestPrefixIndex(unittest.TestCase):
+    """Test cases for the PrefixIndex data structure"""
+
+    def test_closest_match_first_and_remove(self):
+        """Test shorter term matches rank first and remove works"""
+        index = PrefixIndex()
+        index.load([
+            ('part', 1, 'Brake Pad', None, ['brake', 'pad']),
+            ('part', 2, 'Brakeline Kit', None, ['brakeline', 'kit']),
+        ])
+
+        self.assertEqual([s['id'] for s in index.search('brak')], [1, 2])
+        index.remove('part', 1)
+        self.assertEqual([s['id'] for s in index.search('brak')], [2])
+        self.assertEqual(len(index), 1)
+
+    def test_writes_during_rebuild_are_kept(self):
+        """Test add/remove calls made while load() builds are replayed"""
+        index = PrefixIndex()
+        index.load([('part', 1, 'Brake Pad', None, ['brake', 'pad'])])
+        self.assertTrue(index.claim_build())
+        self.assertFalse(index.claim_build())  # one rebuild at a time
+
+        index.add('part', 3, 'Brake Fluid', None, ['brake', 'fluid'])
+        index.remove('part', 1)
+        index.load([('part', 1, 'Brake Pad', None, ['brake', 'pad']),
+                    ('part', 2, 'Brakeline Kit', None, ['brakeline'])])
+
+        self.assertEqual([s['id'] for s in index.search('brake')], [3, 2])
+        self.assertTrue(index.claim_build())
+
+
+if __name__ == '__main__':
+    unittest.main()
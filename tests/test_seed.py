@@ -0,0 +1,59 @@
+"""
+Unit tests for the bulk data seeder (`flask seed`)
+"""
+import unittest
+from tests.base_test import BaseTestCase
+from app.models import Customer, ServiceTicket
+from app.seed import seed_dataset, seed_command, SEED_PASSWORD
+
+
+class TestSeed(BaseTestCase):
+    """Test cases for bulk seeding"""
+
+    def test_seed_appends_after_existing_rows(self):
+        """Seeded ids start after the rows already in the database"""
+        counts = seed_dataset(customers=10, mechanics=3, parts=5, tickets=40,
+                              batch_size=16)
+
+        self.assertEqual(counts['service_tickets'], 40)
+        self.assertEqual(Customer.query.count(), 11)
+        self.assertEqual(ServiceTicket.query.count(), 40)
+        # The test customer keeps id 1, seeded customers follow it
+        self.assertEqual(Customer.query.get(2).email, 'customer2@seed.local')
+
+    def test_seed_is_deterministic(self):
+        """Same seed and batch size give the same tickets in any process"""
+        seed_dataset(customers=5, mechanics=2, parts=3, tickets=10,
+                     batch_size=4, seed=7)
+        first = [(t.customer_id, t.status, t.priority)
+                 for t in ServiceTicket.query.order_by(ServiceTicket.id)]
+        self.assertEqual(len(first), 10)
+
+        seed_dataset(customers=5, mechanics=2, parts=3, tickets=10,
+                     batch_size=4, seed=7, workers=2)
+        tickets = ServiceTicket.query.order_by(ServiceTicket.id).all()[10:]
+        # Customer ids are offset by the first run's customers
+        second = [(t.customer_id - 5, t.status, t.priority) for t in tickets]
+        self.assertEqual(first, second)
+
+    def test_seeded_customer_can_log_in(self):
+        """The shared password hash works for every seeded account"""
+        seed_dataset(customers=3, mechanics=1, parts=1, tickets=1)
+        token = self.get_customer_token('customer3@seed.local',
+                                        SEED_PASSWORD)
+        self.assertIsNotNone(token)
+
+    def test_seed_command(self):
+        """`flask seed` loads the requested row counts"""
+        runner = self.app.test_cli_runner()
+        result = runner.invoke(seed_command, [
+            '--customers', '4', '--mechanics', '2', '--parts', '3',
+            '--tickets', '8', '--workers', '1',
+        ])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('service_tickets: 8', result.output)
+        self.assertEqual(ServiceTicket.query.count(), 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
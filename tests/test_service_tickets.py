@@ -4,7 +4,7 @@ Tests all service ticket-related routes including positive and negative cases
 """
 
 import unittest
-from tests.base_test import BaseTestCase
+from tests.base_test import BaseTestCase, QueryBudget
 from app.models import ServiceTicket, Inventory
 from app.extention import db
 
@@ -254,6 +254,275 @@ class TestServiceTicketRoutes(BaseTestCase):
         data = response2.get_json()
         self.assertIn("message", data)
 
+        # The rejected duplicate must not consume stock
+        db.session.expire_all()
+        self.assertEqual(Inventory.query.get(self.inventory_id).quantity, 9)
+
+    def test_add_part_with_quantity_decrements_stock(self):
+        """Test adding several units of a part takes them from stock"""
+        url = f"/service-tickets/{self.ticket_id}/add-part/{self.inventory_id}"
+
+        response = self.client.put(url, json={"quantity": 4})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["quantity"], 4)
+        db.session.expire_all()
+        self.assertEqual(Inventory.query.get(self.inventory_id).quantity, 6)
+
+        ticket = self.client.get(f"/service-tickets/{self.ticket_id}")
+        data = ticket.get_json()
+        self.assertEqual(data["inventory_items"], [self.inventory_id])
+        self.assertEqual(
+            data["parts"], [{"inventory_id": self.inventory_id, "quantity": 4}]
+        )
+
+    def test_add_part_insufficient_stock(self):
+        """Test adding more units than in stock returns 409"""
+        url = f"/service-tickets/{self.ticket_id}/add-part/{self.inventory_id}"
+
+        response = self.client.put(url, json={"quantity": 11})
+
+        self.assertEqual(response.status_code, 409)
+        data = response.get_json()
+        self.assertEqual(data["available"], 10)
+        self.assertEqual(data["requested"], 11)
+        db.session.expire_all()
+        self.assertEqual(Inventory.query.get(self.inventory_id).quantity, 10)
+
+    def test_last_part_cannot_be_oversold(self):
+        """Test two tickets racing for the last units - only one wins"""
+        other = ServiceTicket(title="Other", description="Other ticket",
+                              customer_id=self.customer_id)
+        db.session.add(other)
+        db.session.commit()
+
+        first = self.client.put(
+            f"/service-tickets/{self.ticket_id}/add-part/{self.inventory_id}",
+            json={"quantity": 7},
+        )
+        second = self.client.put(
+            f"/service-tickets/{other.id}/add-part/{self.inventory_id}",
+            json={"quantity": 7},
+        )
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 409)
+
+    def test_add_part_invalid_quantity(self):
+        """Test adding a part with a zero quantity"""
+        url = f"/service-tickets/{self.ticket_id}/add-part/{self.inventory_id}"
+
+        response = self.client.put(url, json={"quantity": 0})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("error", response.get_json())
+
+    def test_total_cost_uses_part_quantity(self):
+        """Test calculate_total_cost multiplies part price by quantity"""
+        url = f"/service-tickets/{self.ticket_id}/add-part/{self.inventory_id}"
+        self.client.put(url, json={"quantity": 2})
+
+        ticket = ServiceTicket.query.get(self.ticket_id)
+        db.session.refresh(ticket)
+        self.assertEqual(ticket.calculate_total_cost(), 151.98)
+
+    def create_search_tickets(self):
+        """Helper adding tickets with distinct words to search for"""
+        tickets = [
+            ServiceTicket(title="Brake pad replacement",
+                          description="Front pads worn out",
+                          customer_id=self.customer_id,
+                          vehicle_info="2015 Ford Focus"),
+            ServiceTicket(title="Annual inspection",
+                          description="Check brakes, lights and tyres",
+                          customer_id=self.customer_id,
+                          vehicle_info="2019 Toyota Corolla"),
+            ServiceTicket(title="Transmission flush",
+                          description="Fluid change",
+                          customer_id=self.customer_id,
+                          vehicle_info="2012 Honda Accord"),
+        ]
+        db.session.add_all(tickets)
+        db.session.commit()
+        return tickets
+
+    def test_search_ranks_title_matches_first(self):
+        """Test full-text search ranks title hits above description hits"""
+        brake_ticket, inspection, _ = self.create_search_tickets()
+
+        response = self.client.get("/service-tickets/search?q=brake")
+
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(data["total"], 2)
+        ids = [t["id"] for t in data["service_tickets"]]
+        self.assertEqual(ids, [brake_ticket.id, inspection.id])
+
+    def test_search_vehicle_info_and_all_words(self):
+        """Test every word must match, across any of the columns"""
+        self.create_search_tickets()
+
+        response = self.client.get("/service-tickets/search?q=toyota check")
+
+        data = response.get_json()
+        self.assertEqual(data["total"], 1)
+        self.assertEqual(data["service_tickets"][0]["title"],
+                         "Annual inspection")
+
+    def test_search_index_follows_updates_and_deletes(self):
+        """Test the index is kept in sync on update and delete"""
+        _, _, flush = self.create_search_tickets()
+
+        self.client.put(f"/service-tickets/{flush.id}",
+                        json={"title": "Clutch replacement"})
+        self.assertEqual(self.client.get(
+            "/service-tickets/search?q=transmission"
+        ).get_json()["total"], 0)
+        self.assertEqual(self.client.get(
+            "/service-tickets/search?q=clutch"
+        ).get_json()["total"], 1)
+
+        self.client.delete(f"/service-tickets/{flush.id}")
+        self.assertEqual(self.client.get(
+            "/service-tickets/search?q=clutch"
+        ).get_json()["total"], 0)
+
+    def test_search_pagination(self):
+        """Test search results are paginated"""
+        self.create_search_tickets()
+
+        response = self.client.get(
+            "/service-tickets/search?q=brake&per_page=1&page=2"
+        )
+
+        data = response.get_json()
+        self.assertEqual(len(data["service_tickets"]), 1)
+        self.assertEqual(data["pages"], 2)
+        self.assertTrue(data["has_prev"])
+        self.assertFalse(data["has_next"])
+
+    def test_search_ignores_query_syntax(self):
+        """Test search operators in user input don't cause errors"""
+        self.create_search_tickets()
+
+        response = self.client.get('/service-tickets/search?q="brake* -OR')
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_search_requires_query(self):
+        """Test search without a query"""
+        response = self.client.get("/service-tickets/search?q=")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("error", response.get_json())
+
+    def transition(self, status):
+        return self.client.post(
+            f"/service-tickets/{self.ticket_id}/transition",
+            json={"status": status},
+        )
+
+    def ticket_status(self):
+        db.session.expire_all()
+        return db.session.get(ServiceTicket, self.ticket_id).status
+
+    def test_transition_through_workflow(self):
+        """Test Open -> In Progress -> Completed sets the completion date"""
+        self.assertEqual(self.transition("In Progress").status_code, 200)
+        response = self.transition("Completed")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["status"], "Completed")
+        db.session.expire_all()
+        self.assertIsNotNone(
+            db.session.get(ServiceTicket, self.ticket_id).completion_date
+        )
+
+    def test_illegal_transition(self):
+        """Test a move the state machine doesn't allow is a 409"""
+        self.transition("Cancelled")
+
+        response = self.transition("In Progress")
+
+        self.assertEqual(response.status_code, 409)
+        data = response.get_json()
+        self.assertEqual(data["status"], "Cancelled")
+        self.assertEqual(data["allowed"], [])
+
+    def test_transition_validation(self):
+        """Test unknown statuses and tickets"""
+        self.assertEqual(self.transition("Done").status_code, 400)
+        response = self.client.post("/service-tickets/999/transition",
+                                    json={"status": "Cancelled"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_transition_is_one_update_plus_its_logs(self):
+        """
+        Test a transition runs three statements: the UPDATE that checks and
+        writes the status, the change_log row and the ticket event insert -
+        nothing loads the ticket first
+        """
+        with QueryBudget(3) as budget:
+            self.transition("In Progress")
+
+        self.assertTrue(budget.statements[0].startswith("UPDATE"))
+        self.assertIn("change_log", budget.statements[1])
+        self.assertIn("ticket_events", budget.statements[2])
+
+    def test_put_respects_state_machine(self):
+        """Test PUT can't skip the workflow either"""
+        response = self.client.put(f"/service-tickets/{self.ticket_id}",
+                                   json={"status": "Completed"})
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.ticket_status(), "Open")
+
+    def test_assigned_ticket_cant_be_reopened(self):
+        """Test In Progress -> Open is refused while a mechanic is on it"""
+        self.client.put(f"/service-tickets/{self.ticket_id}"
+                        f"/assign-mechanic/{self.mechanic_id}")
+
+        response = self.transition("Open")
+
+        self.assertEqual(response.status_code, 409)
+        self.assertNotIn("Open", response.get_json()["allowed"])
+        self.assertEqual(self.ticket_status(), "In Progress")
+
+    def test_put_cant_reopen_assigned_ticket(self):
+        """Test PUT status=Open is refused while a mechanic is on it"""
+        self.client.put(f"/service-tickets/{self.ticket_id}"
+                        f"/assign-mechanic/{self.mechanic_id}")
+
+        response = self.client.put(f"/service-tickets/{self.ticket_id}",
+                                   json={"status": "Open"})
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.ticket_status(), "In Progress")
+
+    def test_assignment_drives_status(self):
+        """Test assigning opens work and removing the last mechanic reopens"""
+        base = f"/service-tickets/{self.ticket_id}"
+        # Status UPDATE, mechanic updated_at touch, link INSERT, change_log
+        # row, ticket event insert
+        with QueryBudget(5):
+            self.client.put(f"{base}/assign-mechanic/{self.mechanic_id}")
+        self.assertEqual(self.ticket_status(), "In Progress")
+
+        self.client.put(f"{base}/remove-mechanic/{self.mechanic_id}")
+        self.assertEqual(self.ticket_status(), "Open")
+
+        self.client.put(f"{base}/edit", json={"add_ids": [self.mechanic_id]})
+        self.assertEqual(self.ticket_status(), "In Progress")
+
+    def test_assignment_keeps_final_status(self):
+        """Test assigning a mechanic doesn't reopen a cancelled ticket"""
+        self.transition("Cancelled")
+
+        self.client.put(f"/service-tickets/{self.ticket_id}"
+                        f"/assign-mechanic/{self.mechanic_id}")
+
+        self.assertEqual(self.ticket_status(), "Cancelled")
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,119 @@
+"""
+Unit tests for the incremental SQLite analytics snapshot
+"""
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime
+from sqlalchemy import update
+from tests.base_test import BaseTestCase
+from app.extention import db
+from app.models import (
+    Customer, Inventory, Mechanic, ServiceTicket, ServiceTicketPart,
+    TimeEntry
+)
+from app import snapshot
+
+
+class TestAnalyticsSnapshot(BaseTestCase):
+    """Test cases for `flask snapshot-analytics`"""
+
+    def setUp(self):
+        super().setUp()
+        self.create_bulk_data(count=3)
+        ticket = ServiceTicket.query.first()
+        part = Inventory(name='Wiper', price=9.5, quantity=10)
+        ticket.parts.append(ServiceTicketPart(inventory=part, quantity=2))
+        ticket.time_entries.append(TimeEntry(hours=1.5, rate=50))
+        db.session.commit()
+        self.ticket_id = ticket.id
+        handle, self.path = tempfile.mkstemp(suffix='.db')
+        os.close(handle)
+        os.remove(self.path)  # the first run creates it
+
+    def tearDown(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        super().tearDown()
+
+    def query(self, sql):
+        with sqlite3.connect(self.path) as connection:
+            return connection.execute(sql).fetchall()
+
+    def age_everything(self):
+        """Make every row older than the last run's overlap window"""
+        for model in (Customer, Mechanic, Inventory, ServiceTicket):
+            db.session.execute(update(model.__table__).values(
+                updated_at=datetime(2026, 1, 1)))
+        db.session.commit()
+
+    def test_first_run_copies_everything(self):
+        """Test a new file gets every row and link, minus passwords"""
+        counts = snapshot.export_snapshot(self.path)
+
+        self.assertEqual(counts['service_tickets']['copied'],
+                         ServiceTicket.query.count())
+        self.assertEqual(counts['customers']['copied'],
+                         Customer.query.count())
+        self.assertEqual(counts['inventory_service_ticket']['rows'],
+                         ServiceTicketPart.query.count())
+        self.assertEqual(counts['time_entries']['rows'], 1)
+        self.assertEqual(
+            self.query('SELECT COUNT(*) FROM mechanic_service_ticket')[0][0],
+            db.session.execute(
+                db.select(db.func.count())
+                .select_from(snapshot.mechanic_service_ticket)
+            ).scalar())
+        columns = [row[1] for row in
+                   self.query('PRAGMA table_info(mechanics)')]
+        self.assertIn('hourly_rate', columns)
+        self.assertNotIn('password_hash', columns)
+
+    def test_later_runs_copy_only_changes(self):
+        """Test an edit, a deletion and new links are all that move"""
+        self.age_everything()
+        snapshot.export_snapshot(self.path)
+        self.query("UPDATE watermarks SET value = '2026-06-01 00:00:00'")
+        self.assertEqual(snapshot.export_snapshot(self.path)
+                         ['service_tickets']['copied'], 0)
+
+        ticket = db.session.get(ServiceTicket, self.ticket_id)
+        ticket.title = 'Renamed'
+        ticket.time_entries.append(TimeEntry(hours=2, rate=50))
+        doomed = Inventory(name='Gone soon', quantity=1)
+        db.session.add(doomed)
+        db.session.commit()
+        snapshot.export_snapshot(self.path)
+        db.session.delete(doomed)
+        db.session.commit()
+        counts = snapshot.export_snapshot(self.path)
+
+        self.assertEqual(counts['service_tickets']['copied'], 1)
+        self.assertEqual(counts['inventory']['deleted'], 1)
+        self.assertEqual(
+            self.query(f'SELECT title FROM service_tickets '
+                       f'WHERE id = {self.ticket_id}'), [('Renamed',)])
+        self.assertEqual(self.query('SELECT SUM(hours) FROM time_entries'),
+                         [(3.5,)])
+        self.assertEqual(self.query(f'SELECT COUNT(*) FROM inventory '
+                                    f'WHERE id = {doomed.id}'), [(0,)])
+
+    def test_full_and_command(self):
+        """Test --full recopies everything from the CLI"""
+        snapshot.export_snapshot(self.path)
+        self.query('DELETE FROM customers')
+
+        runner = self.app.test_cli_runner()
+        result = runner.invoke(snapshot.snapshot_analytics_command,
+                               [self.path, '--full'])
+
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn(f'customers: {Customer.query.count()} copied',
+                      result.output)
+        self.assertEqual(self.query('SELECT COUNT(*) FROM customers'),
+                         [(Customer.query.count(),)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+"""
+Unit tests for the ticket dashboard counters (GET /service-tickets/stats)
+"""
+import unittest
+from sqlalchemy import insert
+from tests.base_test import BaseTestCase, QueryBudget
+from app.extention import db
+from app.models import Mechanic, MechanicLoad, ServiceTicket, TicketCount
+from app import stats
+
+
+class TestTicketStats(BaseTestCase):
+    """Test cases for counters kept by the ticket write paths"""
+
+    def create_ticket(self, priority='High'):
+        response = self.client.post('/service-tickets/', json={
+            'title': 'Brake job', 'description': 'Squeal',
+            'customer_id': self.customer_id, 'priority': priority
+        })
+        self.assertEqual(response.status_code, 201)
+        return response.get_json()['id']
+
+    def get_stats(self):
+        response = self.client.get('/service-tickets/stats')
+        self.assertEqual(response.status_code, 200)
+        return response.get_json()
+
+    def open_tickets(self, mechanic_id):
+        return {row['mechanic_id']: row['open_tickets']
+                for row in self.get_stats()['open_by_mechanic']}[mechanic_id]
+
+    def test_counts_follow_ticket_writes(self):
+        """Test create, edit, transition and delete move the counts"""
+        first, second, third = (self.create_ticket() for _ in range(3))
+        self.client.put(f'/service-tickets/{first}', json={'priority': 'Low'})
+        self.client.post(f'/service-tickets/{second}/transition',
+                         json={'status': 'Cancelled'})
+        self.client.delete(f'/service-tickets/{third}')
+
+        result = self.get_stats()
+
+        self.assertEqual(result['by_status'], {
+            'Open': {'Low': 1}, 'Cancelled': {'High': 1}
+        })
+        self.assertEqual(result['total'], 2)
+        self.assertEqual(stats.reconcile(),
+                         {'tickets': {}, 'mechanics': {}})
+
+    def test_open_tickets_per_mechanic(self):
+        """Test assigning counts, closing and removing un-count"""
+        first, second = self.create_ticket(), self.create_ticket()
+        for ticket_id in (first, second):
+            self.client.put(f'/service-tickets/{ticket_id}'
+                            f'/assign-mechanic/{self.mechanic_id}')
+        self.assertEqual(self.open_tickets(self.mechanic_id), 2)
+
+        self.client.post(f'/service-tickets/{first}/transition',
+                         json={'status': 'Completed'})
+        self.assertEqual(self.open_tickets(self.mechanic_id), 1)
+        self.client.put(f'/service-tickets/{second}'
+                        f'/remove-mechanic/{self.mechanic_id}')
+        self.assertEqual(self.open_tickets(self.mechanic_id), 0)
+        self.assertEqual(self.get_stats()['by_status'], {
+            'Completed': {'High': 1}, 'Open': {'High': 1}
+        })
+
+    def test_bulk_inserts_are_counted(self):
+        """Test Core writes that skip the ORM still count"""
+        db.session.execute(insert(ServiceTicket.__table__), [
+            {'title': 'Oil', 'customer_id': self.customer_id,
+             'status': None, 'priority': None}
+            for _ in range(3)
+        ])
+        db.session.commit()
+
+        self.assertEqual(self.get_stats()['by_status'],
+                         {'Open': {'Medium': 3}})
+
+    def test_stats_skip_ticket_table(self):
+        """Test a dashboard refresh is two small reads, however many tickets"""
+        self.create_bulk_data(count=20)
+
+        with QueryBudget(2) as budget:
+            self.get_stats()
+        self.assertFalse([sql for sql in budget.statements
+                          if 'service_tickets' in sql])
+
+
+class TestReconcile(BaseTestCase):
+    """Test cases for recomputing the counters from scratch"""
+
+    def test_reports_and_fixes_drift(self):
+        """Test a wrong counter is reported, corrected and rows folded"""
+        mechanic = db.session.get(Mechanic, self.mechanic_id)
+        for _ in range(3):
+            db.session.add(ServiceTicket(
+                title='Job', customer_id=self.customer_id, priority='Low',
+                mechanics=[mechanic]
+            ))
+        db.session.add(TicketCount(status='Open', priority='Low', delta=2))
+        db.session.add(MechanicLoad(mechanic_id=self.mechanic_id, delta=-1))
+        db.session.commit()
+
+        drift = stats.reconcile()
+
+        self.assertEqual(drift, {'tickets': {('Open', 'Low'): (5, 3)},
+                                 'mechanics': {self.mechanic_id: (2, 3)}})
+        self.assertEqual(TicketCount.query.count(), 1)
+        self.assertEqual(MechanicLoad.query.one().delta, 3)
+        self.assertEqual(stats.reconcile(),
+                         {'tickets': {}, 'mechanics': {}})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+"""
+Unit tests for clocking time against tickets and labor from logged hours
+"""
+import unittest
+from datetime import date, timedelta
+from tests.base_test import BaseTestCase, QueryBudget
+from app.extention import db
+from app.models import Mechanic, ServiceTicket, TimeEntry
+from app import reports
+
+
+class TestTimeEntries(BaseTestCase):
+    """Test cases for POST/GET /mechanics/me/time-entries"""
+
+    def setUp(self):
+        super().setUp()
+        mechanic = db.session.get(Mechanic, self.mechanic_id)
+        self.tickets = [
+            ServiceTicket(title=f'Job {i}', customer_id=self.customer_id,
+                          estimated_cost=100.0, status='In Progress',
+                          mechanics=[mechanic])
+            for i in range(2)
+        ]
+        self.other = ServiceTicket(title='Not mine',
+                                   customer_id=self.customer_id)
+        db.session.add_all(self.tickets + [self.other])
+        db.session.commit()
+        self.headers = self.get_auth_headers(self.get_mechanic_token())
+
+    def clock(self, *entries, status=201):
+        response = self.client.post('/mechanics/me/time-entries',
+                                    json={'entries': list(entries)},
+                                    headers=self.headers)
+        self.assertEqual(response.status_code, status, response.get_json())
+        return response.get_json()
+
+    def test_clock_a_day_in_one_request(self):
+        """Test a batch is saved at once with the mechanic's rate"""
+        first, second = (ticket.id for ticket in self.tickets)
+        # token, assigned, day totals, rate, ticket touch, then the inserts
+        # (one per row on SQLite, batched with RETURNING on Postgres)
+        with QueryBudget(8):
+            created = self.clock(
+                {'ticket_id': first, 'hours': 2.5, 'note': 'Brakes'},
+                {'ticket_id': second, 'hours': 1.25},
+                {'ticket_id': first, 'hours': 0.75,
+                 'work_date': '2026-03-02'},
+            )
+
+        self.assertEqual([(row['ticket_id'], row['hours'], row['rate'])
+                          for row in created],
+                         [(first, 2.5, 50.0), (second, 1.25, 50.0),
+                          (first, 0.75, 50.0)])
+        self.assertEqual(created[0]['work_date'], date.today().isoformat())
+        self.assertTrue(all(row['id'] for row in created))
+        self.assertEqual(TimeEntry.query.count(), 3)
+
+    def test_labor_uses_logged_hours(self):
+        """Test logged time replaces the default hours in the cost"""
+        ticket = self.tickets[0]
+        self.assertEqual(ticket.calculate_total_cost(), 200.0)  # 100 + 2h
+
+        self.clock({'ticket_id': ticket.id, 'hours': 3.5})
+        # A raise doesn't reprice time already logged
+        db.session.get(Mechanic, self.mechanic_id).hourly_rate = 80
+        db.session.commit()
+        db.session.refresh(ticket)
+
+        self.assertEqual(ticket.calculate_total_cost(), 275.0)  # 100 + 3.5h
+        self.app.config['DEFAULT_LABOR_HOURS'] = 1
+        self.assertEqual(self.tickets[1].calculate_total_cost(), 180.0)
+
+    def test_rollups_credit_logged_labor(self):
+        """Test a completed ticket's logged time reaches the reports"""
+        ticket = self.tickets[0]
+        self.clock({'ticket_id': ticket.id, 'hours': 3})
+        self.client.post(f'/service-tickets/{ticket.id}/transition',
+                         json={'status': 'Completed'})
+        reports.refresh()
+
+        rows = self.client.get('/reports/mechanic-revenue',
+                               headers=self.headers).get_json()['rows']
+        self.assertEqual([(row['labor'], row['revenue']) for row in rows],
+                         [(150.0, 250.0)])
+
+    def test_rejects_whole_batch(self):
+        """Test one bad entry keeps the rest from being saved"""
+        mine = self.tickets[0].id
+        body = self.clock({'ticket_id': mine, 'hours': 1},
+                          {'ticket_id': self.other.id, 'hours': 1},
+                          status=400)
+        self.assertEqual(body['ticket_ids'], [self.other.id])
+
+        self.clock({'ticket_id': mine, 'hours': 20})
+        body = self.clock({'ticket_id': mine, 'hours': 3},
+                          {'ticket_id': self.tickets[1].id, 'hours': 2},
+                          status=400)
+        self.assertEqual(body['days'], [date.today().isoformat()])
+
+        tomorrow = (date.today() + timedelta(days=1)).isoformat()
+        self.clock({'ticket_id': mine, 'hours': 1, 'work_date': tomorrow},
+                   status=400)
+        self.clock({'ticket_id': mine, 'hours': 0}, status=400)
+        self.clock(status=400)
+        self.assertEqual(TimeEntry.query.count(), 1)
+
+    def test_list_my_time(self):
+        """Test GET lists only my entries, filtered by day"""
+        mine = self.tickets[0].id
+        self.clock({'ticket_id': mine, 'hours': 1, 'work_date': '2026-03-01'},
+                   {'ticket_id': mine, 'hours': 2, 'work_date': '2026-03-05'})
+        db.session.add(TimeEntry(service_ticket_id=mine, hours=4,
+                                 mechanic_id=self.mechanic_id + 1))
+        db.session.commit()
+
+        response = self.client.get('/mechanics/me/time-entries',
+                                   query_string={'start': '2026-03-02'},
+                                   headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['hours'] for row in response.get_json()],
+                         [2.0])
+        response = self.client.get('/mechanics/me/time-entries?end=March',
+                                   headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/mechanics/me/time-entries')
+        self.assertEqual(response.status_code, 401)
+
+
+if __name__ == '__main__':
+    unittest.main()
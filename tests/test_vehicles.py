@@ -0,0 +1,175 @@
+"""
+Unit tests for vehicles, service history and the vehicle_info backfill
+"""
+import unittest
+from unittest import mock
+from tests.base_test import BaseTestCase, QueryBudget
+from app.extention import db
+from app.models import ServiceTicket, Vehicle
+from app import vehicles
+from app.vehicles import parse_vehicle_info, backfill_vehicles
+
+VIN = '1HGCM82633A004352'
+
+
+class TestVehicleRoutes(BaseTestCase):
+    """Test cases for /vehicles"""
+
+    def create_ticket(self, vehicle_info, title='Oil change'):
+        response = self.client.post('/service-tickets/', json={
+            'title': title,
+            'description': 'Routine service',
+            'customer_id': self.customer_id,
+            'vehicle_info': vehicle_info
+        })
+        self.assertEqual(response.status_code, 201)
+        return response.get_json()
+
+    def test_create_vehicle(self):
+        """Test registering a vehicle normalizes VIN and plate"""
+        response = self.client.post('/vehicles/', json={
+            'vin': VIN.lower(), 'plate': 'abc-123', 'make': 'Honda',
+            'model': 'Accord', 'year': 2003, 'customer_id': self.customer_id
+        })
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.get_json()['vin'], VIN)
+        found = self.client.get('/vehicles/?plate=ABC-123').get_json()
+        self.assertEqual(found['total'], 1)
+
+    def test_create_vehicle_invalid_and_duplicate_vin(self):
+        """Test malformed and duplicate VINs are rejected"""
+        bad = self.client.post('/vehicles/', json={'vin': 'NOT-A-VIN'})
+        self.assertEqual(bad.status_code, 400)
+
+        self.client.post('/vehicles/', json={'vin': VIN})
+        duplicate = self.client.post('/vehicles/', json={'vin': VIN})
+        self.assertEqual(duplicate.status_code, 400)
+
+    def test_new_ticket_links_vehicle(self):
+        """Test tickets for the same car share one vehicle"""
+        first = self.create_ticket(f'2003 Honda Accord VIN {VIN}')
+        second = self.create_ticket(f'Honda Accord {VIN.lower()}')
+
+        self.assertIsNotNone(first['vehicle_id'])
+        self.assertEqual(first['vehicle_id'], second['vehicle_id'])
+        self.assertEqual(Vehicle.query.count(), 1)
+
+    def test_rolled_back_ticket_leaves_no_vehicle(self):
+        """Test the VIN savepoint doesn't commit the vehicle on its own"""
+        response = self.client.post('/batch', json={'atomic': True,
+                                                    'requests': [
+            {'id': 'ticket', 'method': 'POST', 'path': '/service-tickets/',
+             'body': {'title': 'Oil change', 'description': 'Routine',
+                      'customer_id': self.customer_id,
+                      'vehicle_info': f'2003 Honda Accord VIN {VIN}'}},
+            {'method': 'PUT',
+             'path': '/service-tickets/{ticket.id}/assign-mechanic/999'},
+        ]})
+
+        self.assertFalse(response.get_json()['committed'])
+        db.session.expire_all()
+        self.assertEqual(Vehicle.query.filter_by(vin=VIN).count(), 0)
+
+    def test_vin_added_by_a_concurrent_ticket(self):
+        """Test losing the race to insert a new VIN reuses the winner's"""
+        other = Vehicle(vin=VIN, make='Honda', customer_id=self.customer_id)
+        db.session.add(other)
+        db.session.commit()
+        # The first lookup ran before the other request committed
+        lookups = iter([lambda *args: None, vehicles._find_vehicle])
+        with mock.patch.object(vehicles, '_find_vehicle',
+                               side_effect=lambda *args:
+                               next(lookups)(*args)):
+            ticket = self.create_ticket(f'2003 Honda Accord VIN {VIN}')
+
+        self.assertEqual(ticket['vehicle_id'], other.id)
+        self.assertEqual(Vehicle.query.count(), 1)
+
+    def test_vague_vehicle_info_is_not_linked(self):
+        """Test text without a VIN or year doesn't invent a vehicle"""
+        ticket = self.create_ticket('Test Vehicle')
+
+        self.assertIsNone(ticket['vehicle_id'])
+
+    def test_history_fixed_query_count(self):
+        """Test history costs the same queries for one visit or many"""
+        self.create_bulk_data(count=3)
+        vehicle = Vehicle(vin=VIN, make='Test', model='Car', year=2018,
+                          customer_id=self.customer_id)
+        db.session.add(vehicle)
+        db.session.flush()
+        ServiceTicket.query.update({'vehicle_id': vehicle.id})
+        db.session.commit()
+        db.session.expunge_all()
+
+        with QueryBudget(4):
+            response = self.client.get(f'/vehicles/{VIN.lower()}/history')
+
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(data['total'], 3)
+        self.assertEqual(data['vehicle']['vin'], VIN)
+        ticket = data['service_tickets'][0]
+        self.assertEqual(len(ticket['mechanics']), 2)
+        self.assertEqual({part['quantity'] for part in ticket['parts']},
+                         {1, 2})
+        self.assertTrue(ticket['parts'][0]['name'].startswith('Bulk Part'))
+
+    def test_history_unknown_vin(self):
+        """Test history of an unknown VIN is a 404"""
+        response = self.client.get(f'/vehicles/{VIN}/history')
+
+        self.assertEqual(response.status_code, 404)
+
+
+class TestVehicleBackfill(BaseTestCase):
+    """Test cases for linking old tickets from vehicle_info"""
+
+    def add_ticket(self, vehicle_info):
+        db.session.add(ServiceTicket(title='Old ticket', description='Old',
+                                     customer_id=self.customer_id,
+                                     vehicle_info=vehicle_info))
+
+    def test_backfill_in_batches(self):
+        """Test every parseable ticket is linked across batch boundaries"""
+        for _ in range(3):
+            self.add_ticket('2018 Toyota Corolla')
+        self.add_ticket(f'2003 Honda Accord plate XYZ-987 VIN {VIN}')
+        self.add_ticket('customer did not say')
+        db.session.commit()
+
+        counts = backfill_vehicles(batch_size=2)
+
+        self.assertEqual(counts, {'tickets': 4, 'vehicles': 2, 'skipped': 1})
+        vehicle = Vehicle.query.filter_by(vin=VIN).one()
+        self.assertEqual(vehicle.plate, 'XYZ-987')
+        self.assertEqual(len(vehicle.service_tickets), 1)
+
+        # Running again only revisits the ticket it couldn't parse
+        self.assertEqual(backfill_vehicles(),
+                         {'tickets': 0, 'vehicles': 0, 'skipped': 1})
+
+    def test_backfill_reuses_existing_vehicle(self):
+        """Test tickets are linked to a vehicle registered earlier"""
+        vehicle = Vehicle(vin=VIN, make='Honda', customer_id=self.customer_id)
+        db.session.add(vehicle)
+        self.add_ticket(f'VIN: {VIN}')
+        db.session.commit()
+
+        self.assertEqual(backfill_vehicles()['vehicles'], 0)
+        self.assertEqual(ServiceTicket.query.one().vehicle_id, vehicle.id)
+
+    def test_parse_vehicle_info(self):
+        """Test year, make, model, VIN and plate are pulled from text"""
+        self.assertEqual(
+            parse_vehicle_info(f'2019 Subaru Outback Wilderness VIN {VIN}'),
+            {'vin': VIN, 'plate': None, 'year': 2019, 'make': 'Subaru',
+             'model': 'Outback Wilderness'}
+        )
+        self.assertIsNone(parse_vehicle_info('Honda Civic'))
+        self.assertIsNone(parse_vehicle_info(None))
+
+
+if __name__ == '__main__':
+    unittest.main()